@@ -0,0 +1,347 @@
+import importlib.util
+import queue
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from agent.jobs import TaskCancelled
+from agent.tracing import record_tokens
+
+
+def transformers_available() -> bool:
+    """True if torch and transformers are installed (checked without importing them)."""
+    return importlib.util.find_spec("torch") is not None and importlib.util.find_spec("transformers") is not None
+
+
+def word_chunks(text: str) -> Iterator[str]:
+    """Split text the way a token stream arrives: one word plus its trailing whitespace at a time."""
+    for chunk in re.findall(r"\S+\s*|\s+", text):
+        yield chunk
+
+
+def check_cancelled(cancel: Optional[threading.Event]) -> None:
+    """Raise TaskCancelled if ``cancel`` is set."""
+    if cancel is not None and cancel.is_set():
+        raise TaskCancelled("Task cancelled")
+
+
+def stopping_criteria(checks: List[Callable[[], bool]]) -> Dict[str, Any]:
+    """
+    Extra ``model.generate`` arguments that end a row's decoding once its check returns True.
+
+    The checks are polled after every token, one per row of the batch, so a
+    cancelled task stops using the model within a token instead of decoding
+    on to ``max_new_tokens``.
+    """
+    import torch
+    from transformers import StoppingCriteriaList
+
+    def stopped(input_ids, scores, **kwargs):
+        return torch.tensor([check() for check in checks], dtype=torch.bool, device=input_ids.device)
+
+    return {"stopping_criteria": StoppingCriteriaList([stopped])}
+
+
+class Backend:
+    """
+    Turns a prompt into raw response text.
+
+    Backends import their frameworks on first use, so choosing or constructing
+    one is free; commands that never generate (``--tree``, ``--fix``, mock
+    runs) never pay for torch or transformers.
+    """
+
+    name = "base"
+    # Whether generation follows the FILE/fence grammar when ``constrained.enabled`` is set
+    constrained_decoding = False
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+
+    def available(self) -> bool:
+        return True
+
+    def identity(self) -> str:
+        """What produced the text, for cache keys: outputs of different backends never mix."""
+        return f"{self.name}:{self.config.get('model', 'mistralai/Mistral-7B-v0.1')}"
+
+    def warmup(self) -> None:
+        """Load whatever the backend needs before the first request."""
+
+    def generate(self, prompt: str, params: Dict[str, Any], cancel: Optional[threading.Event] = None) -> str:
+        """
+        Return the completion for ``prompt`` (without the prompt itself).
+
+        Raises:
+            TaskCancelled: If ``cancel`` is set before generation ends
+        """
+        raise NotImplementedError
+
+    def stream(self, prompt: str, params: Dict[str, Any],
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """Yield the completion in chunks; backends without streaming yield it whole."""
+        yield self.generate(prompt, params, cancel)
+
+
+class TransformersBackend(Backend):
+    """Hugging Face transformers model from the registry, batched across concurrent callers."""
+
+    name = "transformers"
+    constrained_decoding = True
+
+    def available(self) -> bool:
+        return transformers_available()
+
+    def identity(self) -> str:
+        from agent.constrained import constrained_settings
+
+        # Constrained output differs from free sampling of the same model
+        identity = super().identity()
+        return identity + ":constrained" if constrained_settings(self.config) is not None else identity
+
+    def _spec(self):
+        from agent.model_registry import model_spec
+        return model_spec(self.config)
+
+    def _load(self):
+        from agent.model_registry import get_registry
+
+        # Weights are loaded once per process and shared across calls
+        key = self._spec()
+        tokenizer, model = get_registry(self.config).get(*key)
+        return key, tokenizer, model
+
+    def warmup(self) -> None:
+        from agent.model_registry import warmup_models
+        warmup_models(self.config, self._spec())
+        self._draft()
+
+    def _inputs(self, key, tokenizer, model, prompt: str) -> Dict[str, Any]:
+        """Generate inputs for one prompt, starting from the cached prefix when enabled."""
+        from agent.prefix_cache import get_prefix_cache
+
+        prefix_cache = get_prefix_cache(self.config)
+        inputs = prefix_cache.prepare(key, tokenizer, model, prompt) if prefix_cache is not None else None
+        if inputs is None:
+            inputs = dict(tokenizer(prompt, return_tensors="pt").to(model.device))
+        return inputs
+
+    def _constraints(self, tokenizer) -> Dict[str, Any]:
+        """Extra generate arguments: a fresh FILE/fence grammar processor when constrained decoding is on."""
+        from agent.constrained import FileGrammarProcessor, constrained_settings
+
+        if constrained_settings(self.config) is None:
+            return {}
+        from transformers import LogitsProcessorList
+        return {"logits_processor": LogitsProcessorList([FileGrammarProcessor(tokenizer)])}
+
+    def _draft(self):
+        """(tokenizer, model) of the speculative draft model, or None if speculative decoding is off."""
+        from agent.model_registry import get_registry
+        from agent.speculative import speculative_settings
+
+        settings = speculative_settings(self.config)
+        if settings is None:
+            return None
+        # Same dtype and placement as the main model
+        _, dtype, device_map = self._spec()
+        return get_registry(self.config).get(settings["draft_model"], dtype, device_map)
+
+    def _speculative(self, tokenizer, model, draft, prompt: str, params: Dict[str, Any]) -> Iterator[List[int]]:
+        from agent.speculative import check_draft_tokenizer, speculative_generate, speculative_settings
+
+        draft_tokenizer, draft_model = draft
+        check_draft_tokenizer(tokenizer, draft_tokenizer)
+        input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"]
+        return speculative_generate(
+            model, draft_model, input_ids,
+            max_new_tokens=params.get("max_new_tokens", 1000),
+            num_draft_tokens=speculative_settings(self.config).get("num_draft_tokens", 5),
+            eos_token_id=tokenizer.eos_token_id,
+        )
+
+    def generate(self, prompt: str, params: Dict[str, Any], cancel: Optional[threading.Event] = None) -> str:
+        key, tokenizer, model = self._load()
+
+        draft = self._draft()
+        if draft is not None:
+            # Single-stream latency mode: not batched, and the prompt is prefilled in full
+            start = time.perf_counter()
+            tokens: List[int] = []
+            for step in self._speculative(tokenizer, model, draft, prompt, params):
+                check_cancelled(cancel)
+                tokens.extend(step)
+            record_tokens(len(tokens), time.perf_counter() - start)
+            return tokenizer.decode(tokens, skip_special_tokens=True)
+
+        if (self.config.get("batching") or {}).get("max_batch_size", 8) > 1:
+            from agent.batching import get_scheduler
+
+            # Prompts from concurrent tasks share one generate call; a prompt
+            # that ends up alone in its batch is prepared by self._inputs
+            scheduler = get_scheduler(key, tokenizer, model, self.config, params,
+                                      prepare_single=lambda p: self._inputs(key, tokenizer, model, p),
+                                      per_batch=lambda: self._constraints(tokenizer))
+            start = time.perf_counter()
+            text = scheduler.generate(prompt, cancel=cancel)
+            record_tokens(len(tokenizer(text)["input_ids"]), time.perf_counter() - start)
+            return text
+
+        start = time.perf_counter()
+        inputs = self._inputs(key, tokenizer, model, prompt)
+        outputs = model.generate(
+            **inputs,
+            pad_token_id=tokenizer.eos_token_id,
+            **self._constraints(tokenizer),
+            **(stopping_criteria([cancel.is_set]) if cancel is not None else {}),
+            **params
+        )
+        # A cut-off completion must not be parsed (or cached) as a response
+        check_cancelled(cancel)
+        # Decode only the completion: the prompt's format example would
+        # otherwise be parsed as a file
+        prompt_length = inputs["input_ids"].shape[1]
+        record_tokens(len(outputs[0]) - prompt_length, time.perf_counter() - start)
+        return tokenizer.decode(outputs[0][prompt_length:], skip_special_tokens=True)
+
+    def stream(self, prompt: str, params: Dict[str, Any],
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        from transformers import TextIteratorStreamer
+
+        key, tokenizer, model = self._load()
+        draft = self._draft()
+        if draft is not None:
+            tokens: List[int] = []
+            text = ""
+            for step in self._speculative(tokenizer, model, draft, prompt, params):
+                check_cancelled(cancel)
+                tokens.extend(step)
+                # Decode the whole completion so multi-token characters come out whole
+                decoded = tokenizer.decode(tokens, skip_special_tokens=True)
+                if len(decoded) > len(text) and not decoded.endswith("\ufffd"):
+                    yield decoded[len(text):]
+                    text = decoded
+            decoded = tokenizer.decode(tokens, skip_special_tokens=True)
+            if len(decoded) > len(text):
+                yield decoded[len(text):]
+            return
+
+        inputs = self._inputs(key, tokenizer, model, prompt)
+        timeout = float((self.config.get("streaming") or {}).get("token_timeout_s", 300))
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+        failure: List[BaseException] = []
+        # Set when the reader goes away (closed generator, timeout, error), so
+        # the model stops decoding for nobody
+        abandoned = threading.Event()
+
+        def run():
+            try:
+                model.generate(
+                    **inputs,
+                    streamer=streamer,
+                    pad_token_id=tokenizer.eos_token_id,
+                    **self._constraints(tokenizer),
+                    **stopping_criteria([lambda: abandoned.is_set() or (cancel is not None and cancel.is_set())]),
+                    **params
+                )
+            except BaseException as e:  # re-raised by the reading thread
+                failure.append(e)
+                # Without its end marker the streamer would be waited on forever
+                streamer.end()
+
+        worker = threading.Thread(target=run, daemon=True)
+        worker.start()
+        try:
+            for text in streamer:
+                check_cancelled(cancel)
+                # end() after a failure flushes an empty chunk
+                if text:
+                    yield text
+        except queue.Empty:
+            raise TimeoutError(f"Model produced no output for {timeout:g}s") from None
+        finally:
+            abandoned.set()
+        worker.join()
+        if failure:
+            raise failure[0]
+        check_cancelled(cancel)
+
+
+class QuantizedCPUBackend(TransformersBackend):
+    """
+    The transformers model on CPU with its Linear layers dynamically quantized to int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, which
+    roughly quarters the memory of the Linear layers and speeds up matmuls on
+    machines without a GPU. Registered under its own registry key, so it can be
+    resident next to a float model of the same checkpoint.
+    """
+
+    name = "int8"
+
+    def _spec(self):
+        from agent.model_registry import model_spec
+        model_name, _, _ = model_spec(self.config)
+        return (model_name, "qint8", "none")
+
+
+class StubBackend(Backend):
+    """
+    Deterministic backend for tests and load tests: returns the canned mock response.
+
+    Unlike ``use_mock`` it goes through the same path as a real model
+    (generation cache, streaming, the job queue), so everything
+    around inference can be exercised without weights. ``stub.token_delay_ms``
+    adds a per-chunk delay to simulate generation speed.
+    """
+
+    name = "stub"
+
+    def _delay(self) -> float:
+        return float((self.config.get("stub") or {}).get("token_delay_ms", 0)) / 1000
+
+    def generate(self, prompt: str, params: Dict[str, Any], cancel: Optional[threading.Event] = None) -> str:
+        from agent.codegen import mock_response
+
+        start = time.perf_counter()
+        response = mock_response(prompt)
+        chunks = sum(1 for _ in word_chunks(response))
+        delay = self._delay()
+        for _ in range(chunks if delay else 0):
+            check_cancelled(cancel)
+            time.sleep(delay)
+        check_cancelled(cancel)
+        record_tokens(chunks, time.perf_counter() - start)
+        return response
+
+    def stream(self, prompt: str, params: Dict[str, Any],
+               cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        from agent.codegen import mock_response
+
+        delay = self._delay()
+        for chunk in word_chunks(mock_response(prompt)):
+            check_cancelled(cancel)
+            if delay:
+                time.sleep(delay)
+            yield chunk
+
+
+BACKENDS = {
+    "transformers": TransformersBackend,
+    "int8": QuantizedCPUBackend,
+    "stub": StubBackend,
+}
+
+
+def get_backend(config: Dict[str, Any]) -> Backend:
+    """
+    Return the inference backend named by the config's ``backend`` key.
+
+    Raises:
+        ValueError: If the name is not one of BACKENDS
+    """
+    name = config.get("backend", "transformers")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend '{name}'; expected one of {', '.join(BACKENDS)}")
+    return BACKENDS[name](config)
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from agent.main import run_task
+from agent.utils import load_config
+from agent.workspace import Workspace
+
+
+def read_tasks(input_path: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Stream the tasks of a JSONL file, one line at a time.
+
+    Each line is an object with ``task`` (or ``prompt``, or ``title`` and
+    ``body`` as in requests.jsonl) and optionally ``id`` (or
+    ``request_id``), ``project`` and ``fix``. Blank lines are skipped; a line
+    that is not such an object yields an item with an ``error``.
+
+    Yields:
+        (line number, task dictionary with id, task, fix, project and key)
+    """
+    with open(input_path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as e:
+                yield line_no, {"id": f"line-{line_no}", "error": f"Invalid JSON: {e}"}
+                continue
+            if not isinstance(data, dict):
+                yield line_no, {"id": f"line-{line_no}", "error": "Expected a JSON object"}
+                continue
+            task = data.get("task") or data.get("prompt")
+            if not task and (data.get("title") or data.get("body")):
+                task = "\n\n".join(part for part in (data.get("title"), data.get("body")) if part)
+            task_id = str(data.get("id") or data.get("request_id") or f"line-{line_no}")
+            if not isinstance(task, str) or not task.strip():
+                yield line_no, {"id": task_id, "error": "No task text"}
+                continue
+            fix = bool(data.get("fix", False))
+            project = data.get("project")
+            # Identical prompts (ignoring whitespace) for the same target run once
+            key = hashlib.sha256(json.dumps([" ".join(task.split()), fix, project]).encode("utf-8")).hexdigest()
+            yield line_no, {"id": task_id, "task": task, "fix": fix, "project": project, "key": key}
+
+
+def task_project(task_id: str) -> str:
+    """Project name for a task without an explicit ``project``: its id, made safe."""
+    name = re.sub(r"\.{2,}", ".", re.sub(r"[^A-Za-z0-9_.-]+", "-", task_id)).lstrip("-_.")
+    if not name:
+        name = "task-" + hashlib.sha256(task_id.encode("utf-8")).hexdigest()[:12]
+    return Workspace.validate(name)
+
+
+def load_checkpoint(output_path: str) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]:
+    """
+    Read the results already written by an earlier (possibly crashed) run.
+
+    A last line cut off by a crash is truncated away, so appending continues
+    on a clean line. The last record of an id wins.
+
+    Returns:
+        (records by task id, first successful record by dedupe key)
+    """
+    by_id: Dict[str, Dict[str, Any]] = {}
+    by_key: Dict[str, Dict[str, Any]] = {}
+    if not os.path.exists(output_path):
+        return by_id, by_key
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        complete = data.rfind(b"\n") + 1
+        if complete < len(data):
+            f.truncate(complete)
+    for line in data[:complete].decode("utf-8", errors="replace").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        by_id[record["id"]] = record
+        if record.get("key") and record.get("status") != "error" and not record.get("duplicate_of"):
+            by_key.setdefault(record["key"], record)
+    return by_id, by_key
+
+
+def _run_one(item: Dict[str, Any], project_dir: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    project = item["project"]
+    start = time.perf_counter()
+    try:
+        project = project or task_project(item["id"])
+        result = run_task(item["task"], project_dir, item["fix"], config=config, project=project)
+        record = {"status": result["status"], "message": result["message"],
+                  "files": sorted(result.get("file_map") or {}), "source": result.get("source")}
+    except Exception as e:
+        record = {"status": "error", "message": str(e), "files": []}
+    return {"id": item["id"], "line": item["line"], "key": item["key"], "project": project, **record,
+            "seconds": time.perf_counter() - start, "finished_at": time.time()}
+
+
+def _record(item: Dict[str, Any], future: Future) -> Dict[str, Any]:
+    """The result record of a finished task; an error record if the task itself raised."""
+    try:
+        return future.result()
+    except Exception as e:
+        return {"id": item["id"], "line": item["line"], "key": item["key"], "project": item["project"],
+                "status": "error", "message": str(e), "files": [], "seconds": 0.0, "finished_at": time.time()}
+
+
+def _duplicate(item: Dict[str, Any], original: Dict[str, Any]) -> Dict[str, Any]:
+    return {**original, "id": item["id"], "line": item["line"], "duplicate_of": original["id"],
+            "seconds": 0.0, "finished_at": time.time()}
+
+
+def run_batch(input_path: str, output_path: Optional[str] = None, project_dir: str = "projects",
+              config: Optional[Dict[str, Any]] = None, max_workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Run every task of a JSONL file through a bounded worker pool.
+
+    Tasks are read line by line and at most two per worker are queued at a
+    time, so the input can be arbitrarily large. Each task works on its own
+    project (its ``project`` field, else one named after its id). A task
+    whose prompt matches an earlier one is not run again: it gets a copy of
+    that result with ``duplicate_of`` set. Every result is appended to
+    ``output_path`` as one JSON line (id, project, status, message, files,
+    seconds) and flushed to disk, which makes the file the checkpoint: run
+    the same command again after a crash and tasks that already have a
+    result are skipped (failed ones are retried).
+
+    Args:
+        input_path: JSONL file of tasks (see read_tasks)
+        output_path: JSONL file of results; defaults to ``<input>.results.jsonl``
+        project_dir: Directory containing the projects
+        config: Already-loaded configuration; read from config.yaml if omitted
+        max_workers: Tasks run at the same time (default: ``batch.max_workers``)
+
+    Returns:
+        Dictionary with status, message, counts per status, output path and total_s
+    """
+    if config is None:
+        config = load_config("config.yaml")
+    workers = max_workers or (config.get("batch") or {}).get("max_workers") or 2
+    if output_path is None:
+        output_path = os.path.splitext(input_path)[0] + ".results.jsonl"
+    directory = os.path.dirname(output_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    previous, results_by_key = load_checkpoint(output_path)
+    counts: Dict[str, int] = {}
+    lock = threading.Lock()
+    slots = threading.BoundedSemaphore(workers * 2)
+    running: Dict[str, Future] = {}
+    start = time.perf_counter()
+
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        def write(record: Dict[str, Any]) -> None:
+            with lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+                status = "duplicate" if record.get("duplicate_of") else record["status"]
+                counts[status] = counts.get(status, 0) + 1
+
+        def finished(item: Dict[str, Any], future: Future) -> None:
+            record = _record(item, future)
+            try:
+                with lock:
+                    running.pop(item["key"], None)
+                    if record["status"] != "error":
+                        results_by_key.setdefault(item["key"], record)
+                write(record)
+            finally:
+                # A slot that is never released stalls the input loop for good
+                slots.release()
+
+        for line_no, item in read_tasks(input_path):
+            item["line"] = line_no
+            if "error" in item:
+                # Bad input lines fail the same way every run: report them once
+                if item["id"] in previous:
+                    counts["skipped"] = counts.get("skipped", 0) + 1
+                    continue
+                write({"id": item["id"], "line": line_no, "status": "error", "message": item["error"], "files": []})
+                continue
+            done = previous.get(item["id"])
+            if done is not None and done.get("status") != "error":
+                counts["skipped"] = counts.get("skipped", 0) + 1
+                continue
+            with lock:
+                original = results_by_key.get(item["key"])
+                pending = running.get(item["key"]) if original is None else None
+            if original is not None:
+                write(_duplicate(item, original))
+                continue
+            if pending is not None:
+                pending.add_done_callback(lambda f, item=item: write(_duplicate(item, _record(item, f))))
+                continue
+
+            slots.acquire()
+            with lock:
+                # Registered before finished() can run for it
+                future = pool.submit(_run_one, item, project_dir, config)
+                running[item["key"]] = future
+            future.add_done_callback(lambda f, item=item: finished(item, f))
+
+    total_s = time.perf_counter() - start
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items())) or "nothing to do"
+    return {
+        "status": "warning" if counts.get("error") else "success",
+        "message": f"Batch finished in {total_s:.2f}s: {summary}. Results in {output_path}",
+        "counts": counts,
+        "output": output_path,
+        "total_s": total_s
+    }
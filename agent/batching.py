@@ -0,0 +1,229 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent.backends import check_cancelled, stopping_criteria
+from agent.jobs import TaskCancelled
+from agent.model_registry import on_evict
+
+
+class BatchScheduler:
+    """
+    Groups prompts that arrive close together into a single ``model.generate`` call.
+
+    Callers block in ``generate`` (or hold the Future from ``submit``) while a
+    background thread collects up to ``max_batch_size`` prompts, waiting at most
+    ``max_wait_ms`` after the first one arrives. The batch is left-padded with an
+    attention mask, generated in one pass, and each decoded output is handed back
+    to the caller that submitted it. A prompt that ends up alone in its batch
+    gets its inputs from ``prepare_single`` when given (e.g. to start from a
+    cached prompt prefix) instead of the padding tokenizer call.
+    ``per_batch`` returns extra generate arguments built anew for every batch,
+    such as stateful logits processors. A prompt submitted with a ``cancel``
+    event is dropped if the event is set before its batch starts, and its row
+    stops decoding (the others go on) if it is set during generation; either
+    way its Future raises TaskCancelled.
+    """
+
+    def __init__(self, tokenizer, model, max_batch_size: int = 8, max_wait_ms: float = 20,
+                 generate_kwargs: Optional[Dict[str, Any]] = None,
+                 prepare_single: Optional[Callable[[str], Dict[str, Any]]] = None,
+                 per_batch: Optional[Callable[[], Dict[str, Any]]] = None):
+        self.model = model
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.generate_kwargs = generate_kwargs or {}
+        self.prepare_single = prepare_single
+        self.per_batch = per_batch
+        self._queue: "Queue[Tuple[str, Future, Optional[threading.Event]]]" = Queue()
+        self._batches = 0
+        self._prompts = 0
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._closed_lock = threading.Lock()
+
+        # Decoder-only models must be padded on the left so generation continues
+        # directly from each prompt's last real token. The registry's tokenizer
+        # is shared with other threads, so the padding settings go on a copy
+        self.tokenizer = copy.deepcopy(tokenizer)
+        self.tokenizer.padding_side = "left"
+        if getattr(self.tokenizer, "pad_token", None) is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        self._worker = threading.Thread(target=self._loop, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def submit(self, prompt: str, cancel: Optional[threading.Event] = None) -> Future:
+        """Queue a prompt and return a Future resolving to its decoded output."""
+        future: Future = Future()
+        with self._closed_lock:
+            if not self._closed:
+                self._queue.put((prompt, future, cancel))
+                return future
+        # Closed (evicted or replaced) after the caller got it: no worker is
+        # left to pick the prompt up, so serve it here
+        self._serve([(prompt, future, cancel)])
+        return future
+
+    def generate(self, prompt: str, timeout: Optional[float] = None,
+                 cancel: Optional[threading.Event] = None) -> str:
+        """Queue a prompt and wait for its decoded output."""
+        return self.submit(prompt, cancel).result(timeout=timeout)
+
+    def close(self) -> None:
+        """Stop the worker once already-queued prompts are served."""
+        with self._closed_lock:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(_STOP)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "prompts": self._prompts,
+                "avg_batch_size": self._prompts / self._batches if self._batches else 0.0,
+            }
+
+    def _collect(self) -> Tuple[List[Tuple[str, Future, Optional[threading.Event]]], bool]:
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            self._serve(batch)
+
+    def _serve(self, batch: List[Tuple[str, Future, Optional[threading.Event]]]) -> None:
+        # Cancelled while queued: not worth a row
+        for _, future, cancel in batch:
+            if cancel is not None and cancel.is_set():
+                future.set_exception(TaskCancelled("Task cancelled"))
+        batch = [item for item in batch if not item[1].done()]
+        if not batch:
+            return
+        prompts = [prompt for prompt, _, _ in batch]
+        try:
+            texts = self._generate_batch(prompts, [cancel for _, _, cancel in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+        with self._stats_lock:
+            self._batches += 1
+            self._prompts += len(batch)
+        for (_, future, cancel), text in zip(batch, texts):
+            try:
+                # A row cut off by its cancel event is not a response
+                check_cancelled(cancel)
+            except TaskCancelled as e:
+                future.set_exception(e)
+                continue
+            future.set_result(text)
+
+    def _generate_batch(self, prompts: List[str],
+                        cancels: Optional[List[Optional[threading.Event]]] = None) -> List[str]:
+        if len(prompts) == 1 and self.prepare_single is not None:
+            inputs = self.prepare_single(prompts[0])
+        else:
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+        outputs = self.model.generate(
+            **inputs,
+            pad_token_id=self.tokenizer.pad_token_id,
+            **(self.per_batch() if self.per_batch is not None else {}),
+            **_cancel_criteria(cancels or []),
+            **self.generate_kwargs
+        )
+        # Rows are left-padded to the same width, so every completion starts at
+        # the same offset; decode only the completion, as the unbatched path does
+        prompt_length = len(inputs["input_ids"][0])
+        return self.tokenizer.batch_decode([row[prompt_length:] for row in outputs], skip_special_tokens=True)
+
+
+def _cancel_criteria(cancels: List[Optional[threading.Event]]) -> Dict[str, Any]:
+    """Stopping criteria ending each row whose cancel event gets set ({} if no row can be cancelled)."""
+    if all(cancel is None for cancel in cancels):
+        return {}
+    return stopping_criteria([cancel.is_set if cancel is not None else _never for cancel in cancels])
+
+
+def _never() -> bool:
+    return False
+
+
+_STOP: Any = object()
+
+_schedulers: "OrderedDict[Any, BatchScheduler]" = OrderedDict()
+_schedulers_lock = threading.Lock()
+
+
+def get_scheduler(key, tokenizer, model, config: Dict[str, Any],
+                  generate_kwargs: Dict[str, Any],
+                  prepare_single: Optional[Callable[[str], Dict[str, Any]]] = None,
+                  per_batch: Optional[Callable[[], Dict[str, Any]]] = None) -> BatchScheduler:
+    """
+    Return the shared scheduler for a loaded model, creating it on first use.
+
+    There is one scheduler per model and set of sampling parameters; beyond
+    ``batching.max_schedulers`` the least recently used one is closed, and
+    those of a model the registry evicts are closed with it.
+
+    Args:
+        key: Registry key of the model (one scheduler per loaded model)
+        tokenizer: Tokenizer of the model
+        model: The loaded model
+        config: Configuration dictionary; reads the ``batching`` section
+        generate_kwargs: Sampling parameters applied to every batch
+        prepare_single: Builds generate inputs for a batch of one prompt
+        per_batch: Builds extra generate arguments for every batch
+    """
+    settings = config.get("batching") or {}
+    scheduler_key = (key, tuple(sorted(generate_kwargs.items())))
+    with _schedulers_lock:
+        scheduler = _schedulers.get(scheduler_key)
+        # A model evicted and reloaded by the registry gets a fresh scheduler
+        if scheduler is not None and scheduler.model is model:
+            _schedulers.move_to_end(scheduler_key)
+        else:
+            if scheduler is not None:
+                scheduler.close()
+            scheduler = BatchScheduler(
+                tokenizer,
+                model,
+                max_batch_size=settings.get("max_batch_size", 8),
+                max_wait_ms=settings.get("max_wait_ms", 20),
+                generate_kwargs=generate_kwargs,
+                prepare_single=prepare_single,
+                per_batch=per_batch,
+            )
+            _schedulers[scheduler_key] = scheduler
+            while len(_schedulers) > max(1, int(settings.get("max_schedulers", 4))):
+                _schedulers.popitem(last=False)[1].close()
+        return scheduler
+
+
+def _close_evicted(key: Any) -> None:
+    with _schedulers_lock:
+        for scheduler_key in [k for k in _schedulers if k[0] == key]:
+            _schedulers.pop(scheduler_key).close()
+
+
+on_evict(_close_evicted)
@@ -1,25 +1,102 @@
 import ast
 import os
+import time
+
+from agent.file_ops import content_hash
+
+MAX_REPAIR_PASSES = 50
+
+def _indent(line):
+    return line[:len(line) - len(line.lstrip())]
+
+def _previous_code_line(lines, index):
+    for i in range(index - 1, -1, -1):
+        if lines[i].strip():
+            return lines[i]
+    return ""
+
+def _repair_once(lines, error):
+    # Apply one heuristic for the reported error; returns False if none applies
+    if error.lineno is None or not 0 < error.lineno <= len(lines):
+        return False
+    error_line = error.lineno - 1
+    message = str(error.msg).lower()
+    line = lines[error_line]
+    if "unexpected indent" in message:
+        fixed = line.lstrip()
+    elif "expected ':'" in message:
+        fixed = line.rstrip() + ":"
+    elif "expected an indented block" in message:
+        fixed = _indent(_previous_code_line(lines, error_line)) + "    " + line.lstrip()
+    elif "unindent does not match" in message:
+        fixed = _indent(_previous_code_line(lines, error_line)) + line.lstrip()
+    else:
+        return False
+    if fixed == line:
+        return False
+    lines[error_line] = fixed
+    return True
+
+def repair_code(code):
+    """
+    Repair syntax errors by applying heuristics until the code parses.
+
+    Each pass fixes the error ast reports and parses again, so code with
+    several errors is repaired in one call. Gives up when no heuristic applies
+    or after MAX_REPAIR_PASSES passes.
+
+    Args:
+        code: Python source
+
+    Returns:
+        Tuple of (fixed code or None, number of fixes applied, last error
+        message or None). Fixed code is None if the code already parses or
+        could not be repaired.
+    """
+    lines = code.split("\n")
+    fixes = 0
+    for _ in range(MAX_REPAIR_PASSES + 1):
+        try:
+            ast.parse("\n".join(lines))
+            return ("\n".join(lines) if fixes else None), fixes, None
+        except SyntaxError as e:
+            error = e
+        if fixes == MAX_REPAIR_PASSES or not _repair_once(lines, error):
+            break
+        fixes += 1
+    return None, fixes, f"line {error.lineno}: {error.msg}"
 
 def fix_syntax_errors(file_path):
     if not os.path.exists(file_path):
         return None
     with open(file_path, "r") as f:
         code = f.read()
-    try:
-        ast.parse(code)
-        return None  # No syntax errors
-    except SyntaxError as e:
-        # Basic syntax error fixes (e.g., missing colons, incorrect indentation)
-        lines = code.split("\n")
-        error_line = e.lineno - 1
-        if "unexpected indent" in str(e).lower():
-            lines[error_line] = lines[error_line].lstrip()
-        elif "expected ':'" in str(e).lower():
-            lines[error_line] = lines[error_line].rstrip() + ":"
-        fixed_code = "\n".join(lines)
-        try:
-            ast.parse(fixed_code)
-            return fixed_code
-        except SyntaxError:
-            return None  # Unable to fix
\ No newline at end of file
+    fixed_code, _, _ = repair_code(code)
+    return fixed_code
+
+def check_source(path, code):
+    """
+    Parse and, if needed, repair one file's source (runs in a worker process).
+
+    Returns:
+        Dictionary with path, status ("ok", "fixed" or "unfixable"), fixes,
+        error, code (the repaired source, for "fixed"), hash of the final
+        source and seconds spent
+    """
+    start = time.perf_counter()
+    fixed_code, fixes, error = repair_code(code)
+    if fixed_code is not None:
+        status, final = "fixed", fixed_code
+    elif error is None:
+        status, final = "ok", code
+    else:
+        status, final = "unfixable", code
+    return {
+        "path": path,
+        "status": status,
+        "fixes": fixes,
+        "error": error,
+        "code": fixed_code,
+        "hash": content_hash(final),
+        "seconds": time.perf_counter() - start,
+    }
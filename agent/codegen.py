@@ -1,14 +1,52 @@
-from typing import List, Dict
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+import threading
+from typing import Any, Iterable, List, Dict, Optional, Union
 
-def generate_code(prompt, config):
+from agent.backends import get_backend
+from agent.constrained import record_generation, useful_length
+from agent.gen_cache import get_generation_cache
+from agent.jobs import TaskCancelled
+from agent.prompt_engine import prompt_task
+from agent.response_parser import classify_task, iter_code_files
+from agent.speculative import speculative_settings
+from agent.tracing import cache_lookup, span
+
+DEFAULT_GENERATION = {
+    "max_new_tokens": 1000,
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "do_sample": True,
+}
+
+def generation_params(config: Dict[str, Any]) -> Dict[str, Any]:
+    """Sampling parameters for model.generate, overridable via the config's ``generation`` section."""
+    params = dict(DEFAULT_GENERATION)
+    params.update(config.get("generation") or {})
+    if speculative_settings(config) is not None:
+        # Draft tokens are verified against the main model's greedy choice, so
+        # speculative decoding is greedy whatever the sampling settings
+        params["do_sample"] = False
+        params.pop("temperature", None)
+        params.pop("top_p", None)
+    return params
+
+def task_type(prompt: str) -> str:
+    """
+    "edit" or "create" for the files generated from a prompt.
+
+    Decided by the task, not the response, so a streamed response (of which
+    only the start is known when its first file is written) and a whole one
+    are labelled alike.
+    """
+    return classify_task(prompt_task(prompt))
+
+def generate_code(prompt, config, cancel: Optional[threading.Event] = None):
     """
     Generate code based on the given prompt and configuration.
     
     Args:
         prompt: The prompt to generate code from
         config: Configuration dictionary containing model settings
+        cancel: When set, the model stops decoding and TaskCancelled is raised
         
     Returns:
         List of dictionaries containing file paths and their generated code
@@ -20,42 +58,60 @@ def generate_code(prompt, config):
     model_name = config.get("model", "mistralai/Mistral-7B-v0.1")
     use_mock = config.get("use_mock", True)  # Default to mock for now
     
-    # If we're not using mock and transformers is available, try to use the real model
-    if not use_mock and TRANSFORMERS_AVAILABLE:
-        try:
-            tokenizer = AutoTokenizer.from_pretrained(model_name)
-            model = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                device_map="auto",
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-            )
-            
-            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=1000,
-                temperature=0.7,
-                top_p=0.95,
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id
-            )
-            
-            response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-            return parse_code_response(response)
+    # If we're not using mock and the backend's framework is installed, try the real model;
+    # in mock mode the backend is never resolved, so its name need not be valid
+    backend = None if use_mock else get_backend(config)
+    with span("generate", backend="mock" if use_mock else backend.name) as generate_span:
+        if not use_mock and backend.available():
+            params = generation_params(config)
+            cache = get_generation_cache(config)
+            if cache is not None:
+                cached = cache.get(prompt, backend.identity(), params)
+                cache_lookup("generation", cached is not None)
+                if cached is not None:
+                    return cached
             
-        except Exception as e:
-            print(f"Warning: Failed to generate code with {model_name}: {str(e)}")
-            print("Falling back to mock response...")
+            try:
+                with span("inference") as inference_span:
+                    response = backend.generate(prompt, params, cancel)
+                with span("parse"):
+                    files = parse_code_response(response, task_type(prompt))
+                record_generation(config, inference_span.attrs.get("tokens"), len(response),
+                                  useful_length(response) if files else 0)
+                if cache is not None:
+                    cache.put(prompt, backend.identity(), params, files)
+                return files
+                
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                print(f"Warning: Failed to generate code with {model_name}: {str(e)}")
+                print("Falling back to mock response...")
+                generate_span.attrs["backend"] = "mock"
+        
+        with span("parse"):
+            return parse_code_response(mock_response(prompt), task_type(prompt))
+
+def mock_response(prompt: str) -> str:
+    """
+    Build the canned response used when no model is available.
     
+    Args:
+        prompt: The prompt to generate code from
+        
+    Returns:
+        Raw response text in the same FILE/fence format a model produces
+    """
     # Use mock response based on task
     print(f"Using mock response for prompt: {prompt[:100]}...")
     
-    # Check for different types of tasks to provide appropriate mock responses
-    task = prompt.lower()
+    # Check for different types of tasks to provide appropriate mock responses.
+    # Only look at the task itself: the system block mentions Flask and FastAPI.
+    task = prompt.rsplit("Task:", 1)[-1].lower()
     
     # Flask app generation
     if "flask" in task:
-        mock_response = """
+        response = """
 FILE: app.py
 ```python
 from flask import Flask, render_template, jsonify, request
@@ -116,7 +172,7 @@ FILE: templates/index.html
 """
     # FastAPI app generation
     elif "fastapi" in task:
-        mock_response = """
+        response = """
 FILE: main.py
 ```python
 from fastapi import FastAPI, HTTPException
@@ -170,14 +226,14 @@ pydantic==1.8.2
 """
     # Basic Python script
     elif any(keyword in task for keyword in ["script", "function", "calculate"]):
-        mock_response = """
+        response = """
 FILE: main.py
 ```python
 def main():
     print("Hello, World!")
     
     # Example function based on the task
-    if "calculate" in """ + task.lower() + """:
+    if "calculate" in """ + repr(task.strip()) + """:
         result = 42  # Example calculation
         print(f"The answer is: {result}")
         return result
@@ -188,7 +244,7 @@ if __name__ == "__main__":
 """
     # Default response
     else:
-        mock_response = """
+        response = """
 FILE: main.py
 ```python
 # This is a generated Python script
@@ -202,51 +258,22 @@ if __name__ == "__main__":
 ```
 """
     
-    return parse_code_response(mock_response)
+    return response
 
-def parse_code_response(response: str) -> List[Dict[str, str]]:
+def parse_code_response(response: Union[str, Iterable[str]], task: Optional[str] = None) -> List[Dict[str, str]]:
     """
     Parse the response from the code generation into a list of files.
     
+    The response is scanned once; see ``agent.response_parser`` for the format
+    rules and ``iter_code_files`` for a lazy version.
+    
     Args:
-        response: The raw response string from the model
+        response: The raw response string from the model, or an iterable of
+            text chunks as they are generated
+        task: "edit" or "create" for every file (see ``task_type``); derived
+            from the response when omitted
         
     Returns:
         List of dictionaries containing file paths and their code
     """
-    files = []
-    current_file = None
-    current_code = []
-    in_code_block = False
-    
-    for line in response.split("\n"):
-        if line.startswith("FILE:"):
-            # Save the previous file if it exists
-            if current_file and current_code:
-                files.append({
-                    "path": current_file.strip(),
-                    "code": "\n".join(current_code).strip(),
-                    "task": "edit" if any(keyword in response.lower() 
-                                      for keyword in ["add", "edit", "update", "modify", "fix"]) 
-                            else "create"
-                })
-            # Start a new file
-            current_file = line.replace("FILE:", "").strip()
-            current_code = []
-            in_code_block = False
-        elif line.strip() == "```" or line.strip().startswith("```"):
-            in_code_block = not in_code_block
-        elif in_code_block or (line.strip() and not line.startswith("```")):
-            current_code.append(line)
-    
-    # Add the last file if it exists
-    if current_file and current_code:
-        files.append({
-            "path": current_file.strip(),
-            "code": "\n".join(current_code).strip(),
-            "task": "edit" if any(keyword in response.lower() 
-                               for keyword in ["add", "edit", "update", "modify", "fix"]) 
-                    else "create"
-        })
-    
-    return files
\ No newline at end of file
+    return list(iter_code_files(response, task))
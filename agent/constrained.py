@@ -0,0 +1,316 @@
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.backends import get_backend
+from agent.response_parser import FileBlockParser
+from agent.speculative import speculative_settings
+from agent.tracing import annotate, metrics
+
+# Grammar states are small tuples, so they double as cache keys for token masks:
+#   ("start", newlines, matched)            before the first "FILE:"
+#   ("path", part, length)                  after "FILE:"; 0 right after it, 1 after the space, 2 in the path
+#   ("open", ticks)                         the line after the path: the opening fence
+#   ("lang", ticks, length)                 the fence's language tag
+#   ("code", ticks, depth, line, started)   inside the block; ``line`` classifies the current
+#                                           line, ``started`` once a line of code is complete
+#   ("after", newlines, matched)            after a closing fence: another "FILE:" or the end
+#   ("end",)                                after the end-of-sequence token
+#   ("free",)                               the output left the grammar; nothing is constrained
+START = ("start", 0, 0)
+END = ("end",)
+FREE = ("free",)
+
+FILE_TAG = "FILE:"
+# Newlines allowed before the first FILE:, and from a closing fence to the next
+# one (2 = one blank line); any more could run on forever. FILE: must start its
+# line, so no other whitespace is allowed there.
+MAX_LEADING_NEWLINES = 2
+MAX_NEWLINES_BETWEEN_FILES = 2
+LANG_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_+#.-")
+MAX_PATH_LENGTH = 80
+MAX_LANG_LENGTH = 20
+PATH_CHARS = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.-/")
+
+_LINE_START = ("start",)
+_LINE_TEXT = ("text",)
+
+
+def _line_step(line: Tuple, ch: str) -> Optional[Tuple]:
+    """Classify the current code line after one more character, as FileBlockParser will read it."""
+    kind = line[0]
+    if kind == "start":
+        if ch == "F":
+            return ("file", 1)
+        if ch == "`":
+            return ("ticks", 1)
+        return ("ticks", 0) if ch in " \t" else _LINE_TEXT
+    if kind == "ticks":
+        ticks = line[1]
+        if ch == "`":
+            return ("ticks", ticks + 1)
+        if ticks == 0 and ch in " \t":
+            return line
+        if ticks >= 3:
+            return ("fence", ticks, not ch.isspace())
+        return _LINE_TEXT
+    if kind == "fence":
+        return line if line[2] or ch.isspace() else ("fence", line[1], True)
+    if kind == "file":
+        if ch != FILE_TAG[line[1]]:
+            return _LINE_TEXT
+        # A "FILE:" line inside a block would end the file without its fence
+        return ("file", line[1] + 1) if line[1] + 1 < len(FILE_TAG) else None
+    return _LINE_TEXT
+
+
+def _closes(line: Tuple, ticks: int, depth: int, started: bool) -> bool:
+    """True if the current line is a bare fence that closes the outer block."""
+    # The parser drops a block without a single line of code
+    bare = (line[0] == "ticks" and line[1] >= 3) or (line[0] == "fence" and not line[2])
+    return bare and depth == 0 and line[1] >= ticks and started
+
+
+def step(state: Tuple, ch: str) -> Optional[Tuple]:
+    """The grammar state after one character, or None if the character is not allowed."""
+    kind = state[0]
+    if kind == "code":
+        _, ticks, depth, line, started = state
+        if ch != "\n":
+            line = _line_step(line, ch)
+            return None if line is None else ("code", ticks, depth, line, started)
+        if line[0] == "fence" and line[2]:
+            return ("code", ticks, depth + 1, _LINE_START, True)
+        if (line[0] == "ticks" and line[1] >= 3) or line[0] == "fence":
+            if depth:
+                return ("code", ticks, depth - 1, _LINE_START, True)
+            if line[1] >= ticks:
+                return ("after", 0, 0) if started else None
+        return ("code", ticks, depth, _LINE_START, True)
+    if kind == "start" or kind == "after":
+        _, newlines, matched = state
+        if matched == 0 and ch == "\n":
+            # The closing fence's own newline is already behind "after"
+            limit = MAX_LEADING_NEWLINES if kind == "start" else MAX_NEWLINES_BETWEEN_FILES - 1
+            return (kind, newlines + 1, 0) if newlines < limit else None
+        if ch != FILE_TAG[matched]:
+            return None
+        return (kind, newlines, matched + 1) if matched + 1 < len(FILE_TAG) else ("path", 0, 0)
+    if kind == "path":
+        _, part, length = state
+        if ch == "\n":
+            return ("open", 0) if part == 2 else None
+        if ch == " ":
+            return ("path", 1, 0) if part == 0 else None
+        return ("path", 2, length + 1) if ch in PATH_CHARS and length < MAX_PATH_LENGTH else None
+    if kind == "open":
+        ticks = state[1]
+        if ch == "`":
+            return ("open", ticks + 1)
+        if ticks < 3:
+            return None
+        if ch == "\n":
+            return ("code", ticks, 0, _LINE_START, False)
+        return ("lang", ticks, 1) if ch in LANG_CHARS else None
+    if kind == "lang":
+        _, ticks, length = state
+        if ch == "\n":
+            return ("code", ticks, 0, _LINE_START, False)
+        return ("lang", ticks, length + 1) if ch in LANG_CHARS and length < MAX_LANG_LENGTH else None
+    if kind == "free":
+        return state
+    return None
+
+
+def advance(state: Tuple, text: str) -> Optional[Tuple]:
+    """The grammar state after ``text``, or None if any of it is not allowed."""
+    i = 0
+    while i < len(text):
+        if state[0] == "code" and state[3] is _LINE_TEXT:
+            # Ordinary code: nothing matters until the end of the line
+            i = text.find("\n", i)
+            if i == -1:
+                return state
+        state = step(state, text[i])
+        if state is None:
+            return None
+        i += 1
+    return state
+
+
+def can_end(state: Tuple) -> bool:
+    """True if the response may stop here: right after a file's closing fence."""
+    if state[0] == "after":
+        return state[2] == 0
+    return state[0] == "code" and _closes(state[3], state[1], state[2], state[4])
+
+
+class GrammarMasks:
+    """
+    The token ids allowed in each grammar state, for one tokenizer.
+
+    Each token's text is decoded once; the mask of a state is computed the
+    first time the state is reached (one pass over the vocabulary) and reused
+    by every later generation.
+    """
+
+    def __init__(self, tokenizer):
+        self.eos_token_id = tokenizer.eos_token_id
+        self.texts = token_texts(tokenizer)
+        self._masks: Dict[Tuple[Tuple, int, Any], Any] = {}
+        self._lock = threading.Lock()
+
+    def advance(self, state: Tuple, token_id: int) -> Tuple:
+        """The state after a generated token; FREE if it broke the grammar."""
+        if state in (END, FREE):
+            return state
+        if token_id == self.eos_token_id:
+            return END
+        text = self.texts[token_id] if token_id < len(self.texts) else ""
+        next_state = advance(state, text) if text else None
+        return FREE if next_state is None else next_state
+
+    def mask(self, state: Tuple, vocab_size: int, device) -> Optional[Any]:
+        """Boolean tensor of the allowed token ids, or None if everything is allowed."""
+        if state in (END, FREE):
+            return None
+        key = (state, vocab_size, str(device))
+        with self._lock:
+            mask = self._masks.get(key)
+        if mask is None:
+            import torch
+
+            allowed = [token_id for token_id, text in enumerate(self.texts[:vocab_size])
+                       if text and advance(state, text) is not None]
+            if can_end(state) and self.eos_token_id is not None:
+                allowed.append(self.eos_token_id)
+            if not allowed:
+                # A dead end for this vocabulary: stop rather than break the format
+                allowed = [self.eos_token_id] if self.eos_token_id is not None else list(range(vocab_size))
+            mask = torch.zeros(vocab_size, dtype=torch.bool)
+            mask[allowed] = True
+            mask = mask.to(device)
+            with self._lock:
+                self._masks[key] = mask
+        return mask
+
+
+def token_texts(tokenizer) -> List[str]:
+    """
+    The text every token id contributes to a decoded sequence ("" for special tokens).
+
+    Tokens are decoded after an anchor token, so the leading space of
+    SentencePiece and byte-level tokens is kept.
+    """
+    special = set(tokenizer.all_special_ids)
+    anchor_id = tokenizer.convert_tokens_to_ids("a")
+    anchor = tokenizer.decode([anchor_id], clean_up_tokenization_spaces=False)
+    texts = []
+    for token_id in range(len(tokenizer)):
+        if token_id in special:
+            texts.append("")
+            continue
+        text = tokenizer.decode([anchor_id, token_id], clean_up_tokenization_spaces=False)
+        texts.append(text[len(anchor):] if text.startswith(anchor) else
+                     tokenizer.decode([token_id], clean_up_tokenization_spaces=False))
+    return texts
+
+
+_masks: "weakref.WeakKeyDictionary[Any, GrammarMasks]" = weakref.WeakKeyDictionary()
+_masks_lock = threading.Lock()
+
+
+def get_grammar_masks(tokenizer) -> GrammarMasks:
+    """Return the shared masks of a loaded tokenizer, decoding its vocabulary on first use."""
+    with _masks_lock:
+        masks = _masks.get(tokenizer)
+        if masks is None:
+            masks = GrammarMasks(tokenizer)
+            _masks[tokenizer] = masks
+        return masks
+
+
+class FileGrammarProcessor:
+    """
+    transformers logits processor that only lets the model produce the FILE/fence format.
+
+    Every row of the batch must start with ``FILE: <path>``, an opening fence
+    and code, and may only stop, or start the next ``FILE:``, right after a
+    block's closing fence (with at most one blank line in between). Prose
+    around the files, which the parser would drop, cannot be generated, and
+    generation ends as soon as the model chooses not to start another file
+    instead of running on to ``max_new_tokens``.
+
+    Keeps one grammar state per row, so it serves one ``generate`` call
+    without beam search; create a new one per call.
+    """
+
+    def __init__(self, tokenizer):
+        self.masks = get_grammar_masks(tokenizer)
+        self.states: Optional[List[Tuple]] = None
+
+    def __call__(self, input_ids, scores):
+        if self.states is None:
+            # First step: input_ids is the prompt
+            self.states = [START] * input_ids.shape[0]
+        else:
+            for row, token_id in enumerate(input_ids[:, -1].tolist()):
+                self.states[row] = self.masks.advance(self.states[row], token_id)
+        for row, state in enumerate(self.states):
+            mask = self.masks.mask(state, scores.shape[-1], scores.device)
+            if mask is not None:
+                scores[row] = scores[row].masked_fill(~mask, float("-inf"))
+        return scores
+
+
+def constrained_settings(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The config's ``constrained`` section if decoding is grammar-constrained, else None."""
+    settings = config.get("constrained") or {}
+    # Speculative decoding verifies draft tokens against the unconstrained argmax
+    if not settings.get("enabled") or speculative_settings(config) is not None:
+        return None
+    return settings
+
+
+def decoding_mode(config: Dict[str, Any]) -> str:
+    """ "constrained" if the configured backend generates under the grammar, else "free"."""
+    if (config.get("use_mock", True) or constrained_settings(config) is None
+            or not get_backend(config).constrained_decoding):
+        return "free"
+    return "constrained"
+
+
+def useful_length(response: str) -> int:
+    """Length of ``response`` up to the end of its last complete file block."""
+    parser = FileBlockParser(task="create")
+    offset = end = 0
+    for line in response.splitlines(keepends=True):
+        offset += len(line)
+        if parser.line(line.rstrip("\r\n")) is not None:
+            # A FILE: line completes the previous (unfenced) file
+            end = offset if not line.startswith("FILE:") else offset - len(line)
+    if parser.close():
+        end = len(response)
+    return end
+
+
+def record_generation(config: Dict[str, Any], tokens: Optional[int], chars: int, useful_chars: int) -> None:
+    """
+    Count one model generation and the tokens it wasted, by decoding mode.
+
+    Wasted tokens are those after the last complete file (text the parser
+    drops), estimated from the share of characters; a response without any
+    file wastes all of them.
+    """
+    mode = decoding_mode(config)
+    metrics.inc("codenex_generations_total", mode=mode)
+    if not tokens or not chars:
+        return
+    wasted = round(tokens * (chars - useful_chars) / chars)
+    metrics.inc("codenex_wasted_tokens_total", wasted, mode=mode)
+    annotate(wasted_tokens=wasted)
+
+
+def record_retry(config: Dict[str, Any], reason: str) -> None:
+    """Count a regeneration ("no_files" or "invalid"), by decoding mode."""
+    metrics.inc("codenex_retries_total", mode=decoding_mode(config), reason=reason)
@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Any, Dict, Iterable, Optional
+
+
+class FileMap(dict):
+    """
+    dict that remembers which keys changed since it was loaded or last saved.
+
+    ``update_file_map`` uses this to write only the changed entries, so saving
+    costs O(changes) instead of O(size of the map).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._dirty = set()
+        self._deleted = set()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._dirty.add(key)
+        self._deleted.discard(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._dirty.discard(key)
+        self._deleted.add(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def popitem(self):
+        key = next(reversed(self))
+        return key, self.pop(key)
+
+    def clear(self):
+        for key in list(self):
+            del self[key]
+
+    def changes(self):
+        """Return (changed keys, deleted keys) since the last ``mark_clean``."""
+        return set(self._dirty), set(self._deleted)
+
+    def mark_clean(self):
+        self._dirty.clear()
+        self._deleted.clear()
+
+
+class FileMapStore:
+    """
+    SQLite-backed file map (one row per path) in WAL mode.
+
+    WAL lets readers proceed while a writer commits, SQLite's own locking
+    serialises concurrent writers across threads and processes, and each
+    update touches only the rows that changed. On first use an existing JSON
+    file map is imported.
+    """
+
+    def __init__(self, db_path: str, legacy_json_path: Optional[str] = None):
+        self.db_path = db_path
+        self.legacy_json_path = legacy_json_path
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure(self) -> None:
+        if self._initialised:
+            return
+        with self._init_lock:
+            if self._initialised:
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS file_map (path TEXT PRIMARY KEY, entry TEXT NOT NULL)")
+                    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+                    self._migrate(conn)
+            self._initialised = True
+
+    def _migrate(self, conn: sqlite3.Connection) -> None:
+        # Import the legacy JSON file map exactly once
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+        legacy = {}
+        path = self.legacy_json_path
+        if path and os.path.exists(path) and os.path.getsize(path) > 0:
+            try:
+                with open(path, "r") as f:
+                    legacy = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                legacy = {}
+        conn.executemany(
+            "INSERT OR IGNORE INTO file_map (path, entry) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in legacy.items()],
+        )
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('json_migrated', ?)", (path or "",))
+
+    def load(self) -> FileMap:
+        self._ensure()
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT path, entry FROM file_map").fetchall()
+        file_map = FileMap((path, json.loads(entry)) for path, entry in rows)
+        file_map.mark_clean()
+        return file_map
+
+    def get(self, path: str) -> Optional[Dict[str, Any]]:
+        self._ensure()
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT entry FROM file_map WHERE path = ?", (path,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def write(self, upserts: Dict[str, Any], deletes: Iterable[str] = (), replace: bool = False) -> None:
+        """
+        Apply changes in one transaction.
+
+        Args:
+            upserts: Entries to insert or overwrite
+            deletes: Paths to remove
+            replace: Remove every row not in ``upserts`` (full-map save)
+        """
+        self._ensure()
+        with closing(self._connect()) as conn:
+            with conn:
+                if replace:
+                    conn.execute("DELETE FROM file_map")
+                conn.executemany(
+                    "INSERT OR REPLACE INTO file_map (path, entry) VALUES (?, ?)",
+                    [(key, json.dumps(value)) for key, value in upserts.items()],
+                )
+                conn.executemany("DELETE FROM file_map WHERE path = ?", [(key,) for key in deletes])
+
+
+_stores: Dict[str, FileMapStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(file_map_path: str) -> FileMapStore:
+    """
+    Return the store for a file map path such as ``memory/file_map.json``.
+
+    The database lives next to it as ``file_map.db``; the JSON file, if present,
+    is only read once to migrate its entries.
+    """
+    db_path = os.path.splitext(file_map_path)[0] + ".db"
+    # Keyed by absolute path: the same relative path means another file after a chdir
+    key = os.path.abspath(db_path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = FileMapStore(db_path, legacy_json_path=file_map_path)
+            _stores[key] = store
+        return store
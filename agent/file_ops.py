@@ -1,53 +1,218 @@
 import os
-import json
-import ast
+import hashlib
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-def save_project_files(files, project_dir, file_map):
-    os.makedirs(project_dir, exist_ok=True)
-    for file_info in files:
-        file_path = os.path.join(project_dir, file_info["path"])
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        if os.path.exists(file_path) and file_info.get("task") == "edit":
-            with open(file_path, "r") as f:
-                existing_content = f.read()
+from agent.file_map_store import FileMap, get_store
+from agent.merge import merge_file
+from agent.symbol_index import get_symbol_index
+from agent.tracing import metrics, span
+
+# Per-project directory (hidden from the file tree) holding the last version
+# the agent wrote of each Python file, used as the base of three-way merges
+BASE_DIR = os.path.join(".codenex", "base")
+
+_new_file_mode = None
+
+def _default_mode():
+    # mkstemp creates files as 0600; new files get the mode plain open() would
+    # give. os.umask() can only be read by setting it, which would briefly
+    # change it for every thread, so read it from /proc or from a probe file.
+    global _new_file_mode
+    if _new_file_mode is None:
+        try:
+            with open("/proc/self/status", encoding="ascii") as f:
+                umask = next(int(line.split()[1], 8) for line in f if line.startswith("Umask:"))
+            _new_file_mode = 0o666 & ~umask
+        except (OSError, StopIteration, ValueError, IndexError):
+            probe_dir = tempfile.mkdtemp(prefix="codenex-umask-")
+            probe = os.path.join(probe_dir, "probe")
             try:
-                # Parse existing code with AST
-                existing_ast = ast.parse(existing_content)
-                new_content = file_info["code"]
-                new_ast = ast.parse(new_content)
-                # Merge: append new functions to existing code
-                existing_functions = {n.name for n in existing_ast.body if isinstance(n, ast.FunctionDef)}
-                new_functions = [n for n in new_ast.body if isinstance(n, ast.FunctionDef) and n.name not in existing_functions]
-                if new_functions:
-                    existing_ast.body.extend(new_functions)
-                    merged_code = ast.unparse(existing_ast)
-                    with open(file_path, "w") as f:
-                        f.write(merged_code)
-                    file_map[file_info["path"]] = {"status": "edited"}
-                else:
-                    with open(file_path, "w") as f:
-                        f.write(new_content)
-                    file_map[file_info["path"]] = {"status": "edited"}
-            except SyntaxError:
-                # Fallback to overwrite if AST parsing fails
-                with open(file_path, "w") as f:
-                    f.write(file_info["code"])
-                file_map[file_info["path"]] = {"status": "edited"}
-        else:
-            with open(file_path, "w") as f:
-                f.write(file_info["code"])
-            file_map[file_info["path"]] = {"status": "created"}
+                os.close(os.open(probe, os.O_CREAT | os.O_WRONLY, 0o666))
+                _new_file_mode = os.stat(probe).st_mode & 0o777
+            finally:
+                _remove_quietly(probe)
+                os.rmdir(probe_dir)
+    return _new_file_mode
+
+def content_hash(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def _read_text(file_path):
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+def _base_path(project_dir, path):
+    return os.path.join(project_dir, BASE_DIR, path)
+
+def _save_base(project_dir, plan):
+    # Snapshot of what the agent wrote: the common ancestor for the next edit's merge
+    base_path = _base_path(project_dir, plan["path"])
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    tmp_path = f"{base_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(plan["content"])
+    os.replace(tmp_path, base_path)
+
+def _plan_file(file_info, project_dir):
+    # Work out the final content of one file without touching the disk
+    file_path = os.path.join(project_dir, file_info["path"])
+    existing_content = _read_text(file_path) if os.path.exists(file_path) else None
+    conflicts = []
+    if existing_content is not None and file_info.get("task") == "edit":
+        base_content = _read_text(_base_path(project_dir, file_info["path"]))
+        result = merge_file(file_info["path"], base_content, existing_content, file_info["code"])
+        content = result.content
+        conflicts = [conflict.to_dict() for conflict in result.conflicts]
+        status = "edited"
+    else:
+        content = file_info["code"]
+        status = "created"
+    unchanged = existing_content is not None and content_hash(existing_content) == content_hash(content)
+    return {"path": file_info["path"], "file_path": file_path, "content": content,
+            "status": status, "unchanged": unchanged, "conflicts": conflicts}
+
+def _write_temp(plan, fsync):
+    directory, name = os.path.split(plan["file_path"])
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{name}.", suffix=".tmp")
+    plan["tmp_path"] = tmp_path
+    try:
+        mode = os.stat(plan["file_path"]).st_mode & 0o7777
+    except OSError:
+        mode = _default_mode()
+    os.chmod(tmp_path, mode)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(plan["content"])
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def _backup(file_path, backup_path):
+    # A second name for the original (a copy where hard links are not supported),
+    # so the target path itself never goes missing
+    try:
+        os.link(file_path, backup_path)
+    except OSError:
+        shutil.copy2(file_path, backup_path)
+
+def _commit(plans):
+    # Swap every temp file into place; if any swap fails, put the originals back
+    done = []
+    try:
+        for plan in plans:
+            if os.path.exists(plan["file_path"]):
+                plan["backup_path"] = plan["tmp_path"] + ".bak"
+                _backup(plan["file_path"], plan["backup_path"])
+            done.append(plan)
+            os.replace(plan["tmp_path"], plan["file_path"])
+    except Exception:
+        for plan in reversed(done):
+            if "backup_path" in plan:
+                os.replace(plan["backup_path"], plan["file_path"])
+                # Still linked if the swap never happened: renaming a file onto
+                # another name of itself does nothing
+                _remove_quietly(plan["backup_path"])
+            elif not os.path.exists(plan["tmp_path"]):
+                _remove_quietly(plan["file_path"])
+        raise
+    for plan in plans:
+        if "backup_path" in plan:
+            _remove_quietly(plan["backup_path"])
+
+def save_project_files(files, project_dir, file_map, max_workers=None, fsync=True):
+    """
+    Write generated files as one all-or-nothing batch.
+
+    Final contents (including three-way merges of edits, see agent/merge.py)
+    are computed and written to temp files in parallel, then swapped into
+    place with os.replace, so a crash never leaves a half-written file and a
+    failure rolls the whole batch back.
+    Files whose content is unchanged are not rewritten.
+    """
+    with span("save") as save_span:
+        written = _save_project_files(files, project_dir, file_map, max_workers, fsync)
+        nbytes = sum(len(plan["content"].encode("utf-8")) for plan in written)
+        save_span.attrs.update(files=len(files), written=len(written), bytes=nbytes)
+    metrics.inc("codenex_files_written_total", len(written))
+    metrics.inc("codenex_bytes_written_total", nbytes)
+
+def _save_project_files(files, project_dir, file_map, max_workers, fsync):
+    # A path listed twice keeps its last version, as sequential writes would
+    files = list({file_info["path"]: file_info for file_info in files}.values())
+    if not files:
+        return []
+    os.makedirs(project_dir, exist_ok=True)
+    workers = max_workers or min(8, len(files))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        plans = list(pool.map(lambda file_info: _plan_file(file_info, project_dir), files))
+        to_write = [plan for plan in plans if not plan["unchanged"]]
+
+        for directory in sorted({os.path.dirname(plan["file_path"]) for plan in to_write}):
+            os.makedirs(directory, exist_ok=True)
 
-def load_file_map(file_map_path):
-    if os.path.exists(file_map_path) and os.path.getsize(file_map_path) > 0:
         try:
-            with open(file_map_path, "r") as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return {}
-    return {}
+            list(pool.map(lambda plan: _write_temp(plan, fsync), to_write))
+        except Exception:
+            for plan in to_write:
+                if "tmp_path" in plan:
+                    _remove_quietly(plan["tmp_path"])
+            raise
+
+    try:
+        _commit(to_write)
+    except Exception:
+        for plan in to_write:
+            _remove_quietly(plan["tmp_path"])
+        raise
+
+    for plan in to_write:
+        if plan["path"].endswith(".py"):
+            _save_base(project_dir, plan)
+
+    # Keep an existing symbol index in step without re-parsing from disk
+    index = get_symbol_index(project_dir, create=False)
+    if index is not None:
+        for plan in to_write:
+            index.update(plan["path"], plan["content"])
+
+    for plan in plans:
+        entry = {"status": plan["status"]}
+        if plan["conflicts"]:
+            # The local version of these symbols was kept
+            entry["conflicts"] = plan["conflicts"]
+            print(f"Warning: {len(plan['conflicts'])} merge conflict(s) in {plan['path']}: "
+                  + ", ".join(c["symbol"] for c in plan["conflicts"]))
+        file_map[plan["path"]] = entry
+    return to_write
+
+def load_file_map(file_map_path):
+    # Backed by SQLite next to file_map_path; an existing JSON map is migrated on first use
+    with span("load_file_map"):
+        return get_store(file_map_path).load()
+
+def get_file_entry(file_map_path, path):
+    return get_store(file_map_path).get(path)
 
 def update_file_map(file_map, file_map_path):
-    os.makedirs(os.path.dirname(file_map_path), exist_ok=True)
-    with open(file_map_path, "w") as f:
-        json.dump(file_map, f, indent=4)
\ No newline at end of file
+    store = get_store(file_map_path)
+    with span("update_file_map") as update_span:
+        if isinstance(file_map, FileMap):
+            # Only the entries touched since load are written
+            changed, deleted = file_map.changes()
+            store.write({key: file_map[key] for key in changed}, deleted)
+            file_map.mark_clean()
+            update_span.attrs["entries"] = len(changed) + len(deleted)
+        else:
+            store.write(dict(file_map), replace=True)
+            update_span.attrs["entries"] = len(file_map)
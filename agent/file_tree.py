@@ -0,0 +1,165 @@
+import fnmatch
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Dependency and tooling directories a UI almost never wants to expand
+DEFAULT_IGNORE = ("node_modules", "__pycache__", "venv", ".venv", "*.egg-info")
+
+
+class FileTreeIndex:
+    """
+    Cached view of a project's directory tree.
+
+    Directories are listed with ``os.scandir`` (whose d_type avoids a stat per
+    entry) and each listing is cached together with the directory's mtime.
+    A re-query stats every visited directory once and only re-lists the ones
+    whose mtime moved; built subtrees are reused when nothing below them
+    changed. Names starting with "." and names matching an ignore glob are
+    skipped.
+    """
+
+    def __init__(self, root: str, ignore: Sequence[str] = DEFAULT_IGNORE):
+        self.root = root
+        self.ignore = tuple(ignore)
+        # One compiled regex per kind instead of an fnmatch call per pattern per entry
+        name_patterns = [fnmatch.translate(p) for p in self.ignore if "/" not in p and os.sep not in p]
+        path_patterns = [fnmatch.translate(p) for p in self.ignore if "/" in p or os.sep in p]
+        self._name_re = re.compile("|".join(name_patterns)) if name_patterns else None
+        self._path_re = re.compile("|".join(path_patterns)) if path_patterns else None
+        self._listings: Dict[str, Tuple[int, List[Tuple[str, bool]]]] = {}
+        self._subtrees: Dict[Tuple[str, Optional[int]], List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self.scans = 0
+
+    def _ignored(self, name: str, rel_path: str) -> bool:
+        if name.startswith("."):
+            return True
+        if self._name_re is not None and self._name_re.match(name):
+            return True
+        return self._path_re is not None and self._path_re.match(rel_path.replace(os.sep, "/")) is not None
+
+    def _listing(self, path: str, rel_path: str) -> Tuple[List[Tuple[str, bool]], bool]:
+        """Return (sorted (name, is_dir) entries, whether the listing was refreshed)."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            self._listings.pop(path, None)
+            return [], True
+        cached = self._listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], False
+
+        entries = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    child_rel = os.path.join(rel_path, entry.name) if rel_path else entry.name
+                    if self._ignored(entry.name, child_rel):
+                        continue
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    entries.append((entry.name, is_dir))
+        except OSError as e:
+            print(f"Error building file tree: {e}")
+        entries.sort()
+        self.scans += 1
+        self._listings[path] = (mtime, entries)
+        return entries, True
+
+    def _build(self, path: str, rel_path: str, depth: Optional[int]) -> Tuple[List[Dict[str, Any]], bool]:
+        """Build the node list for a directory; the flag says whether anything below changed."""
+        entries, changed = self._listing(path, rel_path)
+        expand = depth is None or depth > 1
+        children: Dict[str, List[Dict[str, Any]]] = {}
+        if expand:
+            for name, is_dir in entries:
+                if is_dir:
+                    child_rel = os.path.join(rel_path, name) if rel_path else name
+                    children[name], child_changed = self._build(
+                        os.path.join(path, name), child_rel, None if depth is None else depth - 1
+                    )
+                    changed = changed or child_changed
+
+        key = (path, depth)
+        if not changed and key in self._subtrees:
+            return self._subtrees[key], False
+
+        nodes = []
+        for name, is_dir in entries:
+            node: Dict[str, Any] = {
+                "name": name,
+                "path": os.path.join(rel_path, name) if rel_path else name,
+                "type": "directory" if is_dir else "file"
+            }
+            if is_dir:
+                if expand:
+                    node["children"] = children[name]
+                else:
+                    node["truncated"] = True
+            nodes.append(node)
+        self._subtrees[key] = nodes
+        return nodes, True
+
+    def tree(self, subpath: str = "", max_depth: Optional[int] = None,
+             offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Return the tree under ``subpath`` (relative to the root).
+
+        Args:
+            subpath: Directory to list, relative to the root ("" for the root)
+            max_depth: Levels to expand; deeper directories are returned with
+                ``truncated: True`` instead of ``children``. None expands everything
+            offset: Skip this many top-level entries (entries are sorted by name)
+            limit: Return at most this many top-level entries
+
+        Returns:
+            Dictionary with file_tree (same node format as get_file_tree) and
+            total, the number of top-level entries before pagination
+        """
+        path = os.path.join(self.root, subpath) if subpath else self.root
+        rel_path = os.path.normpath(subpath) if subpath else ""
+        with self._lock:
+            nodes, _ = self._build(path, rel_path, max_depth)
+        page = nodes[offset:] if limit is None else nodes[offset:offset + limit]
+        return {"file_tree": page, "total": len(nodes)}
+
+    def files(self, subpath: str = "") -> List[str]:
+        """Relative paths of every file under ``subpath``, in sorted order."""
+        paths: List[str] = []
+        stack = list(reversed(self.tree(subpath)["file_tree"]))
+        while stack:
+            node = stack.pop()
+            if node["type"] == "directory":
+                stack.extend(reversed(node.get("children", ())))
+            else:
+                paths.append(node["path"])
+        return paths
+
+    def invalidate(self, subpath: str = "") -> None:
+        """Forget cached listings under ``subpath`` (for filesystems with coarse mtimes)."""
+        prefix = os.path.join(self.root, subpath) if subpath else self.root
+        with self._lock:
+            for path in [p for p in self._listings if p == prefix or p.startswith(prefix + os.sep)]:
+                del self._listings[path]
+            for key in [k for k in self._subtrees if k[0] == prefix or k[0].startswith(prefix + os.sep)]:
+                del self._subtrees[key]
+
+
+_indexes: Dict[Tuple[str, Tuple[str, ...]], FileTreeIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str, ignore: Optional[Sequence[str]] = None) -> FileTreeIndex:
+    """Return the process-wide index for a root directory and ignore list."""
+    ignore = tuple(DEFAULT_IGNORE if ignore is None else ignore)
+    key = (os.path.abspath(root), ignore)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = FileTreeIndex(root, ignore)
+            _indexes[key] = index
+        return index
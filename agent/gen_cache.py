@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class GenerationCache:
+    """
+    On-disk cache of parsed generation results.
+
+    Entries are keyed on a SHA-256 of the final prompt, the model name and the
+    generation parameters, and hold the file list returned by
+    ``parse_code_response``. Each entry is one JSON file; its mtime records the
+    last use, and the least recently used entries are deleted once the cache
+    grows past ``max_bytes``.
+    """
+
+    def __init__(self, directory: str = "memory/gen_cache", max_bytes: int = 256 * 1024 * 1024,
+                 cache_sampled: bool = False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.cache_sampled = cache_sampled
+        self._lock = threading.Lock()
+        self._size: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.skipped = 0
+
+    @staticmethod
+    def key(prompt: str, model: str, params: Dict[str, Any]) -> str:
+        payload = json.dumps({"prompt": prompt, "model": model, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def cacheable(self, params: Dict[str, Any]) -> bool:
+        """Sampled outputs differ run to run, so they are only cached when opted in."""
+        return self.cache_sampled or not params.get("do_sample", False)
+
+    def get(self, prompt: str, model: str, params: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        """Return the cached file list, or None on a miss or for uncacheable params."""
+        if not self.cacheable(params):
+            with self._lock:
+                self.skipped += 1
+            return None
+        path = self._path(self.key(prompt, model, params))
+        try:
+            with open(path, "r") as f:
+                files = json.load(f)
+            os.utime(path)  # mark as recently used
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return files
+
+    def put(self, prompt: str, model: str, params: Dict[str, Any], files: List[Dict[str, str]]) -> None:
+        """Store a parsed file list and evict old entries if over the size limit."""
+        if not self.cacheable(params) or not files:
+            return
+        path = self._path(self.key(prompt, model, params))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(files).encode("utf-8")
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.stores += 1
+            if self._size is not None:
+                self._size += len(data) - previous
+        self._evict()
+
+    def clear(self) -> None:
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        with self._lock:
+            self._size = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size_bytes": self._size,
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        if not os.path.isdir(self.directory):
+            return
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".json"):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    yield entry.path, stat.st_size, stat.st_mtime
+
+    def _evict(self) -> None:
+        with self._lock:
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+            # Rescan: the size may be unknown, or other processes share the directory
+            entries = sorted(self._entries(), key=lambda e: e[2])
+            total = sum(size for _, size, _ in entries)
+            for path, size, _ in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                self.evictions += 1
+            self._size = total
+
+
+_caches: Dict[str, GenerationCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_generation_cache(config: Dict[str, Any]) -> Optional[GenerationCache]:
+    """
+    Return the process-wide cache for the config's ``generation_cache`` section.
+
+    Returns None when the cache is disabled.
+    """
+    settings = config.get("generation_cache") or {}
+    if not settings.get("enabled", True):
+        return None
+    directory = settings.get("dir", "memory/gen_cache")
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = GenerationCache(
+                directory,
+                max_bytes=int(settings.get("max_mb", 256) * 1024 * 1024),
+                cache_sampled=settings.get("cache_sampled", False),
+            )
+            _caches[directory] = cache
+        return cache
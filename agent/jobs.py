@@ -0,0 +1,151 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+
+# Every value Job.status takes
+STATUSES = ("queued", "running", "done", "error", "cancelled")
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task that stops because its ``cancel`` event was set."""
+
+
+class Job:
+    """A single queued call and its outcome."""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # Set by JobQueue.cancel; only jobs submitted with a ``cancel`` Event can stop early
+        self.cancel_event: Optional[threading.Event] = params.get("cancel")
+        # Completes once the job has finished in any way, including being
+        # cancelled before it started; for done callbacks
+        self.future: Optional[Future] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobQueue:
+    """
+    In-process job queue backed by a bounded thread pool.
+
+    At most ``max_workers`` jobs run at once; at most ``max_pending`` jobs may be
+    queued or running before ``submit`` raises ``QueueFull``. Finished jobs are
+    kept for status polling, oldest dropped first beyond ``history``.
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = 100, history: int = 1000):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[..., Dict[str, Any]], **params) -> Job:
+        """
+        Queue ``fn(**params)`` and return its job immediately.
+
+        Args:
+            kind: Label stored on the job (e.g. "run_task")
+            fn: Callable returning a result dictionary
+            **params: Keyword arguments for ``fn``; also recorded on the job
+
+        Returns:
+            The queued Job
+        """
+        job = Job(kind, params)
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise QueueFull(f"Job queue is full ({self.max_pending} pending)")
+            self._pending += 1
+            self._jobs[job.id] = job
+            self._trim_history()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self, status: Optional[str] = None) -> List[Job]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [j for j in jobs if status is None or j.status == status]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Ask a job to stop.
+
+        A queued job is skipped when its turn comes; a running one stops at
+        its next cancellation check. Returns the job, or None if unknown.
+        """
+        job = self.get(job_id)
+        if job is not None and job.cancel_event is not None and job.finished_at is None:
+            job.cancel_event.set()
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        """Jobs per status (every status, including those at 0) plus ``pending``."""
+        counts = dict.fromkeys(STATUSES, 0)
+        for job in self.list():
+            counts[job.status] += 1
+        counts["pending"] = self._pending
+        return counts
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+
+    def _run(self, job: Job, fn: Callable[..., Dict[str, Any]]) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            if job.cancel_event is not None and job.cancel_event.is_set():
+                raise TaskCancelled("Cancelled before it started")
+            job.result = fn(**job.params)
+            # run_task reports soft failures in its result rather than raising
+            job.status = "error" if job.result.get("status") == "error" else "done"
+        except TaskCancelled as e:
+            job.error = str(e)
+            job.status = "cancelled"
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _trim_history(self) -> None:
+        # Caller holds self._lock; only finished jobs are eligible for removal
+        excess = len(self._jobs) - self.history
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at is not None][:excess]:
+            del self._jobs[job_id]
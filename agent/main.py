@@ -1,16 +1,35 @@
 import argparse
+import contextlib
 import os
+import re
 import sys
+import threading
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 from agent.prompt_engine import generate_prompt
-from agent.codegen import generate_code
-from agent.file_ops import save_project_files, load_file_map, update_file_map
-from agent.bugfixer import fix_syntax_errors
+from agent.file_ops import content_hash, save_project_files, load_file_map, update_file_map
+from agent.file_tree import get_index
+from agent.jobs import TaskCancelled
+from agent.response_parser import classify_task
+from agent.symbol_index import get_symbol_index
+from agent.bugfixer import check_source, fix_syntax_errors
+from agent.constrained import record_retry
+from agent.parse_cache import get_parse_cache
+from agent.tracing import cache_lookup, metrics, span, trace
 from agent.utils import load_config
+from agent.validation import check_imports, retry_prompt, summarize, validate_files, validation_settings
+from agent.workspace import DEFAULT_PROJECT, Workspace, get_workspace
 
-def run_task(task: str, project_dir: str = "projects", fix: bool = False) -> Dict[str, Any]:
+_FILE_RE = re.compile(r"[\w./\\-]+\.[A-Za-z0-9]+\b")
+
+def run_task(task: str, project_dir: str = "projects", fix: bool = False,
+             config: Optional[Dict[str, Any]] = None, stream: bool = False,
+             on_text: Optional[Callable[[str], None]] = None,
+             project: str = DEFAULT_PROJECT,
+             on_event: Optional[Callable[[str, Dict[str, Any]], None]] = None,
+             cancel: Optional[threading.Event] = None) -> Dict[str, Any]:
     """
     Execute a task with the AI code agent.
     
@@ -18,17 +37,84 @@ def run_task(task: str, project_dir: str = "projects", fix: bool = False) -> Dic
         task: The task description
         project_dir: Directory containing projects
         fix: Whether to fix syntax errors
+        config: Already-loaded configuration; read from config.yaml if omitted
+        stream: Write each file as soon as its block is generated instead of
+            waiting for the whole response
+        on_text: In stream mode, called with every generated chunk of text
+        project: Name of the project in project_dir to work on; each project
+            has its own file map and lock, so tasks on different projects run
+            in parallel
+        on_event: Called with (event type, data) as the task progresses:
+            "prompt" once the prompt is built, "tokens" every few streamed
+            chunks, and "file_parsed" / "file_saved" for every file
+        cancel: When set, the task stops by raising TaskCancelled: the model
+            stops decoding within a token, and other stages stop at their
+            next check
         
     Returns:
         Dictionary with status, message, and optional file_map
     """
-    config = load_config("config.yaml")
-    project_path = Path(project_dir) / "generated_project"
-    file_map = load_file_map("memory/file_map.json")
+    if config is None:
+        config = load_config("config.yaml")
+    # Every stage below is timed; with tracing.jsonl set, each task's spans are
+    # appended there as one JSON line
+    progress = _Progress(on_text, on_event, cancel)
+    try:
+        with trace("run_task", (config.get("tracing") or {}).get("jsonl")):
+            with span("run_task", project=project, fix=fix):
+                result = _run_task(task, project_dir, fix, config, stream, progress, project)
+    except TaskCancelled:
+        metrics.inc("codenex_tasks_total", status="cancelled")
+        raise
+    metrics.inc("codenex_tasks_total", status=result["status"])
+    return result
+
+class _Progress:
+    """Progress callbacks and the cancel flag of one run_task call."""
+
+    # Streamed chunks between two "tokens" events
+    TOKENS_EVERY = 16
+
+    def __init__(self, on_text: Optional[Callable[[str], None]],
+                 on_event: Optional[Callable[[str, Dict[str, Any]], None]],
+                 cancel: Optional[threading.Event]):
+        self.on_text = on_text
+        self.on_event = on_event
+        self.cancel = cancel
+        self.chunks = 0
+        self.chars = 0
+
+    def check(self) -> None:
+        if self.cancel is not None and self.cancel.is_set():
+            raise TaskCancelled("Task cancelled")
+
+    def emit(self, kind: str, **data: Any) -> None:
+        if self.on_event is not None:
+            self.on_event(kind, data)
+
+    def text(self, chunk: str) -> None:
+        self.check()
+        self.chunks += 1
+        self.chars += len(chunk)
+        if self.on_text is not None:
+            self.on_text(chunk)
+        if self.chunks % self.TOKENS_EVERY == 0:
+            self.emit("tokens", chunks=self.chunks, chars=self.chars)
+
+    def files(self, kind: str, files: List[Dict[str, Any]]) -> None:
+        for file_info in files:
+            self.emit(kind, path=file_info["path"])
+
+def _run_task(task: str, project_dir: str, fix: bool, config: Dict[str, Any], stream: bool,
+              progress: _Progress, project: str) -> Dict[str, Any]:
+    workspace = get_workspace(project_dir)
+    project_path = workspace.project_path(project)
+    file_map_path = workspace.file_map_path(project)
+    file_map = load_file_map(file_map_path)
 
     if fix:
         # Extract file path from task (e.g., "Fix syntax error in hello.py")
-        file_path = task.split("in")[-1].strip() if "in" in task else "hello.py"
+        file_path = _task_file(task)
         full_path = project_path / file_path
         
         if not full_path.exists():
@@ -45,79 +131,299 @@ def run_task(task: str, project_dir: str = "projects", fix: bool = False) -> Dic
             }
             
         # Update the file with fixed code
-        file_map[str(file_path)] = {"status": "fixed"}
-        with open(full_path, "w") as f:
-            f.write(fixed_code)
-            
-        update_file_map(file_map, "memory/file_map.json")
+        with _locked(workspace, project):
+            file_map = load_file_map(file_map_path)
+            save_project_files([{"path": file_path, "code": fixed_code, "task": "create"}],
+                               str(project_path), file_map)
+            file_map[str(file_path)] = {"status": "fixed"}
+            update_file_map(file_map, file_map_path)
         return {
             "status": "success",
             "message": f"Fixed syntax errors in {file_path}",
             "file_map": file_map
         }
 
-    # For generate/edit operations
-    prompt = generate_prompt(task, file_map)
-    code_response = generate_code(prompt, config)
-    
     # Ensure project directory exists
     project_path.mkdir(parents=True, exist_ok=True)
     
-    # Save the generated/edited files
-    save_project_files(code_response, str(project_path), file_map)
-    update_file_map(file_map, "memory/file_map.json")
+    # Generation modules (and, through the backend, any ML framework) are only
+    # imported by tasks that generate; --tree and --fix never load them
+    from agent.codegen import generate_code
+    from agent.template_engine import get_template_engine
     
-    return {
+    # Common scaffolds are rendered from templates/ without touching the model
+    progress.check()
+    with span("template"):
+        engine = get_template_engine(config)
+        code_response = engine.render(task) if engine is not None else None
+        if engine is not None:
+            cache_lookup("template", code_response is not None)
+    source = "template" if code_response else "model"
+    
+    # For generate/edit operations
+    prompt = None
+    if code_response is None:
+        with span("prompt") as prompt_span:
+            prompt = generate_prompt(task, file_map, _project_context(task, config, project_path))
+            prompt_span.attrs["chars"] = len(prompt)
+        progress.emit("prompt", chars=len(prompt))
+        progress.check()
+        if stream:
+            result = _run_streaming(prompt, config, workspace, project, progress)
+            if result is not None:
+                return result
+            # Nothing in the FILE/fence format: retried below like any other answer
+            code_response = []
+        else:
+            code_response = generate_code(prompt, config, progress.cancel)
+    progress.files("file_parsed", code_response)
+    progress.check()
+    
+    # Check (and repair) every file before anything is written
+    code_response, checks = validate_files(code_response, config)
+    retries = (validation_settings(config) or {}).get("retries", 1)
+    # A response without any file in the FILE/fence format is retried too
+    while prompt is not None and retries > 0 and (not code_response or _invalid(checks)):
+        retries -= 1
+        progress.check()
+        record_retry(config, "invalid" if code_response else "no_files")
+        with span("retry"):
+            retried, retried_checks = validate_files(
+                generate_code(retry_prompt(prompt, checks), config, progress.cancel), config)
+        if not retried or (code_response and _invalid(retried_checks) >= _invalid(checks)):
+            break
+        code_response, checks = retried, retried_checks
+    check_imports(checks, code_response, project_path, file_map)
+    
+    # Save the generated/edited files. Re-read the file map under the lock so
+    # tasks that finished while we were generating are not overwritten.
+    with _locked(workspace, project):
+        file_map = load_file_map(file_map_path)
+        save_project_files(code_response, str(project_path), file_map)
+        update_file_map(file_map, file_map_path)
+    progress.files("file_saved", code_response)
+    
+    return _with_validation({
         "status": "success",
         "message": f"Task completed in {project_path}",
-        "file_map": file_map
+        "file_map": file_map,
+        "source": source
+    }, checks)
+
+def _invalid(checks: List[Dict[str, Any]]) -> int:
+    return sum(1 for check in checks if check["status"] == "invalid")
+
+def _with_validation(result: Dict[str, Any], checks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Attach the validation summary to a task result; files still invalid make it a warning."""
+    if not checks:
+        return result
+    result["validation"] = summarize(checks)
+    invalid = result["validation"]["invalid"]
+    if invalid:
+        result["status"] = "warning"
+        result["message"] += f" ({len(invalid)} files failed validation: {', '.join(sorted(invalid))})"
+    return result
+
+def _task_file(task: str) -> str:
+    """File named by a fix task ("Fix syntax error in app/main.py"), hello.py if none."""
+    match = _FILE_RE.findall(task)
+    if match:
+        return match[-1]
+    match = re.search(r"\bin\s+(\S+)\s*$", task)
+    return match.group(1) if match else "hello.py"
+
+def fix_project(project_dir: str = "projects", config: Optional[Dict[str, Any]] = None,
+                max_workers: Optional[int] = None, project: str = DEFAULT_PROJECT) -> Dict[str, Any]:
+    """
+    Check every Python file of the generated project and repair syntax errors.
+    
+    Files whose content hash is in the parse cache are skipped without being
+    parsed. The rest are parsed and repaired (until they parse or no heuristic
+    applies) across a process pool, and every repaired file is written in one
+    atomic batch.
+    
+    Args:
+        project_dir: Directory containing projects
+        config: Already-loaded configuration; read from config.yaml if omitted
+        max_workers: Worker processes (default: the ``fix`` section, then CPU count)
+        project: Name of the project in project_dir to check
+        
+    Returns:
+        Dictionary with status, message, per-file results (path, status of
+        "cached", "ok", "fixed" or "unfixable", fixes, error, seconds) and total_s
+    """
+    if config is None:
+        config = load_config("config.yaml")
+    settings = config.get("fix") or {}
+    workspace = get_workspace(project_dir)
+    project_path = workspace.project_path(project)
+    file_map_path = workspace.file_map_path(project)
+    start = time.perf_counter()
+    if not project_path.exists():
+        return {"status": "error", "message": f"Project {project_path} does not exist", "results": []}
+
+    sources = {}
+    for rel_path in get_index(str(project_path)).files():
+        if rel_path.endswith(".py"):
+            try:
+                sources[rel_path] = (project_path / rel_path).read_text(encoding="utf-8")
+            except (OSError, UnicodeDecodeError):
+                continue
+
+    cache = get_parse_cache(settings.get("parse_cache", "memory/parse_cache.db"))
+    hashes = {rel_path: content_hash(code) for rel_path, code in sources.items()}
+    known = cache.known_good(hashes.values())
+    results = [
+        {"path": rel_path, "status": "cached", "fixes": 0, "error": None, "seconds": 0.0}
+        for rel_path in sources if hashes[rel_path] in known
+    ]
+    pending = [rel_path for rel_path in sources if hashes[rel_path] not in known]
+
+    workers = max_workers or settings.get("max_workers") or os.cpu_count() or 1
+    codes = [sources[rel_path] for rel_path in pending]
+    if workers > 1 and len(pending) > 1:
+        # Imported here: it costs ~20ms, which every other command would pay
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            checked = list(pool.map(check_source, pending, codes,
+                                    chunksize=max(1, len(pending) // (workers * 4))))
+    else:
+        checked = [check_source(rel_path, code) for rel_path, code in zip(pending, codes)]
+
+    fixed = [result for result in checked if result["status"] == "fixed"]
+    if fixed:
+        with _locked(workspace, project):
+            file_map = load_file_map(file_map_path)
+            save_project_files([{"path": r["path"], "code": r["code"], "task": "create"} for r in fixed],
+                               str(project_path), file_map)
+            for result in fixed:
+                file_map[result["path"]] = {"status": "fixed"}
+            update_file_map(file_map, file_map_path)
+    cache.add(result["hash"] for result in checked if result["status"] != "unfixable")
+
+    for result in checked:
+        result.pop("code")
+        result.pop("hash")
+        results.append(result)
+    results.sort(key=lambda result: result["path"])
+    counts = {status: sum(1 for r in results if r["status"] == status)
+              for status in ("cached", "ok", "fixed", "unfixable")}
+    total_s = time.perf_counter() - start
+    return {
+        "status": "warning" if counts["unfixable"] else "success",
+        "message": (f"Checked {len(results)} files in {total_s:.2f}s: {counts['fixed']} fixed, "
+                    f"{counts['unfixable']} unfixable, {counts['ok']} ok, {counts['cached']} cached"),
+        "results": results,
+        "total_s": total_s
     }
 
-def get_file_tree(project_dir: str = "projects") -> Dict[str, Any]:
+def _project_context(task: str, config: Dict[str, Any], project_path: Path) -> str:
+    """Relevant slices of the existing project for edit tasks, within the configured token budget."""
+    settings = config.get("context") or {}
+    if not settings.get("enabled", True) or classify_task(task) != "edit":
+        return ""
+    index = get_symbol_index(str(project_path))
+    return index.context(
+        task,
+        max_tokens=settings.get("max_tokens", 1500),
+        chars_per_token=settings.get("chars_per_token", 4),
+    )
+
+@contextlib.contextmanager
+def _locked(workspace: Workspace, project: str):
+    """Hold a project's write lock, timing the wait as the ``lock_wait`` stage."""
+    lock = workspace.lock(project)
+    with span("lock_wait"):
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+def _run_streaming(prompt: str, config: Dict[str, Any], workspace: Workspace, project: str,
+                   progress: _Progress) -> Optional[Dict[str, Any]]:
+    """
+    Generate with streaming and write every file the moment it is complete.
+
+    Returns None if the response held no file, leaving the retry to run_task.
+    """
+    from agent.streaming import generate_code_stream
+    
+    project_path = workspace.project_path(project)
+    file_map_path = workspace.file_map_path(project)
+    stream_metrics: Dict[str, Any] = {}
+    file_map: Dict[str, Any] = {}
+    existing = list(load_file_map(file_map_path))
+    files: List[Dict[str, str]] = []
+    checks: List[Dict[str, Any]] = []
+    with span("generate", stream=True) as generate_span:
+        for file_info in generate_code_stream(prompt, config, on_text=progress.text, metrics=stream_metrics,
+                                              cancel=progress.cancel):
+            progress.files("file_parsed", [file_info])
+            # Earlier files are already on disk, so a file that stays invalid
+            # is repaired where possible but not regenerated
+            [file_info], file_checks = validate_files([file_info], config)
+            files.append(file_info)
+            checks.extend(file_checks)
+            with _locked(workspace, project):
+                file_map = load_file_map(file_map_path)
+                save_project_files([file_info], str(project_path), file_map)
+                update_file_map(file_map, file_map_path)
+            progress.files("file_saved", [file_info])
+        progress.emit("tokens", chunks=progress.chunks, chars=progress.chars)
+        generate_span.attrs.update(
+            (key, value) for key, value in stream_metrics.items() if key.endswith("_s") and value is not None
+        )
+    if not files:
+        return None
+    # requirements.txt may come after the files importing from it
+    check_imports(checks, files, project_path, existing)
+    
+    return _with_validation({
+        "status": "success",
+        "message": f"Task completed in {project_path}",
+        "file_map": file_map,
+        "metrics": stream_metrics
+    }, checks)
+
+def get_file_tree(project_dir: str = "projects", max_depth: Optional[int] = None,
+                  offset: int = 0, limit: Optional[int] = None,
+                  ignore: Optional[List[str]] = None,
+                  project: str = DEFAULT_PROJECT) -> Dict[str, Any]:
     """
     Get the file tree of the generated project.
     
+    Listings are cached per directory and only re-read when a directory's
+    mtime changes, so repeated calls (e.g. a UI polling the tree) are cheap.
+    
     Args:
         project_dir: Directory containing projects
+        max_depth: Number of levels to expand (None for all)
+        offset: Number of top-level entries to skip
+        limit: Maximum number of top-level entries to return
+        ignore: Glob patterns of names/paths to skip; defaults to common
+            dependency directories such as node_modules
+        project: Name of the project in project_dir
         
     Returns:
-        Dictionary with status and file tree in a structured format
+        Dictionary with status, file tree in a structured format, and the
+        total number of top-level entries
     """
-    project_path = Path(project_dir) / "generated_project"
+    project_path = get_workspace(project_dir).project_path(project)
     
     if not project_path.exists():
         return {
             "status": "success",
-            "file_tree": []
+            "file_tree": [],
+            "total": 0
         }
     
-    def build_tree(directory):
-        result = []
-        try:
-            for item in directory.iterdir():
-                if item.name.startswith('.'):
-                    continue
-                    
-                node = {
-                    "name": item.name,
-                    "path": str(item.relative_to(project_path)),
-                    "type": "directory" if item.is_dir() else "file"
-                }
-                
-                if item.is_dir():
-                    node["children"] = build_tree(item)
-                    
-                result.append(node)
-        except Exception as e:
-            print(f"Error building file tree: {e}")
-            
-        return result
-    
-    file_tree = build_tree(project_path)
+    result = get_index(str(project_path), ignore).tree(max_depth=max_depth, offset=offset, limit=limit)
     
     return {
         "status": "success",
-        "file_tree": file_tree
+        "file_tree": result["file_tree"],
+        "total": result["total"]
     }
 
 def main():
@@ -131,43 +437,157 @@ def main():
     )
     parser.add_argument(
         "--project-dir", 
-        default="projects", 
-        help="Directory to save projects"
+        default=None, 
+        help="Directory to save projects (default: projects, or server.project_dir with --serve)"
+    )
+    parser.add_argument(
+        "--project",
+        default=DEFAULT_PROJECT,
+        help="Name of the project (subdirectory of --project-dir) to work on"
     )
     parser.add_argument(
         "--tree", 
         action="store_true", 
         help="Show project file tree"
     )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=None,
+        help="With --tree, number of directory levels to expand"
+    )
     parser.add_argument(
         "--fix", 
         action="store_true", 
         help="Fix syntax errors in specified file"
     )
+    parser.add_argument(
+        "--fix-all",
+        action="store_true",
+        help="Check every Python file of the project and fix syntax errors in parallel"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="With --fix-all, number of worker processes; with --batch, tasks run at the same time"
+    )
+    parser.add_argument(
+        "--batch",
+        default=None,
+        metavar="FILE.jsonl",
+        help="Run every task of a JSONL file (one {\"task\": ...} per line) through a worker pool"
+    )
+    parser.add_argument(
+        "--batch-out",
+        default=None,
+        metavar="FILE.jsonl",
+        help="With --batch, results file and checkpoint (default: <FILE>.results.jsonl)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print output as it is generated and write files as they complete"
+    )
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run as a long-lived HTTP server with a task queue"
+    )
+    parser.add_argument(
+        "--host",
+        default="127.0.0.1",
+        help="Host to bind in --serve mode"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8000,
+        help="Port to bind in --serve mode"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a per-stage timing breakdown (inference, parse, lock wait, save...)"
+    )
+    parser.add_argument(
+        "--profile-out",
+        default=None,
+        metavar="FILE",
+        help="Write cProfile statistics of the command to FILE (view with python -m pstats)"
+    )
     
     args = parser.parse_args()
 
     try:
-        if args.tree:
-            result = get_file_tree(args.project_dir)
-            print("Project file tree:")
-            print(result["file_tree"])
+        if args.serve:
+            from agent.server import serve
+            serve(host=args.host, port=args.port, project_dir=args.project_dir)
             return
+        args.project_dir = args.project_dir or "projects"
 
-        if not args.task:
-            parser.print_help()
-            return
-
-        result = run_task(args.task, args.project_dir, args.fix)
-        print(result["message"])
+        profiler = None
+        if args.profile_out:
+            import cProfile
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            # run_task records its spans into this trace instead of its own
+            with (trace("cli") if args.profile else contextlib.nullcontext()) as current:
+                _run_command(parser, args)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(args.profile_out)
+                print(f"Profile written to {args.profile_out}")
+        if current is not None and current.spans:
+            print("\nStage breakdown:")
+            print(current.breakdown())
         
     except Exception as e:
         print(f"Error: {str(e)}", file=sys.stderr)
         sys.exit(1)
-    code_response = generate_code(prompt, config)
-    save_project_files(code_response, project_dir, file_map)
-    update_file_map(file_map, "memory/file_map.json")
-    print(f"Project generated in {project_dir}")
+
+def _run_command(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    """Run the CLI command selected by ``args`` (everything except --serve)."""
+    if args.tree:
+        # Same ignore patterns as the server's /tree, so both list the same files
+        config = (load_config("config.yaml") if os.path.exists("config.yaml") else None) or {}
+        ignore = (config.get("file_tree") or {}).get("ignore")
+        result = get_file_tree(args.project_dir, max_depth=args.depth, ignore=ignore, project=args.project)
+        print("Project file tree:")
+        print(result["file_tree"])
+        return
+
+    if args.fix_all:
+        result = fix_project(args.project_dir, max_workers=args.workers, project=args.project)
+        for item in result["results"]:
+            detail = f"{item['fixes']} fixes" if item["status"] == "fixed" else (item["error"] or "")
+            print(f"{item['status']:10} {item['seconds'] * 1000:8.1f} ms  {item['path']}  {detail}".rstrip())
+        print(result["message"])
+        return
+
+    if args.batch:
+        from agent.batch import run_batch
+        result = run_batch(args.batch, args.batch_out, args.project_dir, max_workers=args.workers)
+        print(result["message"])
+        return
+
+    if not args.task:
+        parser.print_help()
+        return
+
+    if args.stream:
+        def echo(text):
+            print(text, end="", flush=True)
+        result = run_task(args.task, args.project_dir, args.fix, stream=True, on_text=echo,
+                          project=args.project)
+        print()
+    else:
+        result = run_task(args.task, args.project_dir, args.fix, project=args.project)
+    print(result["message"])
+    if result.get("metrics", {}).get("time_to_first_file_s") is not None:
+        print(f"Time to first file: {result['metrics']['time_to_first_file_s']:.3f}s")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,347 @@
+import ast
+from typing import Dict, List, Optional, Set, Tuple
+
+_DEFS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+Key = Tuple
+
+
+class Conflict:
+    """A node both sides changed differently (or one deleted and the other changed)."""
+
+    def __init__(self, symbol: str, reason: str, line: int):
+        self.symbol = symbol
+        self.reason = reason
+        self.line = line
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"symbol": self.symbol, "reason": self.reason, "line": self.line}
+
+    def __repr__(self):
+        return f"Conflict({self.symbol!r}, {self.reason!r}, line {self.line})"
+
+
+class MergeResult:
+    def __init__(self, content: str, conflicts: List[Conflict], replaced: List[str], inserted: List[str],
+                 deleted: Optional[List[str]] = None):
+        self.content = content
+        self.conflicts = conflicts
+        self.replaced = replaced
+        self.inserted = inserted
+        self.deleted = deleted or []
+
+
+def _start(node: ast.AST) -> int:
+    decorators = getattr(node, "decorator_list", None)
+    return min([node.lineno] + [d.lineno for d in decorators]) if decorators else node.lineno
+
+
+def _key(node: ast.AST, index: int) -> Key:
+    if isinstance(node, _DEFS):
+        return ("def", node.name)
+    if isinstance(node, ast.Import):
+        return ("import", tuple(alias.name for alias in node.names))
+    if isinstance(node, ast.ImportFrom):
+        return ("from", node.level, node.module)
+    if isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+        return ("assign", tuple(t.id for t in node.targets))
+    if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+        return ("assign", (node.target.id,))
+    # Compound statements are identified by their header, so a changed body
+    # (``if __name__ == "__main__":`` growing a line) replaces the old one
+    if isinstance(node, (ast.If, ast.While)):
+        return (type(node).__name__.lower(), ast.dump(node.test))
+    if isinstance(node, (ast.For, ast.AsyncFor)):
+        return ("for", ast.dump(node.target), ast.dump(node.iter))
+    if isinstance(node, (ast.With, ast.AsyncWith)):
+        return ("with", tuple(ast.dump(item) for item in node.items))
+    if index == 0 and isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant) \
+            and isinstance(node.value.value, str):
+        return ("doc",)
+    # Anything else is identified by its content: identical statements match
+    return ("stmt", ast.dump(node))
+
+
+def _index(body: List[ast.stmt]) -> List[Tuple[Key, ast.stmt]]:
+    seen: Dict[Key, int] = {}
+    keyed = []
+    for i, node in enumerate(body):
+        key = _key(node, i)
+        count = seen.get(key, 0)
+        seen[key] = count + 1
+        keyed.append((key + (count,) if count else key, node))
+    return keyed
+
+
+def _header(node: ast.ClassDef) -> str:
+    return "|".join(ast.dump(part) for part in node.decorator_list + node.bases + node.keywords) + node.name
+
+
+def _label(key: Key) -> str:
+    if key[0] == "def":
+        return key[1]
+    if key[0] == "import":
+        return "import " + ", ".join(key[1])
+    if key[0] == "from":
+        return f"from {'.' * key[1]}{key[2] or ''}"
+    if key[0] == "assign":
+        return " = ".join(key[1])
+    return key[0]
+
+
+class _Merger:
+    def __init__(self, ours_lines: List[str], theirs_lines: List[str]):
+        self.ours_lines = ours_lines
+        self.theirs_lines = theirs_lines
+        # (start line, kind, sequence, end line, replacement lines); kind 0 = insert, 1 = replace
+        self.edits: List[Tuple[int, int, int, int, List[str]]] = []
+        self.conflicts: List[Conflict] = []
+        self.replaced: List[str] = []
+        self.inserted: List[str] = []
+        self.deleted: List[str] = []
+
+    def _segment(self, node: ast.AST, end: Optional[int], indent: str) -> List[str]:
+        """Theirs' source lines for a node, re-indented to ``indent``."""
+        lines = self.theirs_lines[_start(node) - 1:node.end_lineno if end is None else end]
+        first = lines[0]
+        strip = first[:len(first) - len(first.lstrip())]
+        out = []
+        for line in lines:
+            if not line.strip():
+                out.append("")
+            elif line.startswith(strip):
+                out.append(indent + line[len(strip):])
+            else:
+                out.append(line)
+        return out
+
+    def _replace(self, start: int, end: int, lines: List[str]) -> None:
+        self.edits.append((start, 1, len(self.edits), end, lines))
+
+    def _insert(self, before_line: int, lines: List[str]) -> None:
+        self.edits.append((before_line, 0, len(self.edits), before_line - 1, lines))
+
+    def merge_body(self, base_body: Optional[List[ast.stmt]], ours_body: List[ast.stmt],
+                   theirs_body: List[ast.stmt], indent: str, append_after: int, prefix: str) -> None:
+        ours_keyed = _index(ours_body)
+        ours = dict(ours_keyed)
+        base = dict(_index(base_body)) if base_body is not None else None
+        theirs = _index(theirs_body)
+        nested = bool(prefix)
+
+        # A statement keyed by its content that the edit no longer has was
+        # changed or removed by it; it goes unless ours changed it too. Named
+        # nodes the edit leaves out are kept: edits often return only what
+        # they touch.
+        stale: Set[Key] = set()
+        if base is not None:
+            theirs_keys = {key for key, _ in theirs}
+            stale = {key for key, _ in ours_keyed if key[0] == "stmt" and key in base and key not in theirs_keys}
+        ours_positions = {key: i for i, (key, _) in enumerate(ours_keyed)} if stale else {}
+
+        for position, (key, t_node) in enumerate(theirs):
+            symbol = prefix + _label(key)
+            o_node = ours.get(key)
+            b_node = base.get(key) if base is not None else None
+
+            if o_node is None:
+                if b_node is not None and ast.dump(b_node) != ast.dump(t_node):
+                    self.conflicts.append(Conflict(symbol, "deleted locally, changed in edit", t_node.lineno))
+                elif b_node is None:
+                    old_key = self._stale_at(theirs, position, ours_keyed, ours_positions, stale)
+                    if old_key is not None:
+                        # The changed version of a stale statement: it takes its place
+                        stale.discard(old_key)
+                        old = ours[old_key]
+                        self._replace(_start(old), old.end_lineno, self._segment(t_node, None, indent))
+                        self.replaced.append(symbol)
+                    else:
+                        self._insert_new(theirs, position, ours, indent, append_after, nested)
+                        self.inserted.append(symbol)
+                continue
+
+            t_dump, o_dump = ast.dump(t_node), ast.dump(o_node)
+            if t_dump == o_dump:
+                continue
+            if key[0] == "from":
+                self._merge_import_from(o_node, t_node, indent)
+                continue
+            if isinstance(o_node, ast.ClassDef) and isinstance(t_node, ast.ClassDef) \
+                    and o_node.body and t_node.body and _start(o_node.body[0]) > o_node.lineno \
+                    and _start(t_node.body[0]) > t_node.lineno:
+                self._merge_class(b_node if isinstance(b_node, ast.ClassDef) else None, o_node, t_node, symbol)
+                continue
+
+            b_dump = ast.dump(b_node) if b_node is not None else None
+            if base is None or b_dump == o_dump:
+                # Untouched since the agent last wrote it: take the edit
+                self._replace(_start(o_node), o_node.end_lineno, self._segment(t_node, None, indent))
+                self.replaced.append(symbol)
+            elif b_dump == t_dump:
+                continue  # the edit did not change it; keep the local change
+            else:
+                self.conflicts.append(Conflict(symbol, "changed locally and in edit", o_node.lineno))
+
+        for key in sorted(stale, key=ours_positions.get):
+            o_node = ours[key]
+            end = o_node.end_lineno
+            # Take the blank lines after it along when it is set apart by them
+            if _start(o_node) > 1 and not self.ours_lines[_start(o_node) - 2].strip():
+                while end < len(self.ours_lines) and not self.ours_lines[end].strip():
+                    end += 1
+            self._replace(_start(o_node), end, [])
+            self.deleted.append(prefix + _label(key))
+
+    def _merge_class(self, b_node: Optional[ast.ClassDef], o_node: ast.ClassDef,
+                     t_node: ast.ClassDef, symbol: str) -> None:
+        if _header(t_node) != _header(o_node):
+            if b_node is None or _header(b_node) == _header(o_node):
+                indent = self._indent_of(o_node)
+                self._replace(_start(o_node), _start(o_node.body[0]) - 1,
+                              self._segment(t_node, _start(t_node.body[0]) - 1, indent))
+                self.replaced.append(symbol + " (header)")
+            elif _header(b_node) != _header(t_node):
+                self.conflicts.append(Conflict(symbol, "class header changed locally and in edit", o_node.lineno))
+        member_indent = self._indent_of(o_node.body[0])
+        self.merge_body(b_node.body if b_node is not None else None, o_node.body, t_node.body,
+                        member_indent, o_node.end_lineno, symbol + ".")
+
+    def _merge_import_from(self, o_node: ast.ImportFrom, t_node: ast.ImportFrom, indent: str) -> None:
+        # An edit never needs fewer names: keep ours and add the new ones
+        names = [(alias.name, alias.asname) for alias in o_node.names]
+        for alias in t_node.names:
+            if (alias.name, alias.asname) not in names:
+                names.append((alias.name, alias.asname))
+        if len(names) == len(o_node.names):
+            return
+        module = "." * o_node.level + (o_node.module or "")
+        rendered = ", ".join(f"{name} as {asname}" if asname else name for name, asname in names)
+        self._replace(o_node.lineno, o_node.end_lineno, [f"{indent}from {module} import {rendered}"])
+        self.replaced.append(f"from {module}")
+
+    def _indent_of(self, node: ast.AST) -> str:
+        line = self.ours_lines[_start(node) - 1]
+        return line[:len(line) - len(line.lstrip())]
+
+    @staticmethod
+    def _stale_at(theirs: List[Tuple[Key, ast.stmt]], position: int,
+                  ours_keyed: List[Tuple[Key, ast.stmt]], ours_positions: Dict[Key, int],
+                  stale: Set[Key]) -> Optional[Key]:
+        """The stale statement of ours in the spot a new statement of theirs goes to, if any."""
+        if not stale or isinstance(theirs[position][1], _DEFS):
+            return None
+        following = 0
+        for key, _ in reversed(theirs[:position]):
+            if key in ours_positions:
+                following = ours_positions[key] + 1
+                break
+        if following < len(ours_keyed) and ours_keyed[following][0] in stale:
+            return ours_keyed[following][0]
+        return None
+
+    def _insert_new(self, theirs: List[Tuple[Key, ast.stmt]], position: int, ours: Dict[Key, ast.stmt],
+                    indent: str, append_after: int, nested: bool) -> None:
+        t_node = theirs[position][1]
+        segment = self._segment(t_node, None, indent)
+
+        def gap(neighbour: Optional[ast.stmt]) -> List[str]:
+            # Definitions are set apart by blank lines, from either side
+            if not isinstance(t_node, _DEFS) and not isinstance(neighbour, _DEFS):
+                return []
+            return [""] if nested else ["", ""]
+
+        # Place it after the nearest preceding node both sides share ...
+        for key, _ in reversed(theirs[:position]):
+            if key in ours:
+                self._insert(ours[key].end_lineno + 1, gap(ours[key]) + segment)
+                return
+        # ... or before the nearest following one ...
+        for key, _ in theirs[position + 1:]:
+            if key in ours:
+                self._insert(_start(ours[key]), segment + gap(ours[key]))
+                return
+        # ... or at the end of the body
+        self._insert(append_after + 1, gap(next(reversed(ours.values()), None)) + segment)
+
+    def apply(self) -> List[str]:
+        out: List[str] = []
+        pos = 1
+        for start, _, _, end, lines in sorted(self.edits):
+            if start < pos:
+                self.conflicts.append(Conflict("?", "overlapping changes on one line", start))
+                continue
+            out.extend(self.ours_lines[pos - 1:start - 1])
+            out.extend(lines)
+            pos = end + 1
+        out.extend(self.ours_lines[pos - 1:])
+        return out
+
+
+def merge_python(base: Optional[str], ours: str, theirs: str) -> MergeResult:
+    """
+    Three-way merge of Python source at the level of statements.
+
+    Top-level functions, classes (member by member), imports, assignments and
+    the module docstring are matched by name between the three versions.
+    ``theirs`` is treated as a patch: nodes it adds are inserted next to their
+    neighbours, nodes it changes replace ours when ours still matches
+    ``base`` (or when there is no base), and named nodes it leaves out are
+    kept. Other statements are matched by content (compound ones such as
+    ``if __name__ == "__main__":`` by their header); one of those in ``base``
+    and ``ours`` that the edit no longer has is deleted.
+    Only the changed spans are rewritten; every other line of ``ours``,
+    including comments and formatting, is kept as-is, and the work is linear
+    in the size of the files.
+
+    Args:
+        base: Source the edit was made against (the agent's last write), or None
+        ours: Current source on disk
+        theirs: Source produced by the edit
+
+    Returns:
+        MergeResult with the merged content, the conflicts (ours is kept for
+        those nodes) and the symbols replaced/inserted
+
+    Raises:
+        SyntaxError: If ``ours`` or ``theirs`` does not parse
+    """
+    ours_tree = ast.parse(ours)
+    theirs_tree = ast.parse(theirs)
+    if base == ours:
+        base_tree = ours_tree  # the common case: no local edits since the last write
+    else:
+        try:
+            base_tree = ast.parse(base) if base is not None else None
+        except SyntaxError:
+            base_tree = None
+
+    ours_lines = ours.split("\n")
+    merger = _Merger(ours_lines, theirs.split("\n"))
+    append_after = ours_tree.body[-1].end_lineno if ours_tree.body else 0
+    merger.merge_body(base_tree.body if base_tree is not None else None,
+                      ours_tree.body, theirs_tree.body, "", append_after, "")
+    if not merger.edits:
+        return MergeResult(ours, merger.conflicts, [], [])
+
+    merged = "\n".join(merger.apply())
+    try:
+        ast.parse(merged)
+    except SyntaxError as e:
+        merger.conflicts.append(Conflict("<module>", f"merged code does not parse: {e.msg}", e.lineno or 0))
+        return MergeResult(ours, merger.conflicts, [], [])
+    return MergeResult(merged, merger.conflicts, merger.replaced, merger.inserted, merger.deleted)
+
+
+def merge_file(path: str, base: Optional[str], ours: str, theirs: str) -> MergeResult:
+    """
+    Merge an edit into an existing file.
+
+    Python files go through ``merge_python``; other files, and Python files
+    either side of which does not parse, take the edit wholesale.
+    """
+    if path.endswith(".py"):
+        try:
+            return merge_python(base, ours, theirs)
+        except SyntaxError:
+            pass
+    return MergeResult(theirs, [], ["<file>"], [])
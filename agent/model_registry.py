@@ -0,0 +1,288 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from agent.tracing import cache_lookup, span
+
+# (model name, dtype, device map) - the parameters that produce distinct weights in memory
+ModelKey = Tuple[str, str, str]
+Loader = Callable[[str, str, str], Tuple[Any, Any]]
+
+DEFAULT_MODEL = "mistralai/Mistral-7B-v0.1"
+
+
+def load_transformers_model(model_name: str, dtype: str, device_map: str) -> Tuple[Any, Any]:
+    """
+    Load a tokenizer/model pair with Hugging Face transformers.
+
+    Args:
+        model_name: Hub id or local path of the checkpoint
+        dtype: torch dtype name ("float16", "float32", ...), "auto" to pick
+            float16 on CUDA and float32 otherwise, or "qint8" for a float32 CPU
+            model with its Linear layers dynamically quantized to int8
+        device_map: Value forwarded to ``from_pretrained(device_map=...)``;
+            "none" loads the model on the default device
+
+    Returns:
+        Tuple of (tokenizer, model)
+    """
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    if dtype == "auto":
+        torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+    elif dtype == "qint8":
+        torch_dtype = torch.float32
+        device_map = "none"  # dynamic quantization runs on CPU only
+    else:
+        torch_dtype = getattr(torch, dtype)
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        device_map=None if device_map == "none" else device_map,
+        torch_dtype=torch_dtype
+    )
+    model.eval()
+    if dtype == "qint8":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        quantized, skipped = quantized_layers(model)
+        if skipped:
+            # GPT-2 style checkpoints use Conv1D, which dynamic quantization does not cover
+            print(f"Warning: qint8 quantized {quantized} Linear layers of {model_name}; "
+                  f"{skipped} Conv1D layers stay float32")
+    return tokenizer, model
+
+
+def quantized_layers(model: Any) -> Tuple[int, int]:
+    """
+    Count the layers of a model dynamically quantized by the "qint8" dtype.
+
+    Returns:
+        Tuple of (int8 Linear layers, Conv1D layers left in float32)
+    """
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+
+    quantized = skipped = 0
+    for module in model.modules():
+        if isinstance(module, QuantizedLinear):
+            quantized += 1
+        elif type(module).__name__ == "Conv1D":
+            skipped += 1
+    return quantized, skipped
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU cache of loaded (tokenizer, model) pairs.
+
+    Each key is loaded at most once; concurrent callers asking for a key that
+    is still loading wait for that load instead of starting their own. When
+    more than ``max_models`` keys are resident the least recently used one is
+    dropped.
+    """
+
+    def __init__(self, max_models: int = 1, loader: Optional[Loader] = None):
+        self.max_models = max(1, int(max_models))
+        self.loader = loader or load_transformers_model
+        self._models: "OrderedDict[ModelKey, Tuple[Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._load_times: Dict[ModelKey, float] = {}
+
+    def get(self, model_name: str, dtype: str = "auto", device_map: str = "auto") -> Tuple[Any, Any]:
+        """
+        Return the (tokenizer, model) pair for a key, loading it on first use.
+
+        Args:
+            model_name: Hub id or local path of the checkpoint
+            dtype: torch dtype name or "auto"
+            device_map: Device map passed to the loader
+
+        Returns:
+            Tuple of (tokenizer, model)
+        """
+        key = (model_name, str(dtype), str(device_map))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self._hits += 1
+                cache_lookup("model", True)
+                return self._models[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        cache_lookup("model", False)
+
+        with key_lock:
+            # Another thread may have finished loading while we waited
+            with self._lock:
+                if key in self._models:
+                    self._models.move_to_end(key)
+                    self._hits += 1
+                    return self._models[key]
+
+            start = time.perf_counter()
+            with span("model_load", model=model_name, dtype=str(dtype)):
+                entry = self.loader(*key)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._misses += 1
+                self._load_times[key] = elapsed
+                self._models[key] = entry
+                self._models.move_to_end(key)
+                evicted = self._evict_over_capacity()
+                self._key_locks.pop(key, None)
+            _evicted(evicted)
+            return entry
+
+    def warmup(self, specs: List[ModelKey]) -> None:
+        """Load every (model name, dtype, device map) in ``specs`` ahead of the first request."""
+        for spec in specs:
+            self.get(*spec)
+
+    def resize(self, max_models: int) -> None:
+        """Change the capacity, evicting least recently used models if needed."""
+        with self._lock:
+            self.max_models = max(1, int(max_models))
+            evicted = self._evict_over_capacity()
+        _evicted(evicted)
+
+    def evict(self, model_name: str, dtype: str = "auto", device_map: str = "auto") -> bool:
+        """Drop a single key. Returns True if it was loaded."""
+        key = (model_name, str(dtype), str(device_map))
+        with self._lock:
+            removed = self._models.pop(key, None)
+            if removed is not None:
+                self._evictions += 1
+        if removed is not None:
+            _evicted([key])
+        return removed is not None
+
+    def clear(self) -> None:
+        """Drop every loaded model."""
+        with self._lock:
+            evicted = list(self._models)
+            self._evictions += len(evicted)
+            self._models.clear()
+        _evicted(evicted)
+
+    def loaded(self) -> List[ModelKey]:
+        """Keys currently resident, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and per-key load times in seconds."""
+        with self._lock:
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "loaded": len(self._models),
+                "max_models": self.max_models,
+                "load_time_s": {"|".join(k): t for k, t in self._load_times.items()},
+            }
+
+    def _evict_over_capacity(self) -> List[ModelKey]:
+        # Caller holds self._lock and passes the result to _evicted once it is released
+        evicted = []
+        while len(self._models) > self.max_models:
+            evicted.append(self._models.popitem(last=False)[0])
+            self._evictions += 1
+        return evicted
+
+
+_eviction_listeners: List[Callable[[ModelKey], None]] = []
+
+
+def on_evict(listener: Callable[[ModelKey], None]) -> None:
+    """
+    Call ``listener(key)`` whenever a registry drops a model.
+
+    Caches holding per-model state (prefix key/values, batch schedulers)
+    register here so an evicted model's memory is actually freed.
+    """
+    _eviction_listeners.append(listener)
+
+
+def _evicted(keys: List[ModelKey]) -> None:
+    if not keys:
+        return
+    for key in keys:
+        for listener in list(_eviction_listeners):
+            listener(key)
+    _release_memory()
+
+
+def _release_memory() -> None:
+    import sys
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(config: Optional[Dict[str, Any]] = None) -> ModelRegistry:
+    """
+    Return the process-wide registry, creating it on first use.
+
+    The capacity comes from ``model_registry.max_models`` in the config, and
+    is at least 2 while speculative decoding is on so the draft model does not
+    evict the main one; later calls with a different value resize the
+    existing registry.
+    """
+    from agent.speculative import speculative_settings
+
+    global _registry
+    settings = (config or {}).get("model_registry") or {}
+    max_models = settings.get("max_models", 1)
+    if speculative_settings(config or {}) is not None:
+        # Every generation uses both models; with one slot each evicts the other
+        max_models = max(2, int(max_models))
+    with _registry_lock:
+        if _registry is None:
+            _registry = ModelRegistry(max_models=max_models)
+        elif config is not None and _registry.max_models != max(1, int(max_models)):
+            _registry.resize(max_models)
+        return _registry
+
+
+def set_registry(registry: Optional[ModelRegistry]) -> None:
+    """Replace the process-wide registry (e.g. with one using a stub loader)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+
+def model_spec(config: Dict[str, Any]) -> ModelKey:
+    """Registry key for the main model described by the config."""
+    settings = config.get("model_registry") or {}
+    return (
+        config.get("model", DEFAULT_MODEL),
+        str(settings.get("dtype", "auto")),
+        str(settings.get("device_map", "auto")),
+    )
+
+
+def warmup_models(config: Dict[str, Any], spec: Optional[ModelKey] = None) -> ModelRegistry:
+    """
+    Load the configured models up front so the first task does not pay for it.
+
+    Loads the main model plus any extra names listed under
+    ``model_registry.warmup`` (using the same dtype and device map). ``spec``
+    overrides the main model's key, e.g. for the int8 backend.
+    """
+    registry = get_registry(config)
+    name, dtype, device_map = spec or model_spec(config)
+    extra = (config.get("model_registry") or {}).get("warmup") or []
+    specs = [(name, dtype, device_map)]
+    specs += [(m, dtype, device_map) for m in extra if m != name]
+    registry.warmup(specs)
+    return registry
@@ -0,0 +1,117 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from typing import Any, Dict, Iterable, Set
+
+
+class ParseCache:
+    """
+    Persistent set of content hashes known to parse cleanly.
+
+    ``--fix-all`` skips any file whose SHA-256 is in the set, so a sweep over
+    an unchanged project does no parsing at all. Stored in SQLite (WAL mode)
+    like the file map, so concurrent sweeps can share it.
+
+    The validation stage (agent/validation.py) keeps its per-file results in
+    a second table, keyed the same way, so a regenerated identical file is
+    not checked again.
+    """
+
+    def __init__(self, db_path: str = "memory/parse_cache.db"):
+        self.db_path = db_path
+        self._init_lock = threading.Lock()
+        self._initialised = False
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure(self) -> None:
+        if self._initialised:
+            return
+        with self._init_lock:
+            if self._initialised:
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with closing(self._connect()) as conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                with conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS parsed_ok (hash TEXT PRIMARY KEY, checked_at REAL)")
+                    conn.execute("CREATE TABLE IF NOT EXISTS validated "
+                                 "(hash TEXT PRIMARY KEY, result TEXT, checked_at REAL)")
+            self._initialised = True
+
+    def known_good(self, hashes: Iterable[str]) -> Set[str]:
+        """Return the subset of ``hashes`` already known to parse."""
+        hashes = list(hashes)
+        if not hashes:
+            return set()
+        self._ensure()
+        found: Set[str] = set()
+        with closing(self._connect()) as conn:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash FROM parsed_ok WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update(row[0] for row in rows)
+        return found
+
+    def results(self, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the stored validation results of those ``hashes`` that have one."""
+        hashes = list(hashes)
+        if not hashes:
+            return {}
+        self._ensure()
+        found: Dict[str, Dict[str, Any]] = {}
+        with closing(self._connect()) as conn:
+            for start in range(0, len(hashes), 500):
+                chunk = hashes[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT hash, result FROM validated WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((row[0], json.loads(row[1])) for row in rows)
+        return found
+
+    def add_results(self, results: Dict[str, Dict[str, Any]], parsed_ok: Iterable[str] = ()) -> None:
+        """Store validation results and, in the same transaction, hashes of code known to parse."""
+        now = time.time()
+        rows = [(h, json.dumps(result), now) for h, result in results.items()]
+        if not rows:
+            return
+        self._ensure()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO validated (hash, result, checked_at) VALUES (?, ?, ?)", rows)
+                conn.executemany("INSERT OR REPLACE INTO parsed_ok (hash, checked_at) VALUES (?, ?)",
+                                 [(h, now) for h in parsed_ok])
+
+    def add(self, hashes: Iterable[str]) -> None:
+        now = time.time()
+        rows = [(h, now) for h in hashes]
+        if not rows:
+            return
+        self._ensure()
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO parsed_ok (hash, checked_at) VALUES (?, ?)", rows)
+
+
+_caches: Dict[str, ParseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_parse_cache(db_path: str = "memory/parse_cache.db") -> ParseCache:
+    """Return the process-wide parse cache stored at ``db_path``."""
+    key = os.path.abspath(db_path)
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = ParseCache(db_path)
+            _caches[key] = cache
+        return cache
@@ -0,0 +1,135 @@
+import copy
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from agent.model_registry import on_evict
+from agent.prompt_engine import split_prompt
+from agent.tracing import cache_lookup
+
+
+class PrefixCache:
+    """
+    Attention key/value cache of shared prompt prefixes.
+
+    Every prompt starts with the same system block, so its keys/values are
+    computed once per model and reused: a task only prefills its own suffix
+    (project context and task). The prefix and suffix are
+    tokenized separately and concatenated, whether or not the prefix was
+    cached, so a hit feeds the model exactly the tokens a miss would.
+    Entries are kept per (model key, prefix text) and the least recently used
+    are dropped beyond ``max_entries``; the entries of a model the registry
+    evicts are dropped with it, and only a weak reference to the model is kept.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Tuple[Any, str], Tuple[Any, Any, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def _prefix_state(self, key: Any, tokenizer, model, prefix: str) -> Tuple[Any, Any]:
+        """Return (prefix input ids, past key values) for a prefix, computing them on a miss."""
+        import torch
+
+        entry_key = (key, prefix)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            # A model evicted and reloaded by the registry invalidates its entries
+            if entry is not None and entry[0]() is model:
+                self._entries.move_to_end(entry_key)
+                self._hits += 1
+                cache_lookup("prefix", True)
+                return entry[1], entry[2]
+        cache_lookup("prefix", False)
+
+        prefix_ids = tokenizer(prefix, return_tensors="pt")["input_ids"].to(model.device)
+        with torch.no_grad():
+            past = model(input_ids=prefix_ids, use_cache=True).past_key_values
+
+        with self._lock:
+            self._misses += 1
+            self._entries[entry_key] = (weakref.ref(model), prefix_ids, past)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return prefix_ids, past
+
+    def prepare(self, key: Any, tokenizer, model, prompt: str) -> Optional[Dict[str, Any]]:
+        """
+        Build ``model.generate`` inputs that start from the cached prefix.
+
+        Args:
+            key: Registry key of the model
+            tokenizer: Tokenizer of the model
+            model: The loaded model
+            prompt: Full prompt as built by generate_prompt
+
+        Returns:
+            Dictionary with input_ids, attention_mask and past_key_values, or
+            None if the prompt has no shared prefix
+        """
+        import torch
+
+        prefix, suffix = split_prompt(prompt)
+        if not prefix:
+            return None
+        prefix_ids, past = self._prefix_state(key, tokenizer, model, prefix)
+        suffix_ids = tokenizer(suffix, return_tensors="pt", add_special_tokens=False)["input_ids"].to(model.device)
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=-1)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            # generate() extends the cache in place; every task needs its own copy
+            "past_key_values": copy.deepcopy(past),
+        }
+
+    def drop(self, key: Any) -> None:
+        """Drop every entry of one model key."""
+        with self._lock:
+            for entry_key in [k for k in self._entries if k[0] == key]:
+                del self._entries[entry_key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "entries": len(self._entries),
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+
+_cache: Optional[PrefixCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prefix_cache(config: Dict[str, Any]) -> Optional[PrefixCache]:
+    """
+    Return the process-wide prefix cache for the config's ``prefix_cache`` section.
+
+    Returns None when prefix reuse is disabled.
+    """
+    global _cache
+    settings = config.get("prefix_cache") or {}
+    if not settings.get("enabled", True):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = PrefixCache(settings.get("max_entries", 4))
+        return _cache
+
+
+def _drop_evicted(key: Any) -> None:
+    if _cache is not None:
+        _cache.drop(key)
+
+
+on_evict(_drop_evicted)
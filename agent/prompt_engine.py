@@ -1,5 +1,6 @@
-def generate_prompt(task, file_map):
-    base_prompt = """
+# The system block is identical across tasks, so its attention keys/values can
+# be computed once and reused (see agent/prefix_cache.py)
+BASE_PROMPT = """
 You are a coding assistant using Llama-3.1-Nemotron-70B-Instruct. Generate or edit production-ready code based on the user task.
 - For new code, return the complete code with file structure.
 - For editing, modify only the specified file and preserve existing content unless instructed otherwise.
@@ -13,4 +14,58 @@ Format:
 FILE: <file_path>
 ```<language>
 <code>
-"""
\ No newline at end of file
+```
+"""
+TASK_MARKER = "\nTask: "
+
+
+def generate_prompt(task, file_map, context=""):
+    """
+    Build the model prompt for a task.
+
+    Args:
+        task: The task description
+        file_map: Status of the files generated so far (the project itself is
+            described by ``context``)
+        context: Relevant slices of the existing project (see SymbolIndex.context);
+            placed between the system block and the task. It differs from
+            task to task, so it is not part of the cached prefix
+
+    Returns:
+        The prompt text
+    """
+    prompt = BASE_PROMPT
+    if context:
+        prompt += f"\nProject context:\n{context}\n"
+    return f"{prompt}{TASK_MARKER}{task}\n"
+
+
+def prompt_task(prompt):
+    """
+    The task line of a prompt built by generate_prompt.
+
+    Text appended later, such as a retry's error report, is not part of it;
+    a prompt without the task marker is returned whole.
+    """
+    marker = prompt.rfind(TASK_MARKER)
+    if marker == -1:
+        return prompt
+    return prompt[marker + len(TASK_MARKER):].split("\n", 1)[0]
+
+
+def split_prompt(prompt):
+    """
+    Split a prompt into its shared prefix and its task-specific suffix.
+
+    The prefix is the system block only: project context and task follow it
+    in the suffix, so every task of a model shares one cache entry.
+
+    Returns:
+        Tuple of (prefix, suffix); prefix is "" if the prompt does not start
+        with the system block
+    """
+    # The split falls on the line break that opens the context or task marker
+    prefix = BASE_PROMPT + "\n"
+    if not prompt.startswith(prefix):
+        return "", prompt
+    return prefix, prompt[len(prefix):]
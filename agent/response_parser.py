@@ -0,0 +1,158 @@
+import io
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+EDIT_KEYWORDS = ("add", "edit", "update", "modify", "fix")
+
+
+def classify_task(text: str) -> str:
+    """Return "edit" if the response mentions an edit keyword, else "create"."""
+    lowered = text.lower()
+    return "edit" if any(keyword in lowered for keyword in EDIT_KEYWORDS) else "create"
+
+
+def _fence(line: str):
+    """Split a fence line into (backtick count, info string), or None if it is not a fence."""
+    stripped = line.strip()
+    if not stripped.startswith("```"):
+        return None
+    ticks = len(stripped) - len(stripped.lstrip("`"))
+    return ticks, stripped[ticks:].strip()
+
+
+class FileBlockParser:
+    """
+    Single-pass parser for the ``FILE: <path>`` + fenced-code response format.
+
+    Lines are processed once, in order, and a file is produced as soon as its
+    closing fence is seen (or, for a block without a fence, at the next
+    ``FILE:`` line or at ``close``). Prose between ``FILE:`` and the opening
+    fence, and after the closing fence, is dropped.
+
+    Fences nest the way Markdown files embedded in a response need them to: a
+    language-tagged fence inside a block opens an inner block, a bare fence
+    closes the innermost one, and a block opened with N backticks is only
+    closed by a bare fence of at least N backticks. Inner fences are kept as
+    part of the file's code.
+
+    If ``task`` is given every file is labelled with it; otherwise the
+    edit/create label is derived from the text seen so far, which is all that
+    exists when parsing a stream.
+    """
+
+    def __init__(self, task: Optional[str] = None):
+        self._task = task
+        self._edit = False
+        self._partial: List[str] = []  # pieces of a line still waiting for its newline
+        self._path: Optional[str] = None
+        self._code: List[str] = []
+        self._fence_ticks = 0  # backticks of the open outer fence, 0 when outside code
+        self._depth = 0        # nested fences open inside the outer one
+
+    def feed(self, text: str) -> List[Dict[str, str]]:
+        """Consume a chunk of text and return any files it completed."""
+        files = []
+        start = 0
+        end = text.find("\n")
+        while end != -1:
+            line = text[start:end]
+            if self._partial:
+                self._partial.append(line)
+                line = "".join(self._partial)
+                self._partial = []
+            file_info = self.line(line)
+            if file_info is not None:
+                files.append(file_info)
+            start = end + 1
+            end = text.find("\n", start)
+        if start < len(text):
+            self._partial.append(text[start:])
+        return files
+
+    def close(self) -> List[Dict[str, str]]:
+        """Flush the trailing partial line and any unterminated file."""
+        files = []
+        if self._partial:
+            file_info = self.line("".join(self._partial))
+            if file_info is not None:
+                files.append(file_info)
+            self._partial = []
+        file_info = self._finish()
+        if file_info is not None:
+            files.append(file_info)
+        return files
+
+    def line(self, line: str) -> Optional[Dict[str, str]]:
+        """Process one complete line (without its newline); return a file if it completed one."""
+        if self._task is None and not self._edit:
+            lowered = line.lower()
+            self._edit = any(keyword in lowered for keyword in EDIT_KEYWORDS)
+
+        if line.startswith("FILE:"):
+            file_info = self._finish()
+            self._path = line[5:].strip()
+            return file_info
+        if self._path is None:
+            return None
+
+        fence = _fence(line)
+        if self._fence_ticks:
+            if fence is not None:
+                ticks, info = fence
+                if info:
+                    self._depth += 1
+                elif self._depth:
+                    self._depth -= 1
+                elif ticks >= self._fence_ticks:
+                    return self._finish()
+            self._code.append(line)
+        elif fence is not None:
+            # Prose between FILE: and the opening fence is not code
+            self._code = []
+            self._fence_ticks = fence[0]
+        elif line.strip():
+            self._code.append(line)
+        return None
+
+    def _finish(self) -> Optional[Dict[str, str]]:
+        file_info = None
+        if self._path and self._code:
+            file_info = {
+                "path": self._path,
+                "code": "\n".join(self._code).strip(),
+                "task": self._task or ("edit" if self._edit else "create")
+            }
+        self._path = None
+        self._code = []
+        self._fence_ticks = 0
+        self._depth = 0
+        return file_info
+
+
+def iter_code_files(response: Union[str, Iterable[str]], task: Optional[str] = None) -> Iterator[Dict[str, str]]:
+    """
+    Lazily parse a response into file records.
+
+    Args:
+        response: The whole response string, or an iterable of text chunks
+            (e.g. a token stream)
+        task: "edit" or "create" for every file; derived from the response
+            when omitted
+
+    Yields:
+        Dictionaries with path, code and task ("edit" or "create")
+    """
+    if isinstance(response, str):
+        # The whole text is available: classify once up front, then walk the
+        # lines without materialising a list of them
+        parser = FileBlockParser(task=task or classify_task(response))
+        for line in io.StringIO(response, newline="\n"):
+            file_info = parser.line(line[:-1] if line.endswith("\n") else line)
+            if file_info is not None:
+                yield file_info
+        yield from parser.close()
+        return
+
+    parser = FileBlockParser(task=task)
+    for chunk in response:
+        yield from parser.feed(chunk)
+    yield from parser.close()
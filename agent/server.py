@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import json
+import threading
+from queue import Queue
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+
+from agent.jobs import JobQueue, QueueFull
+from agent.main import run_task, get_file_tree
+from agent.template_engine import get_template_engine
+from agent.tracing import metrics
+from agent.utils import load_config
+from agent.workspace import DEFAULT_PROJECT, Workspace
+
+
+class TaskRequest(BaseModel):
+    # No project_dir: clients pick a project by name, never a directory on the server
+    task: str
+    fix: bool = False
+    project: str = DEFAULT_PROJECT
+    timeout_s: Optional[float] = None
+
+
+def create_app(config_path: str = "config.yaml", project_dir: Optional[str] = None) -> FastAPI:
+    """
+    Build the FastAPI app for server mode.
+
+    The config is read once at startup and shared by every job, and (unless the
+    mock generator is in use) the model is warmed up before the first request
+    so its load cost is paid once per process instead of once per task.
+
+    Args:
+        config_path: Path to the YAML configuration
+        project_dir: Directory every task's project lives in (default:
+            ``server.project_dir``, then "projects")
+
+    Returns:
+        The FastAPI application
+    """
+    config = load_config(config_path) or {}
+    settings = config.get("server") or {}
+    project_dir = project_dir or settings.get("project_dir") or "projects"
+    queue = JobQueue(
+        max_workers=settings.get("max_workers", 2),
+        max_pending=settings.get("max_pending", 100),
+        history=settings.get("history", 1000),
+    )
+
+    app = FastAPI(title="AI Code Agent")
+    app.state.config = config
+    app.state.queue = queue
+
+    @app.on_event("startup")
+    def warmup():
+        # Parse every template once so the first matching task is served instantly
+        get_template_engine(config)
+        if not config.get("use_mock", True):
+            from agent.backends import get_backend
+            try:
+                get_backend(config).warmup()
+            except Exception as e:
+                print(f"Warning: model warm-up failed: {e}")
+
+    @app.on_event("shutdown")
+    def shutdown():
+        queue.shutdown(wait=False)
+
+    @app.get("/health")
+    def health() -> Dict[str, Any]:
+        return {"status": "ok", "jobs": queue.stats()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def prometheus_metrics() -> str:
+        # Stage timings, cache hit rates, tokens and bytes written, in Prometheus text format.
+        # stats() lists every status, so one that drops to 0 is not left at its last value
+        for status, count in queue.stats().items():
+            metrics.set_gauge("codenex_jobs", count, status=status)
+        return metrics.prometheus()
+
+    @app.post("/tasks", status_code=202)
+    def submit_task(request: TaskRequest) -> Dict[str, Any]:
+        _validate(request)
+        try:
+            job = queue.submit(
+                "run_task",
+                run_task,
+                task=request.task,
+                project_dir=project_dir,
+                project=request.project,
+                fix=request.fix,
+                config=config,
+                cancel=threading.Event(),
+            )
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return {"job_id": job.id, "status": job.status}
+
+    @app.post("/tasks/events")
+    async def task_events(request: TaskRequest, http_request: Request) -> StreamingResponse:
+        """
+        Run a task and stream its progress as server-sent events.
+
+        The task runs in the job queue's worker threads; this handler only
+        awaits its events, so one process holds many open streams without
+        tying up a thread per client. Events: ``job`` (job_id), ``prompt``,
+        ``text``, ``tokens``, ``file_parsed``, ``file_saved``, then one of
+        ``result``, ``error``, ``cancelled`` or ``timeout``. The task is
+        cancelled when the client disconnects, on ``DELETE /tasks/{job_id}``
+        or after ``timeout_s`` (default ``server.timeout_s``).
+        """
+        _validate(request)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        cancel = threading.Event()
+
+        def emit(event: Optional[Dict[str, Any]]) -> None:
+            # Called from the worker thread
+            loop.call_soon_threadsafe(events.put_nowait, event)
+
+        try:
+            job = queue.submit(
+                "run_task",
+                run_task,
+                task=request.task,
+                project_dir=project_dir,
+                project=request.project,
+                fix=request.fix,
+                config=config,
+                stream=True,
+                on_text=lambda text: emit({"type": "text", "text": text}),
+                on_event=lambda kind, data: emit({"type": kind, **data}),
+                cancel=cancel,
+            )
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        def on_done(_):
+            # Also runs for a job cancelled while still queued, which never calls run_task
+            if job.status == "cancelled":
+                emit({"type": "cancelled", "message": job.error})
+            elif job.result is not None:
+                emit({"type": "result", "result": _summary(job.result)})
+            else:
+                emit({"type": "error", "message": job.error})
+            emit(None)
+
+        job.future.add_done_callback(on_done)
+        timeout = request.timeout_s or settings.get("timeout_s", 300)
+        keepalive = settings.get("keepalive_s", 15)
+
+        async def body() -> AsyncIterator[str]:
+            deadline = loop.time() + timeout
+            finished = False
+            try:
+                yield _sse("job", {"job_id": job.id})
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        yield _sse("timeout", {"message": f"Task exceeded {timeout:g}s and was cancelled"})
+                        return
+                    try:
+                        event = await asyncio.wait_for(events.get(), timeout=min(remaining, keepalive))
+                    except asyncio.TimeoutError:
+                        if await http_request.is_disconnected():
+                            return
+                        # SSE comment: keeps proxies from closing an idle stream
+                        yield ": keep-alive\n\n"
+                        continue
+                    if event is None:
+                        finished = True
+                        return
+                    yield _sse(event.pop("type"), event)
+            finally:
+                # Timeout, client gone or server shutting down: stop the task
+                if not finished:
+                    cancel.set()
+
+        return StreamingResponse(body(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    @app.delete("/tasks/{job_id}")
+    def cancel_task(job_id: str) -> Dict[str, Any]:
+        """Cancel a queued or running task; finished ones are returned unchanged."""
+        job = queue.cancel(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+        if job.cancel_event is None:
+            raise HTTPException(status_code=409, detail=f"Job {job_id} cannot be cancelled")
+        return {"job_id": job.id, "status": job.status, "cancel_requested": job.cancel_event.is_set()}
+
+    @app.post("/tasks/stream")
+    def stream_task(request: TaskRequest) -> StreamingResponse:
+        """Run a task and stream its output as newline-delimited JSON events."""
+        _validate(request)
+        events: Queue = Queue()
+        cancel = threading.Event()
+
+        try:
+            job = queue.submit(
+                "run_task",
+                run_task,
+                task=request.task,
+                project_dir=project_dir,
+                project=request.project,
+                config=config,
+                stream=True,
+                on_text=lambda text: events.put({"type": "text", "text": text}),
+                cancel=cancel,
+            )
+        except QueueFull as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+        def on_done(_):
+            if job.result is not None and job.status != "cancelled":
+                events.put({"type": "result", "result": job.result})
+            else:
+                events.put({"type": "error", "message": job.error})
+            events.put(None)
+
+        job.future.add_done_callback(on_done)
+
+        def body():
+            finished = False
+            try:
+                while True:
+                    event = events.get()
+                    if event is None:
+                        finished = True
+                        return
+                    yield json.dumps(event) + "\n"
+            finally:
+                # Client gone: stop generating for it
+                if not finished:
+                    cancel.set()
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    @app.get("/tasks")
+    def list_tasks(status: Optional[str] = None) -> Dict[str, Any]:
+        return {"jobs": [_public(job.to_dict()) for job in queue.list(status)]}
+
+    @app.get("/tasks/{job_id}")
+    def get_task(job_id: str) -> Dict[str, Any]:
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+        return _public(job.to_dict())
+
+    @app.get("/tree")
+    def file_tree(project: str = DEFAULT_PROJECT,
+                  max_depth: Optional[int] = None, offset: int = 0,
+                  limit: Optional[int] = None) -> Dict[str, Any]:
+        try:
+            Workspace.validate(project)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        ignore = (config.get("file_tree") or {}).get("ignore")
+        return get_file_tree(project_dir, max_depth=max_depth, offset=offset, limit=limit,
+                             ignore=ignore, project=project)
+
+    return app
+
+
+def _validate(request: TaskRequest) -> None:
+    if not request.task.strip():
+        raise HTTPException(status_code=400, detail="Task cannot be empty")
+    try:
+        Workspace.validate(request.project)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _public(job: Dict[str, Any]) -> Dict[str, Any]:
+    # The shared config, callbacks and cancel flag are passed to run_task but are not part of the request
+    job["params"] = {k: v for k, v in job["params"].items() if k not in ("config", "cancel") and not callable(v)}
+    return job
+
+
+def _summary(result: Dict[str, Any]) -> Dict[str, Any]:
+    """A run_task result for the event stream: the project's file list instead of the whole file map."""
+    summary = {k: v for k, v in result.items() if k != "file_map"}
+    summary["files"] = sorted(result.get("file_map") or {})
+    return summary
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def serve(host: str = "127.0.0.1", port: int = 8000, config_path: str = "config.yaml",
+          project_dir: Optional[str] = None) -> None:
+    """Run the agent server with uvicorn."""
+    import uvicorn
+    uvicorn.run(create_app(config_path, project_dir), host=host, port=port)
+
+
+def main():
+    """CLI entry point for ``python -m agent.server``"""
+    parser = argparse.ArgumentParser(description="AI Code Agent server")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind")
+    parser.add_argument("--port", type=int, default=8000, help="Port to bind")
+    parser.add_argument("--config", default="config.yaml", help="Path to config.yaml")
+    parser.add_argument("--project-dir", default=None, help="Directory of the projects (default: server.project_dir)")
+    args = parser.parse_args()
+    serve(args.host, args.port, args.config, args.project_dir)
+
+
+if __name__ == "__main__":
+    main()
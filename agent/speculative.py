@@ -0,0 +1,128 @@
+from typing import Any, Dict, Iterator, List, Optional
+
+from agent.tracing import annotate, metrics
+
+
+def check_draft_tokenizer(tokenizer, draft_tokenizer) -> None:
+    """
+    Make sure the draft model speaks the main model's vocabulary.
+
+    Raises:
+        ValueError: If the two tokenizers map tokens to different ids
+    """
+    if draft_tokenizer is tokenizer:
+        return
+    if len(draft_tokenizer) != len(tokenizer) or draft_tokenizer.get_vocab() != tokenizer.get_vocab():
+        raise ValueError("The draft model must use the same tokenizer (vocabulary) as the main model")
+
+
+def _greedy_next(model, input_ids, cache):
+    """Run ``input_ids`` through ``model`` on top of ``cache``; return the argmax at every position."""
+    outputs = model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+    return outputs.logits[0].argmax(dim=-1)
+
+
+def _truncate(cache, length: int) -> None:
+    """Drop the cached keys/values after the first ``length`` tokens."""
+    # Crop by a negative count: cropping to a positive length is deprecated
+    # and warns on every call
+    excess = cache.get_seq_length() - length
+    if excess > 0:
+        cache.crop(-excess)
+
+
+def speculative_generate(model, draft_model, input_ids, max_new_tokens: int = 1000,
+                         num_draft_tokens: int = 5, eos_token_id: Optional[int] = None,
+                         stats: Optional[Dict[str, Any]] = None) -> Iterator[List[int]]:
+    """
+    Greedy decoding of ``model`` accelerated by a small draft model.
+
+    Each step the draft model proposes ``num_draft_tokens`` tokens greedily;
+    the main model scores the prompt's pending tokens plus all proposals in
+    one forward pass and keeps the longest prefix matching its own argmax,
+    followed by its own next token. Every kept token is the main model's
+    greedy choice, so the output is what plain greedy decoding of ``model``
+    produces (up to floating-point ties) while the main model runs once per
+    step instead of once per token. Rejected proposals are dropped from both
+    key/value caches.
+
+    Args:
+        model: The main model (verifies)
+        draft_model: A small model with the same vocabulary (proposes)
+        input_ids: Prompt token ids, shape (1, length)
+        max_new_tokens: Maximum number of tokens to generate
+        num_draft_tokens: Tokens the draft model proposes per step
+        eos_token_id: Stop after this token
+        stats: Filled in with steps (main model passes), proposed,
+            accepted, new_tokens and acceptance_rate
+
+    Yields:
+        The token ids accepted in each step
+    """
+    import torch
+    from transformers import DynamicCache
+
+    if stats is None:
+        stats = {}
+    stats.update({"steps": 0, "proposed": 0, "accepted": 0, "new_tokens": 0, "acceptance_rate": 0.0})
+
+    tokens = input_ids[0].tolist()
+    # Both caches hold every token except the last, which is fed on the next step
+    cache = DynamicCache()
+    draft_cache = DynamicCache()
+    generated = 0
+
+    with torch.no_grad():
+        while generated < max_new_tokens:
+            k = max(0, min(num_draft_tokens, max_new_tokens - generated - 1))
+
+            proposals: List[int] = []
+            draft_input = tokens[draft_cache.get_seq_length():]
+            for _ in range(k):
+                ids = torch.tensor([draft_input], device=draft_model.device)
+                proposal = int(_greedy_next(draft_model, ids, draft_cache)[-1])
+                proposals.append(proposal)
+                if proposal == eos_token_id:
+                    break
+                draft_input = [proposal]
+
+            pending = tokens[cache.get_seq_length():] + proposals
+            ids = torch.tensor([pending], device=model.device)
+            # Argmax after each pending token; the last len(proposals) + 1 check the proposals
+            choices = _greedy_next(model, ids, cache)[-(len(proposals) + 1):].tolist()
+
+            accepted = 0
+            while accepted < len(proposals) and proposals[accepted] == choices[accepted]:
+                accepted += 1
+            new_tokens = proposals[:accepted] + [choices[accepted]]
+
+            _truncate(cache, len(tokens) + accepted)
+            _truncate(draft_cache, len(tokens) + accepted)
+
+            if eos_token_id is not None and eos_token_id in new_tokens:
+                new_tokens = new_tokens[:new_tokens.index(eos_token_id) + 1]
+            new_tokens = new_tokens[:max_new_tokens - generated]
+            tokens.extend(new_tokens)
+            generated += len(new_tokens)
+
+            stats["steps"] += 1
+            stats["proposed"] += len(proposals)
+            stats["accepted"] += accepted
+            stats["new_tokens"] = generated
+            yield new_tokens
+            if eos_token_id is not None and new_tokens[-1] == eos_token_id:
+                break
+
+    if stats["proposed"]:
+        stats["acceptance_rate"] = stats["accepted"] / stats["proposed"]
+    metrics.inc("codenex_draft_tokens_total", stats["accepted"], result="accepted")
+    metrics.inc("codenex_draft_tokens_total", stats["proposed"] - stats["accepted"], result="rejected")
+    annotate(draft_acceptance=stats["acceptance_rate"], main_model_passes=stats["steps"])
+
+
+def speculative_settings(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The config's ``speculative`` section if assisted decoding is on, else None."""
+    settings = config.get("speculative") or {}
+    if not settings.get("enabled") or not settings.get("draft_model"):
+        return None
+    return settings
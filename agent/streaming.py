@@ -0,0 +1,121 @@
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from agent.backends import get_backend, word_chunks
+from agent.codegen import generation_params, mock_response, task_type
+from agent.constrained import record_generation
+from agent.gen_cache import get_generation_cache
+from agent.jobs import TaskCancelled
+from agent.response_parser import FileBlockParser
+from agent.tracing import cache_lookup, record_tokens
+
+
+def stream_response(prompt: str, config: Dict[str, Any],
+                    info: Optional[Dict[str, Any]] = None,
+                    cancel: Optional[threading.Event] = None) -> Iterator[str]:
+    """
+    Yield the raw response text chunk by chunk as it is generated.
+
+    Uses the configured backend's streaming unless mock mode is on; if the
+    model fails before producing any text the mock response is streamed
+    instead, matching ``generate_code``. ``info["mock"]`` records which of the
+    two produced the text. Setting ``cancel`` stops the model and raises
+    TaskCancelled.
+    """
+    if info is None:
+        info = {}
+    info["mock"] = False
+
+    backend = None if config.get("use_mock", True) else get_backend(config)
+    if backend is not None and backend.available():
+        started = False
+        try:
+            for text in backend.stream(prompt, generation_params(config), cancel):
+                started = True
+                yield text
+            return
+        except Exception as e:
+            if started or isinstance(e, TaskCancelled):
+                raise
+            print(f"Warning: Failed to stream from {config.get('model')}: {str(e)}")
+            print("Falling back to mock response...")
+
+    info["mock"] = True
+    yield from word_chunks(mock_response(prompt))
+
+
+def generate_code_stream(prompt: str, config: Dict[str, Any],
+                         on_text: Optional[Callable[[str], None]] = None,
+                         metrics: Optional[Dict[str, Any]] = None,
+                         cancel: Optional[threading.Event] = None) -> Iterator[Dict[str, str]]:
+    """
+    Streaming variant of ``generate_code``: yield each file as soon as it is complete.
+
+    Args:
+        prompt: The prompt to generate code from
+        config: Configuration dictionary containing model settings
+        on_text: Called with every decoded chunk, e.g. to echo output live
+        metrics: Filled in with time_to_first_token_s, time_to_first_file_s,
+            total_s and files once the stream is consumed
+        cancel: When set, the model stops decoding and TaskCancelled is raised
+
+    Yields:
+        Dictionaries with path, code and task, as returned by parse_code_response
+    """
+    if metrics is None:
+        metrics = {}
+    metrics.update({"time_to_first_token_s": None, "time_to_first_file_s": None, "files": 0})
+    if not prompt or not isinstance(prompt, str) or not prompt.strip():
+        print("Error: Prompt cannot be None or empty")
+        return
+
+    start = time.perf_counter()
+    parser = FileBlockParser(task=task_type(prompt))
+    produced: List[Dict[str, str]] = []
+
+    def emit(files):
+        for file_info in files:
+            if metrics["time_to_first_file_s"] is None:
+                metrics["time_to_first_file_s"] = time.perf_counter() - start
+            metrics["files"] += 1
+            produced.append(file_info)
+            yield file_info
+
+    params = generation_params(config)
+    cache = None if config.get("use_mock", True) else get_generation_cache(config)
+    cache_id = get_backend(config).identity() if cache is not None else None
+    cached = cache.get(prompt, cache_id, params) if cache is not None else None
+    if cache is not None:
+        cache_lookup("generation", cached is not None)
+    if cached is not None:
+        yield from emit(cached)
+        metrics["total_s"] = time.perf_counter() - start
+        return
+
+    source: Dict[str, Any] = {}
+    chunks = 0
+    chars = 0
+    useful_chars = 0  # up to the chunk that completed the last file
+    for text in stream_response(prompt, config, source, cancel):
+        chunks += 1
+        chars += len(text)
+        if metrics["time_to_first_token_s"] is None:
+            metrics["time_to_first_token_s"] = time.perf_counter() - start
+        if on_text:
+            on_text(text)
+        files = parser.feed(text)
+        if files:
+            useful_chars = chars
+        yield from emit(files)
+    files = parser.close()
+    if files:
+        useful_chars = chars
+    yield from emit(files)
+    metrics["total_s"] = time.perf_counter() - start
+    if chunks and not source.get("mock"):
+        # Streamers yield roughly one decoded token per chunk
+        record_tokens(chunks, metrics["total_s"] - metrics["time_to_first_token_s"])
+        record_generation(config, chunks, chars, useful_chars)
+    if cache is not None and not source.get("mock"):
+        cache.put(prompt, cache_id, params, produced)
@@ -0,0 +1,235 @@
+import ast
+import hashlib
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from agent.file_tree import DEFAULT_IGNORE, FileTreeIndex
+
+_WORD_RE = re.compile(r"[A-Za-z_][\w./-]*")
+
+
+class FileSymbols:
+    """Imports, top-level definitions and methods of one project file."""
+
+    def __init__(self, path: str, text: Optional[str], stamp: Tuple[int, int]):
+        self.path = path
+        self.stamp = stamp
+        self.imports: List[str] = []
+        # (kind, qualified name, signature, first line, last line)
+        self.symbols: List[Tuple[str, str, str, int, int]] = []
+        self.text = text if path.endswith(".py") else None
+        if self.text is not None:
+            self._parse(self.text)
+        self.digest = hashlib.sha256("\n".join(s[2] for s in self.symbols).encode("utf-8")).hexdigest()[:12]
+
+    def _parse(self, text: str) -> None:
+        try:
+            tree = ast.parse(text)
+        except (SyntaxError, ValueError):
+            return
+        for node in tree.body:
+            if isinstance(node, ast.Import):
+                self.imports.append("import " + ", ".join(alias.name for alias in node.names))
+            elif isinstance(node, ast.ImportFrom):
+                module = "." * node.level + (node.module or "")
+                self.imports.append(f"from {module} import " + ", ".join(alias.name for alias in node.names))
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._add("function", node.name, node)
+            elif isinstance(node, ast.ClassDef):
+                self._add("class", node.name, node)
+                for child in node.body:
+                    if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                        self._add("method", f"{node.name}.{child.name}", child)
+
+    def _add(self, kind: str, name: str, node: ast.AST) -> None:
+        self.symbols.append((kind, name, _signature(node), node.lineno, getattr(node, "end_lineno", node.lineno)))
+
+    def outline(self) -> str:
+        """Imports and signatures, one per line, methods indented under their class."""
+        lines = [f"  {line}" for line in self.imports]
+        for kind, _, signature, _, _ in self.symbols:
+            lines.append(("    " if kind == "method" else "  ") + signature)
+        return "\n".join(lines)
+
+    def source(self, first: int, last: int) -> str:
+        return "\n".join(self.text.splitlines()[first - 1:last]) if self.text else ""
+
+
+def _signature(node: ast.AST) -> str:
+    if isinstance(node, ast.ClassDef):
+        bases = ", ".join(ast.unparse(base) for base in node.bases)
+        return f"class {node.name}({bases})" if bases else f"class {node.name}"
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns is not None else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _stamp(file_path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class SymbolIndex:
+    """
+    ``ast`` index of a project's Python files, used to build edit-prompt context.
+
+    Files are re-parsed only when their (mtime, size) changes; files written
+    by ``save_project_files`` are updated from the written content directly.
+    ``context`` assembles the slices of the project relevant to a task under a
+    token budget, so prompt size (and prefill time) stays bounded however
+    large the project grows.
+    """
+
+    def __init__(self, root: str, ignore: Sequence[str] = DEFAULT_IGNORE):
+        self.root = root
+        # Reuse the tree index's ignore rules (dotfiles, node_modules, ...)
+        self._tree = FileTreeIndex(root, ignore)
+        self.files: Dict[str, FileSymbols] = {}
+        self._lock = threading.Lock()
+        self.parses = 0
+
+    def refresh(self) -> None:
+        """Pick up files added, changed or removed on disk since the last call."""
+        seen = set()
+        with self._lock:
+            for rel_path in self._tree.files():
+                seen.add(rel_path)
+                file_path = os.path.join(self.root, rel_path)
+                stamp = _stamp(file_path)
+                entry = self.files.get(rel_path)
+                if stamp is None or (entry is not None and entry.stamp == stamp):
+                    continue
+                text = None
+                if rel_path.endswith(".py"):
+                    try:
+                        with open(file_path, "r", encoding="utf-8") as f:
+                            text = f.read()
+                    except (OSError, UnicodeDecodeError):
+                        pass
+                self.files[rel_path] = FileSymbols(rel_path, text, stamp)
+                self.parses += 1
+            for rel_path in [p for p in self.files if p not in seen]:
+                del self.files[rel_path]
+
+    def update(self, rel_path: str, content: str) -> None:
+        """Re-index one file from content just written to it."""
+        rel_path = os.path.normpath(rel_path)
+        stamp = _stamp(os.path.join(self.root, rel_path))
+        if stamp is None:
+            return
+        with self._lock:
+            self.files[rel_path] = FileSymbols(rel_path, content, stamp)
+            self.parses += 1
+
+    def context(self, task: str, max_tokens: int = 1500, chars_per_token: float = 4.0) -> str:
+        """
+        Return the project context relevant to a task, within ``max_tokens``.
+
+        In order of priority: full source of files the task names, source of
+        functions/classes the task names, outlines (imports and signatures) of
+        the remaining Python files ranked by overlap with the task, then the
+        names of whatever else is in the project. A piece that does not fit is
+        skipped in favour of smaller ones further down.
+
+        Args:
+            task: The task description
+            max_tokens: Token budget for the returned text
+            chars_per_token: Characters counted as one token when estimating
+
+        Returns:
+            Context text, or "" if the project is empty
+        """
+        self.refresh()
+        with self._lock:
+            files = sorted(self.files.values(), key=lambda entry: entry.path)
+        if not files:
+            return ""
+
+        lowered = task.lower()
+        words = {w.lower().strip("./-") for w in _WORD_RE.findall(task)}
+        named_files = [
+            entry for entry in files
+            if entry.path.lower() in lowered or os.path.basename(entry.path).lower() in words
+        ]
+        named_symbols = [
+            (entry, symbol) for entry in files for symbol in entry.symbols
+            if symbol[1].split(".")[-1].lower() in words
+        ]
+
+        budget = int(max_tokens * chars_per_token)
+        parts: List[str] = []
+        included = set()
+
+        def add(text: str) -> bool:
+            nonlocal budget
+            if len(text) + 1 > budget:
+                return False
+            parts.append(text)
+            budget -= len(text) + 1
+            return True
+
+        for entry in named_files:
+            text = entry.text if entry.text is not None else _read(os.path.join(self.root, entry.path))
+            if text is not None and add(f"{entry.path} (full):\n```\n{text.rstrip()}\n```"):
+                included.add(entry.path)
+
+        for entry, (_, name, _, first, last) in named_symbols:
+            if entry.path in included:
+                continue
+            add(f"{entry.path} ({name}, lines {first}-{last}):\n```python\n{entry.source(first, last)}\n```")
+
+        def overlap(entry: FileSymbols) -> int:
+            names = {s[1].split(".")[-1].lower() for s in entry.symbols}
+            names.update(w.lower() for line in entry.imports for w in _WORD_RE.findall(line))
+            return len(names & words)
+
+        outlined = [entry for entry in files if entry.path not in included and (entry.symbols or entry.imports)]
+        outlined.sort(key=lambda entry: -overlap(entry))
+        for entry in outlined:
+            if add(f"{entry.path} (outline):\n{entry.outline()}"):
+                included.add(entry.path)
+
+        rest = [entry.path for entry in files if entry.path not in included]
+        if rest:
+            listing = "Other files: "
+            for path in rest:
+                if len(listing) + len(path) + 2 > budget:
+                    break
+                listing += path + ", "
+            if listing != "Other files: ":
+                add(listing.rstrip(", "))
+
+        return "\n".join(parts)
+
+
+def _read(file_path: str) -> Optional[str]:
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+_indexes: Dict[str, SymbolIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_symbol_index(root: str, create: bool = True) -> Optional[SymbolIndex]:
+    """
+    Return the process-wide symbol index of a project directory.
+
+    With ``create=False`` returns None instead of building an index nobody
+    has asked for yet (used by writers that only keep existing indexes fresh).
+    """
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None and create:
+            index = SymbolIndex(root)
+            _indexes[key] = index
+        return index
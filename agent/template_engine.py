@@ -0,0 +1,258 @@
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.response_parser import iter_code_files
+
+# Words that carry no requirement of their own
+STOPWORDS = {
+    "a", "an", "the", "with", "and", "for", "of", "to", "in", "on", "that", "which", "me", "my",
+    "please", "using", "use", "simple", "basic", "minimal", "small", "new", "project", "it",
+    "is", "has", "have", "some", "just", "i", "want", "need", "can", "you", "us", "our",
+}
+# Words describing the scaffold rather than asking for something in it: a task
+# may leave these uncovered, though they still count against its confidence
+TOLERATED = {
+    "quick", "demo", "sample", "example", "starter", "boilerplate", "skeleton", "template", "tiny",
+    "clean", "modern", "standard", "default", "plain", "barebones", "bare", "bones", "code",
+}
+SCAFFOLD_VERBS = {
+    "create", "build", "make", "generate", "scaffold", "start", "setup", "set", "up", "write",
+    "init", "initialize", "initialise", "bootstrap", "give", "spin",
+}
+# Changing existing code needs the model, never a template
+EDIT_VERBS = {"add", "edit", "update", "modify", "fix", "change", "refactor", "remove", "delete", "rename"}
+PARAM_WORDS = {"route", "routes", "endpoint", "endpoints", "page", "pages", "named", "called", "name"}
+
+NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5,
+    "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10,
+}
+ROUTE_NAMES = ["home", "about", "contact", "items", "users", "products", "orders", "settings", "dashboard", "profile"]
+MAX_ROUTES = 50
+
+_COUNT_RE = re.compile(r"\b(\d+|" + "|".join(NUMBER_WORDS) + r")\s+(?:\w+\s+)?(?:routes?|endpoints?|pages?)\b", re.I)
+_NAME_RE = re.compile(r"\b(?:named|called)\s+[\"']?([A-Za-z][\w-]*)", re.I)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_TAG_RE = re.compile(r"\{\{(#routes|/routes|\w+)\}\}")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _compile(text: str) -> List[Any]:
+    """
+    Split template text into parts once, at load time.
+
+    Parts are plain strings, ("var", name) for ``{{name}}``, and
+    ("routes", parts) for a ``{{#routes}}...{{/routes}}`` block that is repeated
+    once per route. A block tag on a line of its own takes the line with it.
+    """
+    root: List[Any] = []
+    stack = [root]
+    pos = 0
+    for match in _TAG_RE.finditer(text):
+        start, end = match.start(), match.end()
+        tag = match.group(1)
+        if tag in ("#routes", "/routes"):
+            line_start = text.rfind("\n", 0, start) + 1
+            line_end = text.find("\n", end)
+            if not text[line_start:start].strip() and not text[end:line_end if line_end != -1 else len(text)].strip():
+                start, end = line_start, (line_end + 1 if line_end != -1 else len(text))
+        if start > pos:
+            stack[-1].append(text[pos:start])
+        if tag == "#routes":
+            block: List[Any] = []
+            stack[-1].append(("routes", block))
+            stack.append(block)
+        elif tag == "/routes":
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1].append(("var", tag))
+        pos = end
+    if pos < len(text):
+        stack[-1].append(text[pos:])
+    return root
+
+
+def _render(parts: List[Any], values: Dict[str, Any], routes: List[Dict[str, str]]) -> str:
+    out = []
+    for part in parts:
+        if isinstance(part, str):
+            out.append(part)
+        elif part[0] == "var":
+            out.append(str(values.get(part[1], "")))
+        else:
+            for route in routes:
+                out.append(_render(part[1], {**values, **route}, routes))
+    return "".join(out)
+
+
+def _routes(count: int) -> List[Dict[str, str]]:
+    routes = []
+    for i in range(count):
+        name = ROUTE_NAMES[i] if i < len(ROUTE_NAMES) else f"page_{i + 1}"
+        routes.append({
+            "index": str(i + 1),
+            "route_name": name,
+            "route_path": "/" if name == "home" else f"/{name}",
+            "route_title": name.replace("_", " ").title(),
+        })
+    return routes
+
+
+class Template:
+    """A template file pre-parsed into its file list and compiled parts."""
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        meta, self.files = self._parse(text)
+        self.keywords = set(_tokens(meta.get("KEYWORDS", name.split("_")[0])))
+        self.vocab = set(_tokens(meta.get("VOCAB", ""))) | self.keywords
+        self.defaults: Dict[str, str] = {}
+        for pair in meta.get("DEFAULTS", "").split(";"):
+            if "=" in pair:
+                key, value = pair.split("=", 1)
+                self.defaults[key.strip()] = value.strip()
+
+    @staticmethod
+    def _parse(text: str) -> Tuple[Dict[str, str], List[Tuple[str, List[Any]]]]:
+        # Header lines ("KEY: value") before the first FILE: describe the template
+        meta = {}
+        for line in text.split("\n"):
+            if line.startswith("FILE:"):
+                break
+            if ":" in line:
+                key, value = line.split(":", 1)
+                meta[key.strip().upper()] = value.strip()
+        files = [(f["path"], _compile(f["code"])) for f in iter_code_files(text)]
+        return meta, files
+
+    def render(self, params: Dict[str, Any]) -> List[Dict[str, str]]:
+        values = {**self.defaults, **{k: v for k, v in params.items() if v is not None}}
+        count = min(int(values.get("routes", 1)), MAX_ROUTES)
+        routes = _routes(count)
+        return [
+            {"path": path, "code": _render(parts, values, routes).strip(), "task": "create"}
+            for path, parts in self.files
+        ]
+
+
+class TemplateMatch:
+    def __init__(self, template: Template, confidence: float, params: Dict[str, Any]):
+        self.template = template
+        self.confidence = confidence
+        self.params = params
+
+    def render(self) -> List[Dict[str, str]]:
+        return self.template.render(self.params)
+
+
+class TemplateEngine:
+    """
+    Serves scaffolds straight from ``templates/`` without the model.
+
+    Every template is parsed once at construction. ``match`` looks the task's
+    words up in a keyword index, then scores how much of the task the template
+    covers: confidence is the share of the task's content words that are the
+    template's keywords/vocabulary or a recognised parameter (route count, app
+    name). Tasks asking for changes, for more than one stack, or with any
+    content word the template does not cover (other than TOLERATED ones) fall
+    back to the model: "with user authentication" is a requirement no
+    scaffold fulfils, and neither is a route count above MAX_ROUTES.
+    """
+
+    def __init__(self, directory: str = "templates", min_confidence: float = 0.6):
+        self.directory = directory
+        self.min_confidence = min_confidence
+        self.templates: Dict[str, Template] = {}
+        self._index: Dict[str, List[str]] = {}
+        if os.path.isdir(directory):
+            for filename in sorted(os.listdir(directory)):
+                if not filename.endswith(".txt"):
+                    continue
+                with open(os.path.join(directory, filename), "r", encoding="utf-8") as f:
+                    template = Template(filename[:-4], f.read())
+                if not template.files:
+                    continue
+                self.templates[template.name] = template
+                for keyword in template.keywords:
+                    self._index.setdefault(keyword, []).append(template.name)
+
+    @staticmethod
+    def extract_params(task: str) -> Tuple[Dict[str, Any], set]:
+        """Return parameters found in the task and the words they consumed."""
+        params: Dict[str, Any] = {}
+        used = set()
+        count = _COUNT_RE.search(task)
+        if count:
+            value = count.group(1).lower()
+            params["routes"] = NUMBER_WORDS.get(value) or int(value)
+            used.update(_tokens(count.group(0)))
+        name = _NAME_RE.search(task)
+        if name:
+            params["app_name"] = name.group(1)
+            used.update(_tokens(name.group(0)))
+        return params, used
+
+    def match(self, task: str) -> Optional[TemplateMatch]:
+        """Return the confident template match for a task, or None."""
+        tokens = _tokens(task)
+        if not tokens or any(token in EDIT_VERBS for token in tokens):
+            return None
+
+        hits: Dict[str, int] = {}
+        for token in tokens:
+            for name in self._index.get(token, ()):
+                hits[name] = hits.get(name, 0) + 1
+        if len(hits) != 1:
+            # No known stack, or several (e.g. "Flask API with a React frontend")
+            return None
+        template = self.templates[next(iter(hits))]
+
+        params, param_words = self.extract_params(task)
+        if not 1 <= params.get("routes", 1) <= MAX_ROUTES:
+            # Rendering fewer routes than asked for would not do the task
+            return None
+        content = [t for t in tokens if t not in STOPWORDS and t not in SCAFFOLD_VERBS]
+        uncovered = [
+            t for t in content
+            if t not in template.vocab and t.rstrip("s") not in template.vocab
+            and t not in param_words and t not in PARAM_WORDS
+        ]
+        if any(t not in TOLERATED for t in uncovered):
+            return None
+        confidence = 1.0 - len(uncovered) / len(content) if content else 0.0
+        if confidence < self.min_confidence:
+            return None
+        return TemplateMatch(template, confidence, params)
+
+    def render(self, task: str) -> Optional[List[Dict[str, str]]]:
+        """Render the scaffold for a task, or None if no template matches confidently."""
+        match = self.match(task)
+        return match.render() if match else None
+
+
+_engines: Dict[Tuple[str, float], TemplateEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def get_template_engine(config: Dict[str, Any]) -> Optional[TemplateEngine]:
+    """
+    Return the process-wide engine for the config's ``templates`` section.
+
+    Returns None when the template fast path is disabled.
+    """
+    settings = config.get("templates") or {}
+    if not settings.get("enabled", True):
+        return None
+    key = (settings.get("dir", "templates"), float(settings.get("min_confidence", 0.6)))
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = TemplateEngine(*key)
+            _engines[key] = engine
+        return engine
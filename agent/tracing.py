@@ -0,0 +1,230 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Help text of the metrics the pipeline records
+METRIC_HELP = {
+    "codenex_stage_seconds": "Time spent per pipeline stage",
+    "codenex_tasks_total": "Tasks run, by status",
+    "codenex_cache_requests_total": "Cache lookups, by cache and result",
+    "codenex_generated_tokens_total": "Tokens generated by the model",
+    "codenex_draft_tokens_total": "Speculative draft tokens, by accepted or rejected",
+    "codenex_generations_total": "Model generations, by free or constrained decoding",
+    "codenex_wasted_tokens_total": "Generated tokens after the last complete file, by decoding mode",
+    "codenex_retries_total": "Regenerations, by decoding mode and reason (no_files or invalid)",
+    "codenex_validated_files_total": "Generated files validated before writing, by ok, fixed or invalid",
+    "codenex_files_written_total": "Files written to projects",
+    "codenex_bytes_written_total": "Bytes written to projects",
+    "codenex_jobs": "Server jobs, by status",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Span:
+    """One timed stage. ``attrs`` holds whatever the stage reports (tokens, bytes, hits...)."""
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.duration: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "depth": self.depth, "seconds": self.duration, **self.attrs}
+
+
+class Trace:
+    """The spans of one task, in the order they started."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self.spans: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace": self.name, "started_at": self.started_at, "spans": [s.to_dict() for s in self.spans]}
+
+    def breakdown(self) -> str:
+        """Human-readable per-stage table, children indented under their parent."""
+        lines = []
+        for s in self.spans:
+            attrs = " ".join(f"{k}={_fmt(v)}" for k, v in s.attrs.items())
+            seconds = f"{s.duration * 1000:9.1f} ms" if s.duration is not None else "  running  "
+            lines.append(f"{'  ' * s.depth}{s.name:<{28 - 2 * s.depth}} {seconds}  {attrs}".rstrip())
+        return "\n".join(lines)
+
+
+def _fmt(value: Any) -> str:
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Process-wide counters and stage timings, exportable in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._summaries: Dict[Tuple[str, Labels], List[float]] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0, 0.0])
+            summary[0] += 1
+            summary[1] += value
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, gauges and summaries as plain JSON-serialisable data."""
+        with self._lock:
+            return {
+                "counters": [_sample(k, v) for k, v in self._counters.items()],
+                "gauges": [_sample(k, v) for k, v in self._gauges.items()],
+                "summaries": [{**_sample(k, s[1]), "count": s[0]} for k, s in self._summaries.items()],
+            }
+
+    def prometheus(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            samples: Dict[str, List[str]] = {}
+            types: Dict[str, str] = {}
+            for (name, labels), value in sorted(self._counters.items()):
+                types[name] = "counter"
+                samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_num(value)}")
+            for (name, labels), value in sorted(self._gauges.items()):
+                types[name] = "gauge"
+                samples.setdefault(name, []).append(f"{name}{_labels(labels)} {_num(value)}")
+            for (name, labels), (count, total) in sorted(self._summaries.items()):
+                types[name] = "summary"
+                samples.setdefault(name, []).append(f"{name}_sum{_labels(labels)} {_num(total)}")
+                samples[name].append(f"{name}_count{_labels(labels)} {count}")
+        out = []
+        for name in sorted(samples):
+            help_text = METRIC_HELP.get(name, name)
+            out.append(f"# HELP {name} {help_text}")
+            out.append(f"# TYPE {name} {types[name]}")
+            out.extend(samples[name])
+        return "\n".join(out) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._summaries.clear()
+            self._gauges.clear()
+
+
+def _sample(key: Tuple[str, Labels], value: float) -> Dict[str, Any]:
+    return {"name": key[0], "labels": dict(key[1]), "value": value}
+
+
+def _labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _num(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+metrics = Metrics()
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("codenex_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("codenex_span", default=None)
+_sink_lock = threading.Lock()
+
+
+@contextmanager
+def trace(name: str, jsonl_path: Optional[str] = None) -> Iterator[Trace]:
+    """
+    Collect the spans of one task.
+
+    Spans opened in this thread while the trace is active are recorded in it.
+    If ``jsonl_path`` is given the finished trace is appended there as one
+    JSON line. Inside an already active trace (e.g. the CLI's --profile
+    trace around run_task) the outer trace is reused.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        yield active
+        return
+    current = Trace(name)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        if jsonl_path:
+            _write_jsonl(jsonl_path, current.to_dict())
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Span]:
+    """
+    Time a pipeline stage.
+
+    The duration is always added to ``codenex_stage_seconds{stage=name}``;
+    the span itself is kept only inside an active trace. Attributes can be
+    set up front or later via ``annotate``.
+    """
+    parent = _current_span.get()
+    current = Span(name, parent, dict(attrs))
+    active = _current_trace.get()
+    if active is not None:
+        active.spans.append(current)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+        current.duration = time.perf_counter() - current.start
+        metrics.observe("codenex_stage_seconds", current.duration, stage=name)
+
+
+def annotate(**attrs: Any) -> None:
+    """Attach attributes to the innermost open span, if any."""
+    current = _current_span.get()
+    if current is not None:
+        current.attrs.update(attrs)
+
+
+def record_tokens(tokens: int, seconds: float) -> None:
+    """Count generated tokens and note tokens/sec on the current span."""
+    metrics.inc("codenex_generated_tokens_total", tokens)
+    annotate(tokens=tokens, tokens_per_s=tokens / seconds if seconds > 0 else 0.0)
+
+
+def cache_lookup(cache: str, hit: bool) -> None:
+    """Count a cache lookup and note it on the current span."""
+    metrics.inc("codenex_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+    annotate(**{f"{cache}_cache": "hit" if hit else "miss"})
+
+
+def _write_jsonl(path: str, record: Dict[str, Any]) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    line = json.dumps(record, default=str) + "\n"
+    with _sink_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
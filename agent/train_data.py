@@ -0,0 +1,320 @@
+import glob
+import hashlib
+import json
+import os
+import random
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Part of every shard key; bump when the shard layout changes
+SHARD_FORMAT = 1
+
+# (parquet path, row group, shard path)
+Shard = Tuple[str, int, str]
+
+
+def file_digest(path: str, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of everything that decides a tokenizer's output (vocabulary, merges, normalisation...)."""
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        state = backend.to_str()
+    else:
+        state = json.dumps(tokenizer.get_vocab(), sort_keys=True)
+    special = json.dumps(tokenizer.special_tokens_map, sort_keys=True, default=str)
+    return hashlib.sha256((state + special).encode("utf-8")).hexdigest()
+
+
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer_name: str, rust_threads: bool = True) -> None:
+    global _worker_tokenizer
+    if not rust_threads:
+        # One process per core already; Rust threads on top would oversubscribe the CPU
+        os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    from transformers import AutoTokenizer
+    _worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True)
+
+
+def _shard_rows(shard_path: str) -> int:
+    import pyarrow as pa
+
+    with pa.memory_map(shard_path) as source:
+        reader = pa.ipc.open_file(source)
+        return sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+
+
+def _tokenize_shard(job: Tuple[str, int, str, int, Tuple[str, ...], str, int]) -> Tuple[str, int]:
+    """
+    Tokenize one row group of a Parquet file into an Arrow shard (runs in a worker).
+
+    Rows are read in record batches and every batch is tokenized with one
+    call, so a fast tokenizer encodes it in parallel in Rust. Rows with a
+    missing column are skipped. The shard is written to a temp file and
+    renamed, so an interrupted run never leaves a partial shard behind.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path, row_group, shard_path, max_length, columns, separator, read_batch_size = job
+    if os.path.exists(shard_path):
+        return shard_path, _shard_rows(shard_path)
+
+    schema = pa.schema([("input_ids", pa.list_(pa.int32()))])
+    tmp_path = f"{shard_path}.{os.getpid()}.tmp"
+    rows = 0
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+        parquet = pq.ParquetFile(path)
+        for batch in parquet.iter_batches(batch_size=read_batch_size, row_groups=[row_group], columns=list(columns)):
+            values = [batch.column(name).to_pylist() for name in columns]
+            texts = [separator.join(row) for row in zip(*values) if None not in row]
+            if not texts:
+                continue
+            encoded = _worker_tokenizer(texts, truncation=True, max_length=max_length)["input_ids"]
+            writer.write_batch(pa.record_batch([pa.array(encoded, type=pa.list_(pa.int32()))], schema=schema))
+            rows += len(texts)
+    os.replace(tmp_path, shard_path)
+    return shard_path, rows
+
+
+class ShardedTextDataset:
+    """
+    Tokenized training samples streamed from Parquet files, cached as shards on disk.
+
+    Every row group of every Parquet file becomes one shard: its rows are read
+    in record batches (never the whole file), the text columns are joined as
+    the notebook did (``docstring </s> code``) and tokenized in batches across
+    a process pool. Shards are Arrow files in ``cache_dir`` named by a hash of
+    the file's content, the row group, the tokenizer and the settings, so a
+    re-run with unchanged data and tokenizer tokenizes nothing, and changing
+    any of them never serves stale ids. Shards are memory-mapped when read,
+    so resident memory stays around one record batch.
+
+    Iterating yields ``{"input_ids": [...]}`` samples as soon as the first
+    shard is ready; ``batches`` groups them into length-bucketed batches and
+    ``pad_batch`` pads a batch to its own longest sample.
+    """
+
+    def __init__(self, files: Sequence[str], tokenizer_name: str, cache_dir: str = "data/.token_cache",
+                 max_length: int = 512, columns: Sequence[str] = ("docstring", "code"),
+                 separator: str = " </s> ", num_workers: Optional[int] = None,
+                 read_batch_size: int = 1024):
+        """
+        Args:
+            files: Parquet files, or directories/glob patterns to expand
+            tokenizer_name: Hub id or local path of the tokenizer (loaded
+                once per worker process)
+            cache_dir: Directory of the tokenized shards
+            max_length: Samples are truncated to this many tokens
+            columns: Text columns, joined with ``separator``
+            separator: Placed between the columns' values
+            num_workers: Tokenizer processes (default: CPU count; 1 tokenizes
+                in this process)
+            read_batch_size: Rows read and tokenized at a time
+        """
+        from transformers import AutoTokenizer
+
+        self.files = _expand(files)
+        self.tokenizer_name = tokenizer_name
+        self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=True)
+        self.cache_dir = cache_dir
+        self.max_length = max_length
+        self.columns = tuple(columns)
+        self.separator = separator
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.read_batch_size = read_batch_size
+        self._shards: Optional[List[Shard]] = None
+
+    def shards(self) -> List[Shard]:
+        """Every (parquet file, row group, shard path), in file order."""
+        import pyarrow.parquet as pq
+
+        if self._shards is not None:
+            return self._shards
+        os.makedirs(self.cache_dir, exist_ok=True)
+        settings = [SHARD_FORMAT, tokenizer_fingerprint(self.tokenizer), self.max_length,
+                    list(self.columns), self.separator]
+        digests = _DigestMemo(os.path.join(self.cache_dir, "digests.json"))
+        shards = []
+        for path in self.files:
+            digest = digests.get(path)
+            for row_group in range(pq.ParquetFile(path).metadata.num_row_groups):
+                key = hashlib.sha256(json.dumps([digest, row_group] + settings).encode("utf-8")).hexdigest()
+                shards.append((path, row_group, os.path.join(self.cache_dir, f"{key}.arrow")))
+        digests.save()
+        self._shards = shards
+        return shards
+
+    def num_rows(self) -> int:
+        """Rows in the Parquet files, from their metadata (rows with a missing column included)."""
+        import pyarrow.parquet as pq
+
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.files)
+
+    def prepare(self) -> Iterator[Tuple[str, int]]:
+        """
+        Tokenize the shards that are not cached yet.
+
+        Yields (shard path, rows) in shard order, each as soon as it is ready,
+        while the pool keeps tokenizing the shards after it.
+        """
+        jobs = [
+            (path, row_group, shard_path, self.max_length, self.columns, self.separator, self.read_batch_size)
+            for path, row_group, shard_path in self.shards()
+        ]
+        missing = sum(1 for job in jobs if not os.path.exists(job[2]))
+        if self.num_workers <= 1 or missing <= 1:
+            if missing:
+                _init_worker(self.tokenizer_name)
+            for job in jobs:
+                yield _tokenize_shard(job)
+            return
+
+        import multiprocessing
+
+        # spawn: a forked copy of an already-used fast tokenizer can deadlock
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(self.num_workers, missing), initializer=_init_worker,
+                          initargs=(self.tokenizer_name, False)) as pool:
+            for result in pool.imap(_tokenize_shard, jobs):
+                yield result
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        import pyarrow as pa
+
+        for shard_path, _ in self.prepare():
+            with pa.memory_map(shard_path) as source:
+                reader = pa.ipc.open_file(source)
+                for i in range(reader.num_record_batches):
+                    for input_ids in reader.get_batch(i).column(0).to_pylist():
+                        yield {"input_ids": input_ids}
+
+    def batches(self, batch_size: int, window: int = 50, seed: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Group samples into batches of similar length.
+
+        Reads ``batch_size * window`` samples at a time, sorts them by length
+        and cuts them into batches, so padding per batch stays small while
+        memory stays bounded. With ``seed`` the batches of each window are
+        shuffled, so training does not see lengths in increasing order.
+        """
+        rng = random.Random(seed) if seed is not None else None
+        pending: List[Dict[str, Any]] = []
+        for sample in self:
+            pending.append(sample)
+            if len(pending) >= batch_size * window:
+                yield from _bucket(pending, batch_size, rng)
+                pending = []
+        if pending:
+            yield from _bucket(pending, batch_size, rng)
+
+    def torch_dataset(self, batch_size: int, window: int = 50, seed: Optional[int] = None,
+                      label: Optional[int] = None):
+        """
+        The samples as a torch IterableDataset, in length-bucketed order.
+
+        A Trainer with ``per_device_train_batch_size=batch_size`` (and
+        ``dataloader_num_workers=0``) then forms batches of similar length; pass
+        ``pad_batch`` as its data collator for dynamic padding. ``label`` is
+        added to every sample as ``labels`` when given.
+        """
+        from torch.utils.data import IterableDataset
+
+        source = self
+
+        class _Samples(IterableDataset):
+            def __iter__(self):
+                for batch in source.batches(batch_size, window, seed):
+                    for sample in batch:
+                        yield sample if label is None else {**sample, "labels": label}
+
+        return _Samples()
+
+
+def _bucket(samples: List[Dict[str, Any]], batch_size: int, rng: Optional[random.Random]) -> List[List[Dict[str, Any]]]:
+    samples.sort(key=lambda sample: len(sample["input_ids"]))
+    batches = [samples[i:i + batch_size] for i in range(0, len(samples), batch_size)]
+    if rng is not None:
+        rng.shuffle(batches)
+    return batches
+
+
+def pad_batch(features: List[Dict[str, Any]], pad_token_id: int = 0, pad_to_multiple_of: int = 8) -> Dict[str, Any]:
+    """
+    Pad a batch to its longest sample (rounded up to ``pad_to_multiple_of``).
+
+    Returns input_ids and attention_mask tensors, plus a tensor for any other
+    per-sample value (e.g. labels).
+    """
+    import torch
+
+    longest = max(len(feature["input_ids"]) for feature in features)
+    if pad_to_multiple_of:
+        longest = -(-longest // pad_to_multiple_of) * pad_to_multiple_of
+    input_ids = torch.full((len(features), longest), pad_token_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(features), longest), dtype=torch.long)
+    for row, feature in enumerate(features):
+        ids = feature["input_ids"]
+        input_ids[row, :len(ids)] = torch.tensor(ids, dtype=torch.long)
+        attention_mask[row, :len(ids)] = 1
+    batch = {"input_ids": input_ids, "attention_mask": attention_mask}
+    for key in features[0]:
+        if key != "input_ids":
+            batch[key] = torch.tensor([feature[key] for feature in features])
+    return batch
+
+
+class _DigestMemo:
+    """File digests remembered by (size, mtime), so unchanged files are not re-hashed on every run."""
+
+    def __init__(self, path: str):
+        self.path = path
+        try:
+            with open(path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except (OSError, ValueError):
+            self._entries = {}
+        self._dirty = False
+
+    def get(self, file_path: str) -> str:
+        stat = os.stat(file_path)
+        key = os.path.abspath(file_path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        entry = self._entries.get(key)
+        if entry is None or entry["stamp"] != stamp:
+            entry = {"stamp": stamp, "digest": file_digest(file_path)}
+            self._entries[key] = entry
+            self._dirty = True
+        return entry["digest"]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
+        self._dirty = False
+
+
+def _expand(files: Sequence[str]) -> List[str]:
+    """Parquet files named by paths, directories and glob patterns, sorted and de-duplicated."""
+    if isinstance(files, str):
+        files = [files]
+    found = []
+    for entry in files:
+        if os.path.isdir(entry):
+            found.extend(glob.glob(os.path.join(entry, "**", "*.parquet"), recursive=True))
+        elif glob.has_magic(entry):
+            found.extend(glob.glob(entry, recursive=True))
+        else:
+            found.append(entry)
+    return sorted(set(found))
@@ -0,0 +1,313 @@
+import ast
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from agent.bugfixer import repair_code
+from agent.file_ops import content_hash
+from agent.parse_cache import get_parse_cache
+from agent.tracing import annotate, metrics, span
+
+# File kinds checked, by extension; other files are written unchecked
+KINDS = {".py": "python", ".json": "json", ".yaml": "yaml", ".yml": "yaml", ".toml": "toml"}
+
+# Packages whose import name is not their distribution name
+IMPORT_NAMES = {
+    "beautifulsoup4": "bs4",
+    "pillow": "PIL",
+    "pyyaml": "yaml",
+    "scikit_learn": "sklearn",
+    "scikit_image": "skimage",
+    "python_dotenv": "dotenv",
+    "python_multipart": "multipart",
+    "python_jose": "jose",
+    "opencv_python": "cv2",
+    "opencv_python_headless": "cv2",
+    "psycopg2_binary": "psycopg2",
+    "protobuf": "google",
+    "attrs": "attr",
+    "pyjwt": "jwt",
+    "dnspython": "dns",
+}
+
+# Standard library modules (Python 3.10+); without it imports are not checked
+_STDLIB: Optional[Set[str]] = (
+    set(sys.stdlib_module_names) | set(sys.builtin_module_names) | {"__future__"}
+    if hasattr(sys, "stdlib_module_names") else None
+)
+
+# Fields holding nested statements (or handlers/match cases, which hold them)
+_BODY_FIELDS = ("body", "orelse", "finalbody", "handlers", "cases")
+_TRY_FIELDS = ("orelse", "finalbody", "handlers")
+_TRY_NODES = (ast.Try, ast.TryStar) if hasattr(ast, "TryStar") else (ast.Try,)
+
+_REQUIREMENT_NAME_RE = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)")
+
+
+def validation_settings(config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The config's ``validation`` section if generated files are checked, else None."""
+    settings = config.get("validation") or {}
+    if not settings.get("enabled", True):
+        return None
+    return settings
+
+
+def file_kind(path: str) -> Optional[str]:
+    """The kind of check a file gets ("python", "json", "yaml", "toml"), or None."""
+    return KINDS.get(os.path.splitext(path)[1].lower())
+
+
+def _python_check(path: str, code: str) -> Tuple[Optional[str], List[str]]:
+    """Parse and byte-compile; return (error or None, top-level modules imported)."""
+    try:
+        tree = ast.parse(code, path)
+        # compile() catches what the parser lets through ('return' outside a
+        # function, misplaced nonlocal...)
+        compile(tree, path, "exec")
+    except SyntaxError as e:
+        return f"line {e.lineno}: {e.msg}", []
+    except ValueError as e:  # e.g. null bytes
+        return str(e), []
+
+    # Imports are statements, so only statement lists are walked, not
+    # expressions. Imports guarded by try/except are optional by construction.
+    modules = set()
+    stack: List[Any] = [tree]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, ast.Import):
+            modules.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            modules.add(node.module.split(".")[0])
+        for field in _TRY_FIELDS if isinstance(node, _TRY_NODES) else _BODY_FIELDS:
+            stack.extend(getattr(node, field, ()))
+    return None, sorted(modules)
+
+
+def _data_check(kind: str, code: str) -> Optional[str]:
+    """Parse a config file; return the error or None."""
+    if kind == "json":
+        try:
+            json.loads(code)
+        except json.JSONDecodeError as e:
+            return f"line {e.lineno}: {e.msg}"
+    elif kind == "yaml":
+        import yaml
+        try:
+            list(yaml.safe_load_all(code))
+        except yaml.YAMLError as e:
+            mark = getattr(e, "problem_mark", None)
+            if mark is None:
+                return " ".join(str(e).split())
+            return f"line {mark.line + 1}: {getattr(e, 'problem', None) or 'invalid YAML'}"
+    elif kind == "toml":
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            return None
+        try:
+            tomllib.loads(code)
+        except tomllib.TOMLDecodeError as e:
+            return str(e)
+    return None
+
+
+def check_file(path: str, code: str) -> Dict[str, Any]:
+    """
+    Check one generated file and, for Python, repair syntax errors (runs in a worker process).
+
+    Python files are parsed and byte-compiled; syntax errors go through the
+    bugfixer heuristics and the result is checked again. JSON, YAML and TOML
+    files are parsed.
+
+    Returns:
+        Dictionary with path, status ("ok", "fixed" or "invalid"), errors,
+        imports (top-level modules, for Python), fixes, code (the repaired
+        source, for "fixed") and seconds spent
+    """
+    start = time.perf_counter()
+    kind = file_kind(path)
+    result = {"path": path, "status": "ok", "errors": [], "imports": [], "fixes": 0, "code": None}
+    if kind == "python":
+        error, result["imports"] = _python_check(path, code)
+        if error is not None:
+            fixed_code, fixes, repair_error = repair_code(code)
+            fixed_error = None
+            if fixed_code is not None:
+                fixed_error, result["imports"] = _python_check(path, fixed_code)
+            if fixed_code is not None and fixed_error is None:
+                result.update(status="fixed", fixes=fixes, code=fixed_code)
+            else:
+                result.update(status="invalid", errors=[fixed_error or repair_error or error])
+    elif kind is not None:
+        error = _data_check(kind, code)
+        if error is not None:
+            result.update(status="invalid", errors=[error])
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def requirement_modules(text: str) -> Set[str]:
+    """Top-level modules provided by the packages of a requirements.txt."""
+    modules = set()
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if not line or line.startswith("-"):
+            continue
+        match = _REQUIREMENT_NAME_RE.match(line)
+        if match:
+            name = re.sub(r"[-.]+", "_", match.group(1)).lower()
+            modules.add(IMPORT_NAMES.get(name, name))
+    return modules
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(workers: int):
+    """Process pool shared by every task of this process, created on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Imported here: it costs ~20ms, which every other command would pay
+            from concurrent.futures import ProcessPoolExecutor
+            _pool = ProcessPoolExecutor(max_workers=workers)
+        return _pool
+
+
+def validate_files(files: List[Dict[str, str]], config: Dict[str, Any]
+                   ) -> Tuple[List[Dict[str, str]], List[Dict[str, Any]]]:
+    """
+    Check generated files before they are written, repairing what the bugfixer can.
+
+    Results are cached by content hash in the parse cache (``fix.parse_cache``),
+    so a file generated again with identical content is not checked again.
+    The rest are checked in-process, or across a shared process pool when
+    there is at least ``validation.parallel_min_kb`` of them: below that,
+    shipping the sources to workers costs more than parsing them.
+
+    Args:
+        files: Parsed files (path, code, task)
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (the files, with repaired code substituted, and per-file
+        results as returned by check_file, with "cached" set)
+    """
+    settings = validation_settings(config)
+    if settings is None or not files:
+        return files, []
+    cache = get_parse_cache((config.get("fix") or {}).get("parse_cache", "memory/parse_cache.db"))
+    checked = [file_info for file_info in files if file_kind(file_info["path"]) is not None]
+    # The same text is valid as one kind and not another
+    keys = [content_hash(file_kind(f["path"]) + "\0" + f["code"]) for f in checked]
+    with span("validate", files=len(checked)):
+        known = cache.results(keys)
+        pending = [(f, key) for f, key in zip(checked, keys) if key not in known]
+        metrics.inc("codenex_cache_requests_total", len(checked) - len(pending), cache="validation", result="hit")
+        metrics.inc("codenex_cache_requests_total", len(pending), cache="validation", result="miss")
+
+        paths = [f["path"] for f, _ in pending]
+        codes = [f["code"] for f, _ in pending]
+        workers = settings.get("max_workers") or os.cpu_count() or 1
+        size = sum(len(code) for code in codes)
+        if workers > 1 and len(pending) > 1 and size >= settings.get("parallel_min_kb", 256) * 1024:
+            fresh = list(_get_pool(workers).map(check_file, paths, codes))
+        else:
+            fresh = [check_file(path, code) for path, code in zip(paths, codes)]
+        cache.add_results(
+            {key: {k: v for k, v in result.items() if k not in ("path", "seconds")}
+             for (_, key), result in zip(pending, fresh)},
+            # Valid Python is also skipped by --fix-all
+            parsed_ok=[content_hash(result["code"] or f["code"]) for (f, _), result in zip(pending, fresh)
+                       if result["status"] != "invalid" and file_kind(f["path"]) == "python"],
+        )
+
+        by_key = {key: result for (_, key), result in zip(pending, fresh)}
+        results = []
+        for file_info, key in zip(checked, keys):
+            if key in known:
+                result = dict(known[key], path=file_info["path"], seconds=0.0, cached=True)
+            else:
+                result = dict(by_key[key], cached=False)
+            results.append(result)
+        for result in results:
+            metrics.inc("codenex_validated_files_total", status=result["status"])
+        annotate(**{status: sum(1 for r in results if r["status"] == status)
+                    for status in ("fixed", "invalid")})
+
+    repaired = {r["path"]: r["code"] for r in results if r["status"] == "fixed"}
+    files = [dict(f, code=repaired[f["path"]]) if f["path"] in repaired else f for f in files]
+    return files, results
+
+
+def check_imports(results: List[Dict[str, Any]], files: Iterable[Dict[str, str]],
+                  project_path: Path, existing: Iterable[str] = ()) -> None:
+    """
+    Warn about Python imports that nothing provides.
+
+    An import resolves if it is in the standard library, is a module or
+    package of the project (generated now or already there), or comes from a
+    package in requirements.txt (generated now, else the project's own). No
+    check is made when neither requirements.txt exists, or on Python < 3.10.
+    Unresolved imports are added to each result's ``warnings``.
+
+    Args:
+        results: Per-file results from validate_files, updated in place
+        files: All files of the response
+        project_path: Directory of the project
+        existing: Paths already in the project
+    """
+    files = list(files)
+    requirements = [f["code"] for f in files if os.path.basename(f["path"]) == "requirements.txt"]
+    if not requirements and (project_path / "requirements.txt").exists():
+        try:
+            requirements.append((project_path / "requirements.txt").read_text(encoding="utf-8"))
+        except (OSError, UnicodeDecodeError):
+            pass
+    if not requirements or _STDLIB is None:
+        return
+    provided = set(_STDLIB)
+    for text in requirements:
+        provided |= requirement_modules(text)
+    for path in [f["path"] for f in files] + list(existing):
+        parts = Path(path).parts
+        for index, part in enumerate(parts):
+            # Every directory level can be an import root (app/, src/app/...)
+            provided.add(os.path.splitext(part)[0] if index == len(parts) - 1 else part)
+    for result in results:
+        missing = [module for module in result["imports"] if module not in provided]
+        if missing:
+            result["warnings"] = [f"import {module} is not provided by requirements.txt" for module in missing]
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Counts plus the repaired, invalid and warned-about files of a validation run."""
+    return {
+        "checked": len(results),
+        "cached": sum(1 for r in results if r["cached"]),
+        "fixed": [r["path"] for r in results if r["status"] == "fixed"],
+        "invalid": {r["path"]: r["errors"] for r in results if r["status"] == "invalid"},
+        "warnings": {r["path"]: r["warnings"] for r in results if r.get("warnings")},
+    }
+
+
+def retry_prompt(prompt: str, results: List[Dict[str, Any]]) -> str:
+    """
+    The prompt again, followed by what was wrong with the previous answer.
+
+    That is the errors of the files that could not be repaired, or, with no
+    results, that the answer contained no file in the required format.
+    """
+    errors = "\n".join(f"- {r['path']}: {error}" for r in results if r["status"] == "invalid"
+                       for error in r["errors"])
+    if not errors:
+        return f"{prompt}The previous answer contained no files. Use the FILE: <file_path> format above.\n"
+    return (f"{prompt}The previous answer had errors that must be fixed:\n{errors}\n"
+            "Return every file again, complete and corrected.\n")
@@ -0,0 +1,71 @@
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Tuple
+
+DEFAULT_PROJECT = "generated_project"
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]*$")
+
+
+class Workspace:
+    """
+    Named projects under one directory, each with its own file map and lock.
+
+    A task targets one project: its files live in ``<project_dir>/<name>`` and
+    its file map in ``<memory_dir>/file_maps/<name>.db`` (the default project
+    keeps ``memory/file_map.json`` for compatibility). Writes to a project are
+    serialised by that project's lock only, so tasks on different projects
+    generate and write in parallel.
+    """
+
+    def __init__(self, project_dir: str = "projects", memory_dir: str = "memory"):
+        self.project_dir = project_dir
+        self.memory_dir = memory_dir
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    @staticmethod
+    def validate(name: str) -> str:
+        """Return ``name`` if it is a safe project name, else raise ValueError."""
+        if not name or not _NAME_RE.match(name) or ".." in name:
+            raise ValueError(f"Invalid project name '{name}': use letters, digits, '_', '-' and '.'")
+        return name
+
+    def project_path(self, name: str = DEFAULT_PROJECT) -> Path:
+        return Path(self.project_dir) / self.validate(name)
+
+    def file_map_path(self, name: str = DEFAULT_PROJECT) -> str:
+        if self.validate(name) == DEFAULT_PROJECT:
+            return os.path.join(self.memory_dir, "file_map.json")
+        return os.path.join(self.memory_dir, "file_maps", f"{name}.json")
+
+    def lock(self, name: str = DEFAULT_PROJECT) -> threading.Lock:
+        """The lock serialising file writes and file map updates of one project."""
+        with self._locks_lock:
+            return self._locks.setdefault(self.validate(name), threading.Lock())
+
+    def projects(self):
+        """Names of the projects that exist on disk."""
+        if not os.path.isdir(self.project_dir):
+            return []
+        return sorted(
+            entry.name for entry in os.scandir(self.project_dir)
+            if entry.is_dir() and _NAME_RE.match(entry.name)
+        )
+
+
+_workspaces: Dict[Tuple[str, str], Workspace] = {}
+_workspaces_lock = threading.Lock()
+
+
+def get_workspace(project_dir: str = "projects", memory_dir: str = "memory") -> Workspace:
+    """Return the process-wide workspace for a projects directory (shared locks)."""
+    key = (os.path.abspath(project_dir), os.path.abspath(memory_dir))
+    with _workspaces_lock:
+        workspace = _workspaces.get(key)
+        if workspace is None:
+            workspace = Workspace(project_dir, memory_dir)
+            _workspaces[key] = workspace
+        return workspace
@@ -0,0 +1,122 @@
+"""
+Tokens/sec and peak RSS of each inference backend.
+
+Every backend runs in its own subprocess so peak RSS reflects that backend
+alone. Each child loads the model (load time is reported separately), runs one
+warm-up generation, then times --repeat greedy generations of --max-new-tokens.
+Tokens are counted by re-tokenizing the completion (chunks for the stub).
+The int8 row also lists how many layers were quantized: dynamic quantization
+only covers nn.Linear, so on GPT-2 style checkpoints (Conv1D) little more
+than the output head is int8 and its speed-up is not representative.
+Use a tiny local checkpoint so the run finishes on a laptop CPU:
+
+    python benchmarks/bench_backends.py --model sshleifer/tiny-gpt2 --backends transformers int8 stub
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO)
+
+PROMPT = "Task: Write a Python script that prints the first ten prime numbers\n"
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_child(args):
+    from agent.backends import get_backend, word_chunks
+    from agent.model_registry import get_registry
+
+    config = {
+        "model": args.model,
+        "backend": args.child,
+        "use_mock": False,
+        "batching": {"max_batch_size": 1},
+        "generation": {"max_new_tokens": args.max_new_tokens, "do_sample": False},
+    }
+    backend = get_backend(config)
+    if not backend.available():
+        print(json.dumps({"backend": args.child, "error": "not available"}))
+        return
+
+    params = dict(config["generation"])
+    start = time.perf_counter()
+    backend.warmup()
+    load_s = time.perf_counter() - start
+    backend.generate(PROMPT, params)
+
+    quantized = None
+    if args.child == "stub":
+        count = lambda text: sum(1 for _ in word_chunks(text))
+    else:
+        tokenizer, model = get_registry(config).get(*backend._spec())
+        count = lambda text: len(tokenizer(text)["input_ids"])
+        if args.child == "int8":
+            from agent.model_registry import quantized_layers
+            quantized = quantized_layers(model)
+
+    tokens = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        tokens += count(backend.generate(PROMPT, params))
+    elapsed = time.perf_counter() - start
+    print(json.dumps({
+        "backend": args.child,
+        "load_s": load_s,
+        "tokens": tokens,
+        "tokens_per_s": tokens / elapsed if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "quantized": quantized,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="Small local checkpoint")
+    parser.add_argument("--backends", nargs="+", default=["transformers", "int8", "stub"])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    print(f"{'backend':13} {'load s':>8} {'tokens/s':>10} {'peak RSS MB':>12}  int8 layers")
+    for name in args.backends:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", name, "--model", args.model,
+             "--max-new-tokens", str(args.max_new_tokens), "--repeat", str(args.repeat)],
+            cwd=REPO, capture_output=True, text=True,
+        )
+        lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+        if result.returncode != 0 or not lines:
+            print(f"{name:13} failed: {result.stderr.strip().splitlines()[-1:] or 'no output'}")
+            continue
+        row = json.loads(lines[-1])
+        if "error" in row:
+            print(f"{name:13} {row['error']}")
+            continue
+        rss = f"{row['peak_rss_mb']:.1f}" if row["peak_rss_mb"] is not None else "n/a"
+        layers = ""
+        if row.get("quantized"):
+            quantized, skipped = row["quantized"]
+            layers = f"  {quantized}" + (f" ({skipped} Conv1D left float32)" if skipped else "")
+        print(f"{name:13} {row['load_s']:8.2f} {row['tokens_per_s']:10.1f} {rss:>12}{layers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Throughput of the batching scheduler versus batch size.
+
+By default a stub model is used whose generate() costs a fixed time per call
+plus a small per-row cost, which is how a GPU behaves until it saturates. Pass
+``--model`` with a small local checkpoint (e.g. sshleifer/tiny-gpt2) to measure
+a real model on CPU.
+
+    python benchmarks/bench_batching.py --prompts 64 --batch-sizes 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.batching import BatchScheduler
+
+
+class StubEncoding(dict):
+    def to(self, device):
+        return self
+
+
+class StubTokenizer:
+    eos_token = "</s>"
+    pad_token = None
+    pad_token_id = 0
+    padding_side = "right"
+
+    def __call__(self, prompts, return_tensors=None, padding=False):
+        rows = [p.split() for p in prompts]
+        width = max(len(r) for r in rows)
+        ids = [[0] * (width - len(r)) + [1] * len(r) for r in rows]
+        mask = [[0] * (width - len(r)) + [1] * len(r) for r in rows]
+        return StubEncoding(input_ids=ids, attention_mask=mask)
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return ["FILE: main.py\n" * len(row) for row in outputs]
+
+
+class StubModel:
+    device = "cpu"
+
+    def __init__(self, call_ms, row_ms):
+        self.call_s = call_ms / 1000.0
+        self.row_s = row_ms / 1000.0
+
+    def generate(self, input_ids, attention_mask, pad_token_id=None, **kwargs):
+        time.sleep(self.call_s + self.row_s * len(input_ids))
+        return [row + [2] for row in input_ids]
+
+
+def load_model(name):
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    tokenizer = AutoTokenizer.from_pretrained(name)
+    model = AutoModelForCausalLM.from_pretrained(name)
+    model.eval()
+    return tokenizer, model
+
+
+def run(tokenizer, model, prompts, batch_size, max_wait_ms, generate_kwargs):
+    scheduler = BatchScheduler(tokenizer, model, max_batch_size=batch_size,
+                               max_wait_ms=max_wait_ms, generate_kwargs=generate_kwargs)
+    results = [None] * len(prompts)
+
+    def client(i):
+        results[i] = scheduler.generate(prompts[i])
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(len(prompts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    scheduler.close()
+    assert all(r is not None for r in results)
+    return elapsed, scheduler.metrics()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", help="Local/hub checkpoint to benchmark instead of the stub")
+    parser.add_argument("--prompts", type=int, default=64, help="Concurrent prompts per run")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--max-wait-ms", type=float, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--call-ms", type=float, default=50, help="Stub: fixed cost per generate call")
+    parser.add_argument("--row-ms", type=float, default=2, help="Stub: extra cost per batched prompt")
+    args = parser.parse_args()
+
+    if args.model:
+        tokenizer, model = load_model(args.model)
+        generate_kwargs = {"max_new_tokens": args.max_new_tokens, "do_sample": False}
+    else:
+        tokenizer, model = StubTokenizer(), StubModel(args.call_ms, args.row_ms)
+        generate_kwargs = {}
+
+    prompts = [f"Create a Flask app with {i % 5 + 1} routes" for i in range(args.prompts)]
+    print(f"{'batch':>6} {'seconds':>9} {'prompts/s':>10} {'avg batch':>10}")
+    for batch_size in args.batch_sizes:
+        elapsed, metrics = run(tokenizer, model, prompts, batch_size, args.max_wait_ms, generate_kwargs)
+        print(f"{batch_size:>6} {elapsed:>9.3f} {len(prompts) / elapsed:>10.1f} {metrics['avg_batch_size']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cold and warm cost of get_file_tree on a large synthetic project.
+
+Creates a tree of --files files (default 100k) spread over nested directories,
+plus a node_modules directory, then times:
+
+- legacy: the previous Path.iterdir()/is_dir() walk, every call
+- cold:   first query of a fresh FileTreeIndex
+- warm:   re-query with nothing changed
+- touch:  re-query after adding one file in one deep directory
+
+    python benchmarks/bench_file_tree.py --files 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.file_tree import FileTreeIndex
+
+
+def legacy_tree(project_path):
+    """get_file_tree's walk before the index (baseline)."""
+    def build_tree(directory):
+        result = []
+        for item in directory.iterdir():
+            if item.name.startswith('.'):
+                continue
+            node = {
+                "name": item.name,
+                "path": str(item.relative_to(project_path)),
+                "type": "directory" if item.is_dir() else "file"
+            }
+            if item.is_dir():
+                node["children"] = build_tree(item)
+            result.append(node)
+        return result
+    return build_tree(project_path)
+
+
+def make_tree(root, n_files, files_per_dir=100, fanout=10):
+    dirs = []
+    n_dirs = max(1, n_files // files_per_dir)
+    for i in range(n_dirs):
+        # Nest directories fanout-wide: pkg3/pkg31/pkg317 ...
+        parts = [f"pkg{c}" for c in str(i)]
+        path = os.path.join(root, *["".join(parts[:k + 1]) for k in range(len(parts))])
+        dirs.append(path)
+    for path in dirs:
+        os.makedirs(path, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(path, f"module_{j}.py"), "w").close()
+    modules = os.path.join(root, "node_modules", "dep")
+    os.makedirs(modules)
+    for j in range(files_per_dir * 10):
+        open(os.path.join(modules, f"f{j}.js"), "w").close()
+    return dirs
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def count(nodes):
+    return sum(1 + count(n.get("children", [])) for n in nodes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100000)
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic tree")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="tree-bench-")
+    try:
+        print(f"Creating {args.files} files under {root} ...")
+        dirs = make_tree(root, args.files)
+
+        legacy_s, legacy_nodes = timed(lambda: legacy_tree(Path(root)))
+        index = FileTreeIndex(root)
+        cold_s, cold = timed(lambda: index.tree())
+        warm_s, _ = timed(lambda: index.tree())
+        time.sleep(0.01)
+        open(os.path.join(dirs[-1], "new_module.py"), "w").close()
+        scans = index.scans
+        touch_s, touched = timed(lambda: index.tree())
+        depth_s, _ = timed(lambda: FileTreeIndex(root).tree(max_depth=2))
+
+        print(f"legacy walk      {legacy_s * 1000:9.1f} ms  ({count(legacy_nodes)} nodes, node_modules included)")
+        print(f"index cold       {cold_s * 1000:9.1f} ms  ({count(cold['file_tree'])} nodes)")
+        print(f"index warm       {warm_s * 1000:9.1f} ms")
+        print(f"index one change {touch_s * 1000:9.1f} ms  ({index.scans - scans} directory re-listed)")
+        print(f"cold, depth 2    {depth_s * 1000:9.1f} ms")
+        assert count(touched["file_tree"]) == count(cold["file_tree"]) + 1
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
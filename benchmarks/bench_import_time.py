@@ -0,0 +1,109 @@
+"""
+Import-time guard for the CLI's light paths.
+
+Runs ``python -X importtime -m agent.main`` for --tree, --fix and a mock
+generation in a scratch copy of the project, parses the importtime report and
+prints total import time plus the slowest top-level packages. Exits non-zero if
+a path imports a forbidden framework (torch, transformers, fastapi, ...) or its
+total import time exceeds --budget-ms, so it can run in CI.
+
+    python benchmarks/bench_import_time.py --budget-ms 250
+"""
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FORBIDDEN = ("torch", "transformers", "accelerate", "fastapi", "uvicorn")
+_LINE_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+PATHS = {
+    "tree": ["--tree"],
+    "fix": ["--fix", "Fix syntax error in hello.py"],
+    "mock": ["Write a script to calculate primes"],
+}
+
+
+def parse_importtime(stderr):
+    """
+    Return ({module: cumulative_us} for top-level imports, the total in
+    microseconds, and every module imported at any depth).
+    """
+    top_level = {}
+    imported = set()
+    for line in stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, module = match.groups()
+        imported.add(module)
+        # Nesting is shown by two spaces per level after the '|'; nested
+        # imports are already in their parent's cumulative time
+        if len(indent) <= 1:
+            top_level[module] = int(cumulative)
+    return top_level, sum(top_level.values()), imported
+
+
+def make_workdir():
+    workdir = tempfile.mkdtemp(prefix="import-bench-")
+    shutil.copy(os.path.join(REPO, "config.yaml"), workdir)
+    shutil.copytree(os.path.join(REPO, "templates"), os.path.join(workdir, "templates"))
+    project = os.path.join(workdir, "projects", "generated_project")
+    os.makedirs(project)
+    os.makedirs(os.path.join(workdir, "memory"))
+    with open(os.path.join(project, "hello.py"), "w") as f:
+        f.write("def hello()\n    print('hi')\n")
+    return workdir
+
+
+def measure(args, workdir):
+    env = dict(os.environ, PYTHONPATH=REPO)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "agent.main", *args],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=250, help="Maximum import time per path")
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports to list per path")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per path; the fastest is reported")
+    args = parser.parse_args()
+
+    failures = []
+    for name, cli_args in PATHS.items():
+        best = None
+        for _ in range(args.repeat):
+            workdir = make_workdir()
+            try:
+                modules, total, imported = measure(cli_args, workdir)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+            if best is None or total < best[1]:
+                best = (modules, total, imported)
+        modules, total, imported = best
+
+        # Checked at every depth: torch pulled in by agent.codegen -> agent.backends
+        # only shows up nested under agent.main
+        heavy = sorted({m.split(".")[0] for m in imported if m.split(".")[0] in FORBIDDEN})
+        slowest = sorted(modules.items(), key=lambda item: item[1], reverse=True)[:args.top]
+        print(f"{name:5} total {total / 1000:7.1f} ms   " +
+              ", ".join(f"{m} {us / 1000:.1f}" for m, us in slowest))
+        if heavy:
+            failures.append(f"{name}: imports {', '.join(heavy)}")
+        if total / 1000 > args.budget_ms:
+            failures.append(f"{name}: {total / 1000:.1f} ms exceeds budget of {args.budget_ms} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Merge time versus file size.
+
+Builds modules of N functions (plus a class with N methods), edits a handful
+of them and adds one new function, then times merge_python against the old
+approach of re-serialising the whole file with ast.unparse. Merge time should
+grow linearly with N.
+
+    python benchmarks/bench_merge.py --sizes 100 1000 5000
+"""
+import argparse
+import ast
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.merge import merge_python
+
+
+def make_module(n, changed=()):
+    parts = ['"""Generated module."""', "import os", ""]
+    for i in range(n):
+        body = f"return {i} * 2" if i in changed else f"return {i}"
+        parts += ["", f"def func_{i}(x, y=1):", f"    # comment {i}", f"    {body}", ""]
+    parts += ["", "class Service:"]
+    for i in range(n):
+        parts += [f"    def method_{i}(self):", f"        return {i}", ""]
+    return "\n".join(parts)
+
+
+def make_edit(n, changed):
+    parts = []
+    for i in changed:
+        parts += [f"def func_{i}(x, y=1):", f"    return {i} * 2", ""]
+    parts += ["def added(x):", "    return x", ""]
+    return "\n".join(parts)
+
+
+def unparse_merge(existing, new):
+    tree = ast.parse(existing)
+    tree.body.extend(ast.parse(new).body)
+    return ast.unparse(tree)
+
+
+def timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'functions':>9} {'lines':>8} {'merge ms':>10} {'us/line':>8} {'unparse ms':>11}")
+    for n in args.sizes:
+        changed = [n // 4, n // 2, 3 * n // 4]
+        base = make_module(n)
+        edit = make_edit(n, changed)
+        result = merge_python(base, base, edit)
+        assert not result.conflicts and len(result.replaced) == len(changed)
+        lines = base.count("\n") + 1
+        merge_s = timed(lambda: merge_python(base, base, edit), args.repeat)
+        unparse_s = timed(lambda: unparse_merge(base, edit), args.repeat)
+        print(f"{n:9} {lines:8} {merge_s * 1000:10.1f} {merge_s * 1e6 / lines:8.2f} {unparse_s * 1000:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Scaling of the response parser with the number of FILE blocks.
+
+Builds synthetic responses with 1 to 500 files and times the single-pass
+parser against the previous implementation, which re-scanned the whole
+response for edit keywords once per file. Time per file should stay flat for
+the new parser as the response grows.
+
+    python benchmarks/bench_parse.py --sizes 1 10 50 100 500
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.response_parser import iter_code_files
+
+
+def legacy_parse(response):
+    """parse_code_response as it was before the single-pass rewrite (baseline)."""
+    files = []
+    current_file = None
+    current_code = []
+    in_code_block = False
+    keywords = ["add", "edit", "update", "modify", "fix"]
+    for line in response.split("\n"):
+        if line.startswith("FILE:"):
+            if current_file and current_code:
+                files.append({
+                    "path": current_file.strip(),
+                    "code": "\n".join(current_code).strip(),
+                    "task": "edit" if any(k in response.lower() for k in keywords) else "create"
+                })
+            current_file = line.replace("FILE:", "").strip()
+            current_code = []
+            in_code_block = False
+        elif line.strip().startswith("```"):
+            in_code_block = not in_code_block
+        elif in_code_block or (line.strip() and not line.startswith("```")):
+            current_code.append(line)
+    if current_file and current_code:
+        files.append({
+            "path": current_file.strip(),
+            "code": "\n".join(current_code).strip(),
+            "task": "edit" if any(k in response.lower() for k in keywords) else "create"
+        })
+    return files
+
+
+def synthetic_response(n_files, lines_per_file=30):
+    # No edit keywords, so the legacy parser scans the full text for all five each time
+    body = "\n".join(f"    value_{i} = compute({i})" for i in range(lines_per_file))
+    blocks = [f"FILE: pkg/module_{i}.py\n```python\ndef run_{i}():\n{body}\n```\n" for i in range(n_files)]
+    return "\n".join(blocks)
+
+
+def best_of(fn, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 50, 100, 250, 500])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'files':>6} {'bytes':>10} {'legacy ms':>10} {'new ms':>9} {'new us/file':>12} {'speedup':>8}")
+    for n in args.sizes:
+        response = synthetic_response(n)
+        legacy_s, legacy_files = best_of(legacy_parse, response, args.repeat)
+        new_s, new_files = best_of(lambda r: list(iter_code_files(r)), response, args.repeat)
+        assert len(new_files) == len(legacy_files) == n
+        print(f"{n:>6} {len(response):>10} {legacy_s * 1000:>10.2f} {new_s * 1000:>9.2f} "
+              f"{new_s * 1e6 / n:>12.1f} {legacy_s / new_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Time to first token with and without the prompt-prefix KV cache.
+
+Loads a small checkpoint on CPU and, for a handful of tasks, times a
+one-token greedy generation from the full prompt (the whole system block is
+prefilled) and from the cached prefix (only the task, and for edits the
+project context, is prefilled). Also checks that both produce the same greedy
+continuation; the cache should report a single miss.
+
+    python benchmarks/bench_prefix_cache.py --model sshleifer/tiny-gpt2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.prefix_cache import PrefixCache
+from agent.prompt_engine import generate_prompt, split_prompt
+
+TASKS = [
+    "Create a Flask app with 3 routes",
+    "Write a script to calculate primes",
+    "Build a FastAPI service named shop",
+    "Add a login page to app.py",
+    "Fix syntax error in hello.py",
+]
+# Edit tasks carry project context, which differs per task and is not cached
+CONTEXT = "app.py:\nfrom flask import Flask\n\napp = Flask(__name__)\n\ndef home(): ...\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="Small local checkpoint")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per task")
+    parser.add_argument("--check-tokens", type=int, default=16, help="Greedy tokens compared between modes")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32)
+    model.eval()
+    cache = PrefixCache()
+    key = (args.model, "float32", "none")
+
+    def first_token(inputs):
+        start = time.perf_counter()
+        with torch.no_grad():
+            model.generate(**inputs, max_new_tokens=1, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        return time.perf_counter() - start
+
+    def uncached(prompt):
+        # Same token ids as the cached path, just without a precomputed prefix
+        inputs = cache.prepare(key, tokenizer, model, prompt)
+        inputs.pop("past_key_values")
+        return inputs
+
+    cold, warm = [], []
+    mismatches = 0
+    for task in TASKS:
+        prompt = generate_prompt(task, {}, CONTEXT if task.startswith(("Add", "Fix")) else "")
+        first_token(uncached(prompt))  # warm up kernels
+        for _ in range(args.repeat):
+            cold.append(first_token(uncached(prompt)))
+            warm.append(first_token(cache.prepare(key, tokenizer, model, prompt)))
+
+        greedy = dict(max_new_tokens=args.check_tokens, do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        with torch.no_grad():
+            plain = model.generate(**uncached(prompt), **greedy)
+            reused = model.generate(**cache.prepare(key, tokenizer, model, prompt), **greedy)
+        if plain.tolist() != reused.tolist():
+            mismatches += 1
+
+    prefix_tokens = len(tokenizer(split_prompt(generate_prompt("", {}))[0])["input_ids"])
+    print(f"prefix tokens     {prefix_tokens}")
+    print(f"TTFT full prompt  {statistics.median(cold) * 1000:8.2f} ms (median)")
+    print(f"TTFT cached       {statistics.median(warm) * 1000:8.2f} ms (median)")
+    print(f"speedup           {statistics.median(cold) / statistics.median(warm):8.2f}x")
+    print(f"greedy mismatches {mismatches}/{len(TASKS)}")
+    print(f"cache             {cache.metrics()}")
+
+
+if __name__ == "__main__":
+    main()
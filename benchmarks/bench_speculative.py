@@ -0,0 +1,95 @@
+"""
+Latency and acceptance rate of speculative decoding against plain greedy decoding.
+
+Loads a main and a draft checkpoint on CPU (they must share a tokenizer) and,
+for a handful of task prompts, times greedy ``model.generate`` of the main
+model against speculative_generate with the draft model proposing
+--draft-tokens tokens per step. Checks that both produce the same tokens and
+reports the speedup, the share of draft tokens the main model accepted and
+the tokens produced per main model pass.
+
+    python benchmarks/bench_speculative.py --model sshleifer/tiny-gpt2 --draft-model sshleifer/tiny-gpt2
+    python benchmarks/bench_speculative.py --model gpt2-medium --draft-model distilgpt2 --draft-tokens 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from agent.prompt_engine import generate_prompt
+from agent.speculative import check_draft_tokenizer, speculative_generate
+
+TASKS = [
+    "Create a Flask app with 3 routes",
+    "Write a script to calculate primes",
+    "Build a FastAPI service named shop",
+    "Add a login page to app.py",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="sshleifer/tiny-gpt2", help="Main checkpoint")
+    parser.add_argument("--draft-model", default="sshleifer/tiny-gpt2", help="Small checkpoint with the same tokenizer")
+    parser.add_argument("--draft-tokens", type=int, default=5, help="Proposals per main model pass")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per task")
+    args = parser.parse_args()
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    draft_tokenizer = AutoTokenizer.from_pretrained(args.draft_model)
+    check_draft_tokenizer(tokenizer, draft_tokenizer)
+    model = AutoModelForCausalLM.from_pretrained(args.model, torch_dtype=torch.float32).eval()
+    draft_model = AutoModelForCausalLM.from_pretrained(args.draft_model, torch_dtype=torch.float32).eval()
+
+    def greedy(input_ids):
+        with torch.no_grad():
+            output = model.generate(input_ids=input_ids, attention_mask=torch.ones_like(input_ids),
+                                    max_new_tokens=args.max_new_tokens, do_sample=False,
+                                    pad_token_id=tokenizer.eos_token_id)
+        return output[0][input_ids.shape[1]:].tolist()
+
+    def speculative(input_ids, stats):
+        steps = speculative_generate(model, draft_model, input_ids, max_new_tokens=args.max_new_tokens,
+                                     num_draft_tokens=args.draft_tokens,
+                                     eos_token_id=tokenizer.eos_token_id, stats=stats)
+        return [token for step in steps for token in step]
+
+    plain_s, spec_s, rates, per_pass = [], [], [], []
+    tokens = 0
+    mismatches = 0
+    for task in TASKS:
+        input_ids = tokenizer(generate_prompt(task, {}), return_tensors="pt")["input_ids"]
+        greedy(input_ids)  # warm up kernels
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            expected = greedy(input_ids)
+            plain_s.append(time.perf_counter() - start)
+
+            stats = {}
+            start = time.perf_counter()
+            produced = speculative(input_ids, stats)
+            spec_s.append(time.perf_counter() - start)
+        tokens += len(produced)
+        rates.append(stats["acceptance_rate"])
+        per_pass.append(stats["new_tokens"] / stats["steps"])
+        if produced != expected:
+            mismatches += 1
+
+    print(f"tokens per task       {tokens / len(TASKS):8.1f}")
+    print(f"greedy                {statistics.median(plain_s) * 1000:8.2f} ms (median)")
+    print(f"speculative           {statistics.median(spec_s) * 1000:8.2f} ms (median)")
+    print(f"speedup               {statistics.median(plain_s) / statistics.median(spec_s):8.2f}x")
+    print(f"acceptance rate       {statistics.fmean(rates):8.1%}")
+    print(f"tokens per main pass  {statistics.fmean(per_pass):8.2f}")
+    print(f"greedy mismatches     {mismatches}/{len(TASKS)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Throughput and peak RSS of the training data pipeline (agent/train_data.py).
+
+Writes --files synthetic Parquet files of docstring/code rows and builds a
+tiny word-level tokenizer, both in a temp directory, then runs each mode in
+its own subprocess so peak RSS is that mode's alone:
+
+- eager:  what train.ipynb did: read every file whole, tokenize everything
+          in one call, padded to --max-length
+- cold:   ShardedTextDataset with an empty shard cache (streaming reads,
+          --workers tokenizer processes, length-bucketed batches)
+- warm:   the same again, every shard served from the cache
+
+Reports samples/sec, peak RSS (this process and, separately, the largest
+worker) and the share of padding tokens in the batches.
+
+    python benchmarks/bench_train_data.py --files 8 --rows 20000 --workers 4
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO)
+
+WORDS = ["value", "total", "items", "result", "index", "name", "data", "config", "user", "request",
+         "return", "for", "in", "if", "else", "def", "class", "self", "None", "True", "print", "len"]
+
+
+def peak_rss_mb(children=False):
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def write_data(directory, files, rows, row_group_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rng = random.Random(0)
+    os.makedirs(directory, exist_ok=True)
+    for f in range(files):
+        docstrings, codes = [], []
+        for _ in range(rows):
+            docstrings.append(" ".join(rng.choices(WORDS, k=rng.randint(3, 20))))
+            # Code lengths vary a lot, as in real corpora
+            codes.append(" ".join(rng.choices(WORDS, k=int(rng.lognormvariate(4, 1)))))
+        if f == 0:
+            docstrings[0] = None  # a row the pipeline must skip
+        table = pa.table({"docstring": docstrings, "code": codes})
+        pq.write_table(table, os.path.join(directory, f"part_{f}.parquet"), row_group_size=row_group_size)
+
+
+def write_tokenizer(directory):
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {"<pad>": 0, "<unk>": 1, "</s>": 2}
+    for word in WORDS:
+        vocab[word] = len(vocab)
+    backend = Tokenizer(models.WordLevel(vocab=vocab, unk_token="<unk>"))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer = PreTrainedTokenizerFast(tokenizer_object=backend, pad_token="<pad>", unk_token="<unk>",
+                                        eos_token="</s>")
+    tokenizer.save_pretrained(directory)
+
+
+def padding_share(lengths_per_batch, pad_to):
+    """Share of padding tokens when each batch is padded to ``pad_to(batch)``."""
+    real = sum(sum(batch) for batch in lengths_per_batch)
+    padded = sum(pad_to(batch) * len(batch) for batch in lengths_per_batch)
+    return 1 - real / padded if padded else 0.0
+
+
+def run_child(args):
+    if args.child == "eager":
+        import pyarrow.parquet as pq
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+        start = time.perf_counter()
+        rows = []
+        for name in sorted(os.listdir(args.data)):
+            rows.extend(pq.read_table(os.path.join(args.data, name)).to_pylist())
+        texts = [f"{r['docstring']} </s> {r['code']}" for r in rows if r["docstring"] is not None and r["code"] is not None]
+        encoded = tokenizer(texts, truncation=True, padding="max_length", max_length=args.max_length)
+        samples = len(encoded["input_ids"])
+        elapsed = time.perf_counter() - start
+        lengths = [sum(mask) for mask in encoded["attention_mask"]]
+        batches = [lengths[i:i + args.batch_size] for i in range(0, len(lengths), args.batch_size)]
+        padding = padding_share(batches, lambda batch: args.max_length)
+    else:
+        from agent.train_data import ShardedTextDataset
+
+        start = time.perf_counter()
+        dataset = ShardedTextDataset([args.data], args.tokenizer, cache_dir=args.cache, max_length=args.max_length,
+                                     num_workers=args.workers)
+        batches = [[len(sample["input_ids"]) for sample in batch]
+                   for batch in dataset.batches(args.batch_size, seed=0)]
+        elapsed = time.perf_counter() - start
+        samples = sum(len(batch) for batch in batches)
+        padding = padding_share(batches, lambda batch: -(-max(batch) // 8) * 8)
+
+    print(json.dumps({
+        "mode": args.child,
+        "samples": samples,
+        "samples_per_s": samples / elapsed if elapsed else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "worker_rss_mb": peak_rss_mb(children=True) if args.child != "eager" else None,
+        "padding": padding,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=20000, help="Rows per file")
+    parser.add_argument("--row-group-size", type=int, default=5000, help="Rows per row group (one shard each)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--max-length", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--tokenizer", default=None, help="Tokenizer to use instead of the synthetic one")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--data", help=argparse.SUPPRESS)
+    parser.add_argument("--cache", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    work = tempfile.mkdtemp(prefix="train-data-")
+    try:
+        data = os.path.join(work, "data")
+        write_data(data, args.files, args.rows, args.row_group_size)
+        tokenizer = args.tokenizer
+        if tokenizer is None:
+            tokenizer = os.path.join(work, "tokenizer")
+            write_tokenizer(tokenizer)
+
+        print(f"{'mode':6} {'samples':>9} {'samples/s':>11} {'peak RSS MB':>12} {'worker MB':>10} {'padding':>8}")
+        for mode in ("eager", "cold", "warm"):
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child", mode, "--data", data,
+                 "--cache", os.path.join(work, "cache"), "--tokenizer", tokenizer,
+                 "--workers", str(args.workers), "--max-length", str(args.max_length),
+                 "--batch-size", str(args.batch_size)],
+                cwd=REPO, capture_output=True, text=True,
+            )
+            lines = [line for line in result.stdout.splitlines() if line.startswith("{")]
+            if result.returncode != 0 or not lines:
+                # A negative code is a signal: usually the OOM killer for eager on large data
+                print(f"{mode:6} failed with exit code {result.returncode}: "
+                      f"{result.stderr.strip().splitlines()[-1:] or 'no output'}")
+                continue
+            row = json.loads(lines[-1])
+            rss = f"{row['peak_rss_mb']:.1f}" if row["peak_rss_mb"] is not None else "n/a"
+            workers = f"{row['worker_rss_mb']:.1f}" if row["worker_rss_mb"] else "-"
+            print(f"{mode:6} {row['samples']:>9} {row['samples_per_s']:>11.0f} {rss:>12} {workers:>10} "
+                  f"{row['padding']:>7.1%}")
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
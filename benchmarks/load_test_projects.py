@@ -0,0 +1,109 @@
+"""
+Load test: concurrent tasks across several projects through the job queue.
+
+Submits --tasks tasks (default 50) spread round-robin over --projects
+projects to a JobQueue, using the stub backend so no model is needed. Every
+task writes a shared main.py plus a file unique to the task, so afterwards each
+project's file map must list exactly its tasks' files. Runs once with a single
+worker and once with --workers to show projects generating in parallel, and
+exits non-zero if any file map entry or file is missing.
+
+    python benchmarks/load_test_projects.py --tasks 50 --projects 5 --workers 8
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO)
+
+from agent import backends
+from agent.file_ops import load_file_map
+from agent.jobs import JobQueue
+from agent.main import run_task
+from agent.workspace import get_workspace
+
+
+class UniqueStubBackend(backends.StubBackend):
+    """The stub response plus one file named after the task, so lost entries are detectable."""
+
+    name = "stub-unique"
+
+    def generate(self, prompt, params, cancel=None):
+        task_id = prompt.rsplit("job ", 1)[-1].strip()
+        return super().generate(prompt, params, cancel) + (
+            f"\nFILE: jobs/job_{task_id}.py\n```python\nJOB = {task_id}\n```\n"
+        )
+
+
+backends.BACKENDS[UniqueStubBackend.name] = UniqueStubBackend
+
+
+def run(tasks, projects, workers, delay_ms):
+    workdir = tempfile.mkdtemp(prefix="load-test-")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        config = {
+            "use_mock": False,
+            "backend": UniqueStubBackend.name,
+            "stub": {"token_delay_ms": delay_ms},
+            "generation_cache": {"enabled": False},
+            "templates": {"enabled": False},
+        }
+        names = [f"project_{i}" for i in range(projects)]
+        queue = JobQueue(max_workers=workers, max_pending=tasks)
+        start = time.perf_counter()
+        jobs = [
+            queue.submit("run_task", run_task, task=f"Write a script for job {i}",
+                         project=names[i % projects], config=config)
+            for i in range(tasks)
+        ]
+        while any(queue.get(job.id).status in ("queued", "running") for job in jobs):
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        queue.shutdown()
+
+        errors = [job.error for job in jobs if job.status != "done"]
+        workspace = get_workspace("projects")
+        lost = []
+        for p, name in enumerate(names):
+            expected = {"main.py"} | {f"jobs/job_{i}.py" for i in range(tasks) if i % projects == p}
+            file_map = load_file_map(workspace.file_map_path(name))
+            for path in sorted(expected):
+                if path not in file_map or not (workspace.project_path(name) / path).exists():
+                    lost.append(f"{name}/{path}")
+        return elapsed, errors, lost
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--projects", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--delay-ms", type=float, default=0.5, help="Stub generation time per chunk")
+    args = parser.parse_args()
+
+    failed = False
+    for workers in sorted({1, args.workers}):
+        # The stub logs every canned response it serves
+        with contextlib.redirect_stdout(io.StringIO()):
+            elapsed, errors, lost = run(args.tasks, args.projects, workers, args.delay_ms)
+        print(f"workers {workers:3}: {args.tasks} tasks in {elapsed:.2f}s ({args.tasks / elapsed:.1f} tasks/s), "
+              f"{len(errors)} failed, {len(lost)} lost entries")
+        for message in errors[:5] + lost[:5]:
+            print(f"  {message}")
+        failed = failed or bool(errors or lost)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Load test: concurrent clients streaming tasks over server-sent events.
+
+Starts ``python -m agent.server`` in a scratch directory with the stub backend
+(no model; --delay-ms per streamed chunk simulates generation), then for each
+--clients level opens that many simultaneous ``POST /tasks/events`` streams,
+each on its own project, and reads them to the end. Reports per level how
+many streams completed, were rejected (503) or failed, time to the first event
+and to the result (p50/p95), and tasks/sec. The sustainable level is the
+largest one where every stream completed with p95 under --max-p95-s.
+
+It also checks that a client disconnecting mid-stream and a request that
+exceeds its timeout_s both cancel their job.
+
+    python benchmarks/load_test_sse.py --clients 10 50 100 200 --server-workers 8
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir, port, workers, delay_ms):
+    config = {
+        "use_mock": False,
+        "backend": "stub",
+        "stub": {"token_delay_ms": delay_ms},
+        "generation_cache": {"enabled": False},
+        "templates": {"enabled": False},
+        "server": {"max_workers": workers, "max_pending": 100000, "history": 100000, "keepalive_s": 5},
+    }
+    with open(os.path.join(workdir, "config.yaml"), "w", encoding="utf-8") as f:
+        yaml.safe_dump(config, f)
+    env = dict(os.environ, PYTHONPATH=REPO)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "agent.server", "--port", str(port), "--config", "config.yaml"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            request("GET", port, "/health")
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Server did not start")
+
+
+def request(method, port, path, body=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                     headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        conn.close()
+
+
+def stream_task(port, task, project, timeout_s=None, stop_after=None):
+    """
+    Read one SSE stream to the end.
+
+    Returns a dict with status (HTTP), events (type list), job_id,
+    first_event_s and total_s. With ``stop_after`` the connection is closed
+    after that many events, like a client going away.
+    """
+    start = time.perf_counter()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+    body = {"task": task, "project": project}
+    if timeout_s is not None:
+        body["timeout_s"] = timeout_s
+    outcome = {"status": None, "events": [], "job_id": None, "first_event_s": None, "total_s": None}
+    try:
+        conn.request("POST", "/tasks/events", body=json.dumps(body), headers={"Content-Type": "application/json"})
+        response = conn.getresponse()
+        outcome["status"] = response.status
+        if response.status != 200:
+            response.read()
+            return outcome
+        event = None
+        while True:
+            line = response.readline()
+            if not line:
+                break
+            line = line.decode("utf-8").rstrip("\n")
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: ") and event:
+                if outcome["first_event_s"] is None:
+                    outcome["first_event_s"] = time.perf_counter() - start
+                outcome["events"].append(event)
+                if event == "job":
+                    outcome["job_id"] = json.loads(line[len("data: "):])["job_id"]
+                if stop_after is not None and len(outcome["events"]) >= stop_after:
+                    break
+    except OSError as e:
+        outcome["error"] = str(e)
+    finally:
+        conn.close()
+    outcome["total_s"] = time.perf_counter() - start
+    return outcome
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def run_level(port, clients, level):
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        outcomes = list(pool.map(
+            lambda i: stream_task(port, f"Write a script for client {i}", f"l{level}-c{i}"), range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+    ok = [o for o in outcomes if o["events"] and o["events"][-1] == "result"]
+    rejected = sum(1 for o in outcomes if o["status"] == 503)
+    return {
+        "clients": clients,
+        "ok": len(ok),
+        "rejected": rejected,
+        "failed": clients - len(ok) - rejected,
+        "first_p50": percentile([o["first_event_s"] for o in ok], 0.5),
+        "total_p50": percentile([o["total_s"] for o in ok], 0.5),
+        "total_p95": percentile([o["total_s"] for o in ok], 0.95),
+        "tasks_per_s": len(ok) / elapsed if elapsed else 0.0,
+    }
+
+
+def wait_for_status(port, job_id, statuses, timeout=30):
+    deadline = time.time() + timeout
+    status = None
+    while time.time() < deadline:
+        _, job = request("GET", port, f"/tasks/{job_id}")
+        status = job["status"]
+        if status in statuses:
+            break
+        time.sleep(0.05)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[10, 50, 100, 200])
+    parser.add_argument("--server-workers", type=int, default=8, help="server.max_workers")
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="Stub generation time per chunk")
+    parser.add_argument("--max-p95-s", type=float, default=10.0, help="Latency bound for a sustained level")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="sse-load-")
+    port = free_port()
+    server = start_server(workdir, port, args.server_workers, args.delay_ms)
+    failed = False
+    try:
+        # Cancellation: a client that goes away, and a task that outlives its timeout
+        gone = stream_task(port, "Write a script to calculate primes", "cancel-check", stop_after=3)
+        status = wait_for_status(port, gone["job_id"], ("cancelled", "done", "error"))
+        print(f"disconnect -> job {status}")
+        slow = stream_task(port, "Write a script to calculate primes", "timeout-check", timeout_s=0.05)
+        status = wait_for_status(port, slow["job_id"], ("cancelled", "done", "error"))
+        print(f"timeout    -> {slow['events'][-1]} event, job {status}")
+
+        print(f"\n{'clients':>7} {'ok':>5} {'503':>5} {'failed':>6} {'first p50':>10} {'p50 s':>7} {'p95 s':>7} {'tasks/s':>8}")
+        sustained = 0
+        for level, clients in enumerate(args.clients):
+            row = run_level(port, clients, level)
+            print(f"{row['clients']:>7} {row['ok']:>5} {row['rejected']:>5} {row['failed']:>6} "
+                  f"{row['first_p50']:>10.3f} {row['total_p50']:>7.2f} {row['total_p95']:>7.2f} "
+                  f"{row['tasks_per_s']:>8.1f}")
+            if row["ok"] == clients and row["total_p95"] <= args.max_p95_s:
+                sustained = clients
+            failed = failed or bool(row["failed"])
+        print(f"\nSustained {sustained} concurrent streaming clients (p95 <= {args.max_p95_s:g}s) "
+              f"with {args.server_workers} generation workers")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,300 @@
+"""
+Benchmark suite covering every stage of the agent pipeline.
+
+Runs offline on CPU (mock generator, synthetic projects in a temp directory)
+and times:
+
+- parse:       parse_code_response on responses of 10 and 100 files
+- save:        save_project_files creating files vs. three-way merging an edit
+- file_map:    load_file_map / update_file_map (one changed entry) at 10 to 100k entries
+- file_tree:   get_file_tree on synthetic trees, cold (fresh index) and warm
+- fix:         fix_syntax_errors on a file with several syntax errors
+- validate:    validate_files on a 50-file response, uncached in-process and
+               across the process pool, and cached
+- run_task:    a full task with the mock generator, and a template task
+
+Every case reports min/median/mean seconds over --repeat runs. Results are
+written as JSON (default benchmarks/results/<commit>.json) together with the
+commit, Python version and platform. Pass --compare OLD.json to print the
+change per case against an earlier run; the script exits non-zero if any
+case's median got slower than --threshold (default 1.25x).
+
+    python benchmarks/run_all.py
+    git checkout HEAD~1 && python benchmarks/run_all.py --out /tmp/before.json
+    git checkout - && python benchmarks/run_all.py --compare /tmp/before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, REPO)
+
+from agent.bugfixer import fix_syntax_errors
+from agent.codegen import parse_code_response
+from agent.file_ops import load_file_map, save_project_files, update_file_map
+from agent.file_tree import FileTreeIndex
+from agent.main import get_file_tree, run_task
+from agent.utils import load_config
+from agent.validation import validate_files
+
+FILE_MAP_SIZES = [10, 1000, 10000, 100000]
+TREE_SIZES = [1000, 10000]
+QUICK_FILE_MAP_SIZES = [10, 1000]
+QUICK_TREE_SIZES = [1000]
+
+
+def measure(fn, repeat, setup=None):
+    """Time ``fn()`` ``repeat`` times; ``setup()`` runs untimed before each call."""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return {
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "mean_s": statistics.fmean(times),
+        "runs": repeat,
+    }
+
+
+def module_source(n_functions, tag=0):
+    return "\n".join(
+        f"def func_{i}(value):\n    total = value + {i + tag}\n    return total * 2\n"
+        for i in range(n_functions)
+    )
+
+
+def response_text(n_files):
+    return "\n".join(f"FILE: pkg/module_{i}.py\n```python\n{module_source(10)}```\n" for i in range(n_files))
+
+
+def bench_parse(work, repeat, quick):
+    results = {}
+    for n in (10, 100):
+        response = response_text(n)
+        results[f"parse/{n}_files"] = measure(lambda: parse_code_response(response), repeat)
+    return results
+
+
+def bench_save(work, repeat, quick):
+    results = {}
+    files = [{"path": f"pkg/module_{i}.py", "code": module_source(10), "task": "create"} for i in range(20)]
+    create_dir = os.path.join(work, "save_create")
+
+    def fresh():
+        shutil.rmtree(create_dir, ignore_errors=True)
+
+    results["save/create_20_files"] = measure(lambda: save_project_files(files, create_dir, {}), repeat, fresh)
+
+    # An edit that changes one function of a 200-function module goes through the AST merge
+    edit_dir = os.path.join(work, "save_edit")
+    original = module_source(200)
+    edited = original.replace("value + 100\n", "value - 100\n")
+    edit = [{"path": "app.py", "code": edited, "task": "edit"}]
+
+    def reset():
+        shutil.rmtree(edit_dir, ignore_errors=True)
+        save_project_files([{"path": "app.py", "code": original, "task": "create"}], edit_dir, {})
+
+    results["save/merge_edit_200_functions"] = measure(lambda: save_project_files(edit, edit_dir, {}), repeat, reset)
+    return results
+
+
+def bench_file_map(work, repeat, quick):
+    results = {}
+    for n in QUICK_FILE_MAP_SIZES if quick else FILE_MAP_SIZES:
+        path = os.path.join(work, f"file_map_{n}", "file_map.json")
+        update_file_map({f"src/file_{i}.py": {"status": "created"} for i in range(n)}, path)
+        results[f"file_map/load_{n}"] = measure(lambda: load_file_map(path), repeat)
+        file_map = load_file_map(path)
+        counter = iter(range(10 ** 9))
+
+        def change_one():
+            file_map["src/file_0.py"] = {"status": "edited", "n": next(counter)}
+
+        results[f"file_map/update_one_of_{n}"] = measure(lambda: update_file_map(file_map, path), repeat, change_one)
+    return results
+
+
+def make_tree(root, n_files, files_per_dir=50):
+    for d in range(max(1, n_files // files_per_dir)):
+        directory = os.path.join(root, f"pkg{d % 10}", f"sub{d}")
+        os.makedirs(directory, exist_ok=True)
+        for j in range(files_per_dir):
+            open(os.path.join(directory, f"module_{j}.py"), "w").close()
+
+
+def bench_file_tree(work, repeat, quick):
+    results = {}
+    for n in QUICK_TREE_SIZES if quick else TREE_SIZES:
+        projects = os.path.join(work, f"tree_{n}")
+        make_tree(os.path.join(projects, "generated_project"), n)
+        project_path = os.path.join(projects, "generated_project")
+        results[f"file_tree/cold_{n}"] = measure(lambda: FileTreeIndex(project_path).tree(), repeat)
+        get_file_tree(projects)
+        results[f"file_tree/warm_{n}"] = measure(lambda: get_file_tree(projects), repeat)
+    return results
+
+
+def bench_fix(work, repeat, quick):
+    path = os.path.join(work, "broken.py")
+    lines = []
+    for i in range(50):
+        # Missing colons and a stray indent every few functions
+        colon = "" if i % 5 == 0 else ":"
+        stray = "      " if i % 7 == 0 else "    "
+        lines.append(f"def func_{i}(value){colon}\n    total = value + {i}\n{stray}return total\n")
+    source = "\n".join(lines)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(source)
+    assert fix_syntax_errors(path) is not None
+    return {"fix/syntax_errors_50_functions": measure(lambda: fix_syntax_errors(path), repeat)}
+
+
+def bench_validate(work, repeat, quick):
+    results = {}
+    files = [{"path": f"pkg/module_{i}.py", "code": module_source(100, tag=i), "task": "create"}
+             for i in range(50)]
+    runs = iter(range(repeat * 3 + 1))
+
+    def fresh_cache(config):
+        # A new database per run, so nothing is cached
+        config["fix"] = {"parse_cache": os.path.join(work, f"cache_{next(runs)}.db")}
+
+    for name, min_kb in (("inline", 1 << 30), ("pool", 0)):
+        config = {"validation": {"parallel_min_kb": min_kb}}
+        validate_files(files[:2], dict(config, fix={"parse_cache": os.path.join(work, "warmup.db")}))
+        results[f"validate/uncached_50_files_{name}"] = measure(
+            lambda: validate_files(files, config), repeat, setup=lambda: fresh_cache(config)
+        )
+    config = {"validation": {}, "fix": {"parse_cache": os.path.join(work, "warm.db")}}
+    validate_files(files, config)
+    results["validate/cached_50_files"] = measure(lambda: validate_files(files, config), repeat)
+    return results
+
+
+def bench_run_task(work, repeat, quick):
+    results = {}
+    config = load_config(os.path.join(REPO, "config.yaml"))
+    config.update(use_mock=True, generation_cache={"enabled": False}, tracing={"jsonl": None})
+    config["templates"] = dict(config.get("templates") or {}, dir=os.path.join(REPO, "templates"))
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        for name, task in (("mock", "Write a script to calculate primes"),
+                           ("template", "Create a Flask app with 3 routes")):
+            # Every run gets a fresh project (and so an empty file map)
+            projects = (f"{name}_{i}" for i in range(repeat))
+
+            # The mock generator logs every response it serves
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[f"run_task/{name}"] = measure(
+                    lambda: run_task(task, config=config, project=next(projects)), repeat
+                )
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+SUITES = {
+    "parse": bench_parse,
+    "save": bench_save,
+    "file_map": bench_file_map,
+    "file_tree": bench_file_tree,
+    "fix": bench_fix,
+    "validate": bench_validate,
+    "run_task": bench_run_task,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline, threshold):
+    """Print the median change per case and return the names that regressed beyond ``threshold``."""
+    regressed = []
+    print(f"\n{'case':<40} {'before ms':>10} {'after ms':>10} {'change':>8}")
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<40} {'-':>10} {stats['median_s'] * 1000:>10.3f} {'new':>8}")
+            continue
+        ratio = stats["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<40} {before['median_s'] * 1000:>10.3f} {stats['median_s'] * 1000:>10.3f} "
+              f"{ratio:>7.2f}x{flag}")
+        if ratio > threshold:
+            regressed.append(name)
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", nargs="+", choices=sorted(SUITES), help="Run only these suites")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--quick", action="store_true", help="Smaller file maps and trees (seconds, not minutes)")
+    parser.add_argument("--out", default=None, help="Result file (default benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", default=None, metavar="OLD.json", help="Earlier result file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Median slowdown counted as a regression")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    work = tempfile.mkdtemp(prefix="codenex-bench-")
+    results = {}
+    try:
+        for name in args.only or list(SUITES):
+            start = time.perf_counter()
+            suite_dir = os.path.join(work, name)
+            os.makedirs(suite_dir)
+            suite = SUITES[name](suite_dir, args.repeat, args.quick)
+            for case, stats in suite.items():
+                print(f"{case:<40} median {stats['median_s'] * 1000:10.3f} ms   min {stats['min_s'] * 1000:10.3f} ms")
+            print(f"  ({name} took {time.perf_counter() - start:.1f}s)")
+            results.update(suite)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    out = args.out or os.path.join(REPO, "benchmarks", "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "quick": args.quick,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared with {baseline.get('commit', args.compare)}")
+        regressed = compare(results, baseline["results"], args.threshold)
+        if regressed:
+            print(f"{len(regressed)} case(s) slower than {args.threshold:.2f}x: {', '.join(regressed)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,17 +4,10 @@ import traceback
 def main():
     try:
         print("Starting FastAPI server with error capture...")
-        import uvicorn
-        from fastapi import FastAPI
+        from agent.server import serve
         
-        app = FastAPI()
-        
-        @app.get("/")
-        async def root():
-            return {"message": "Hello World"}
-            
         print("Starting Uvicorn server...")
-        uvicorn.run("run_server:app", host="0.0.0.0", port=8000, reload=True)
+        serve(host="0.0.0.0", port=8000)
         
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
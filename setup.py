@@ -10,6 +10,8 @@ setup(
         'torch>=2.0.0',
         'transformers>=4.40.0',
         'pyyaml>=6.0',
+        'fastapi>=0.68.0',
+        'uvicorn>=0.15.0',
     ],
     python_requires='>=3.8',
 )
@@ -0,0 +1,104 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+from agent import batch
+from agent.batch import load_checkpoint, run_batch
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# run_task stand-in: logs every call to calls_path, then takes a little time
+RUNNER = textwrap.dedent("""
+    import sys, time
+    from agent import batch
+
+    def run_task(task, project_dir, fix, config=None, project=None):
+        with open(sys.argv[3], "a") as f:
+            f.write(task + "\\n")
+        time.sleep(0.05)
+        return {"status": "success", "message": "ok", "file_map": {project + ".py": {}}}
+
+    batch.run_task = run_task
+    batch.run_batch(sys.argv[1], sys.argv[2], project_dir=sys.argv[4], config={}, max_workers=2)
+""")
+
+
+def write_tasks(path, count, duplicates):
+    with open(path, "w") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"t{i}", "task": f"Write script {i}"}) + "\n")
+        for i in range(duplicates):
+            # Same prompt as t{i}, modulo whitespace
+            f.write(json.dumps({"id": f"dup{i}", "task": f"Write  script {i} "}) + "\n")
+
+
+def read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def test_resume_after_kill_runs_every_task_once(tmp_path, monkeypatch):
+    tasks, results, calls = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl", tmp_path / "calls.txt"
+    write_tasks(tasks, 30, 3)
+    process = subprocess.Popen([sys.executable, "-c", RUNNER, str(tasks), str(results), str(calls),
+                                str(tmp_path / "projects")], cwd=REPO, env=dict(os.environ, PYTHONPATH=REPO))
+    while len(read_lines(results)) < 10:
+        assert process.poll() is None, "the batch finished before it could be killed"
+        time.sleep(0.01)
+    process.send_signal(signal.SIGKILL)
+    process.wait()
+    # A crash can also cut the last record short
+    with open(results, "a") as f:
+        f.write('{"id": "t29", "status": "succ')
+
+    recorded, _ = load_checkpoint(str(results))
+    assert 10 <= len(recorded) < 33
+    resumed_calls = []
+
+    def run_task(task, project_dir, fix, config=None, project=None):
+        resumed_calls.append(task)
+        return {"status": "success", "message": "ok", "file_map": {project + ".py": {}}}
+
+    monkeypatch.setattr(batch, "run_task", run_task)
+    summary = run_batch(str(tasks), str(results), project_dir=str(tmp_path / "projects"), config={}, max_workers=2)
+
+    # Nothing that already had a result ran again, and nothing was skipped
+    recorded_tasks = {f"Write script {record_id[1:]}" for record_id in recorded if record_id.startswith("t")}
+    assert not recorded_tasks & set(resumed_calls)
+    assert len(resumed_calls) == len(set(resumed_calls))
+    assert summary["counts"].get("skipped") == len(recorded)
+    records = [json.loads(line) for line in read_lines(results)]
+    ids = [record["id"] for record in records]
+    assert len(ids) == len(set(ids)) == 33
+    assert all(record["status"] == "success" for record in records)
+    # Duplicates copy their original's result instead of running
+    for record in records:
+        if record["id"].startswith("dup"):
+            assert record["duplicate_of"] == "t" + record["id"][3:]
+    # Only tasks in flight when the run was killed (one per worker) ran twice
+    assert len(read_lines(calls)) + len(resumed_calls) <= 30 + 2
+
+
+def test_failed_tasks_are_retried_and_finished_ones_skipped(tmp_path, monkeypatch):
+    tasks, results = tmp_path / "tasks.jsonl", tmp_path / "results.jsonl"
+    write_tasks(tasks, 4, 0)
+    calls = []
+
+    def flaky(task, project_dir, fix, config=None, project=None):
+        calls.append(task)
+        if task.endswith("2") and calls.count(task) == 1:
+            raise RuntimeError("model crashed")
+        return {"status": "success", "message": "ok", "file_map": {}}
+
+    monkeypatch.setattr(batch, "run_task", flaky)
+    first = run_batch(str(tasks), str(results), project_dir=str(tmp_path / "projects"), config={}, max_workers=2)
+    assert first["counts"] == {"success": 3, "error": 1}
+    second = run_batch(str(tasks), str(results), project_dir=str(tmp_path / "projects"), config={}, max_workers=2)
+    assert second["counts"] == {"success": 1, "skipped": 3}
+    assert sorted(calls) == sorted(f"Write script {i}" for i in (0, 1, 2, 2, 3))
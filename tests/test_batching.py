@@ -0,0 +1,85 @@
+import gc
+import time
+import weakref
+
+import pytest
+
+from agent import batching
+from agent.batching import BatchScheduler, get_scheduler
+from agent.model_registry import ModelRegistry
+
+
+class Encoding(dict):
+    def to(self, device):
+        return self
+
+
+class Tokenizer:
+    eos_token = "</s>"
+    pad_token_id = 0
+
+    def __init__(self):
+        self.pad_token = None
+        self.padding_side = "right"
+
+    def __call__(self, prompts, return_tensors=None, padding=False):
+        rows = [p.split() for p in prompts]
+        width = max(len(r) for r in rows)
+        return Encoding(input_ids=[[0] * (width - len(r)) + [1] * len(r) for r in rows])
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return [f"{len(row)} tokens" for row in outputs]
+
+
+class Model:
+    device = "cpu"
+
+    def generate(self, input_ids, pad_token_id=None, **kwargs):
+        return [row + [2] for row in input_ids]
+
+
+@pytest.fixture(autouse=True)
+def no_schedulers():
+    yield
+    for scheduler in batching._schedulers.values():
+        scheduler.close()
+    batching._schedulers.clear()
+
+
+def test_padding_settings_do_not_leak_into_the_shared_tokenizer():
+    tokenizer = Tokenizer()
+    scheduler = BatchScheduler(tokenizer, Model())
+    assert scheduler.generate("a b", timeout=5) == "1 tokens"
+    assert (tokenizer.padding_side, tokenizer.pad_token) == ("right", None)
+    assert scheduler.tokenizer.padding_side == "left"
+    scheduler.close()
+
+
+def test_schedulers_are_bounded_and_a_closed_one_still_serves():
+    tokenizer, model = Tokenizer(), Model()
+    config = {"batching": {"max_schedulers": 2}}
+    first = get_scheduler("m", tokenizer, model, config, {"temperature": 0.1})
+    for temperature in (0.2, 0.3):
+        get_scheduler("m", tokenizer, model, config, {"temperature": temperature})
+    assert len(batching._schedulers) == 2
+    # A caller still holding the closed scheduler is served, not left waiting
+    assert first.generate("a", timeout=5) == "1 tokens"
+
+
+def test_evicting_a_model_closes_its_schedulers():
+    registry = ModelRegistry(max_models=1, loader=lambda *key: (Tokenizer(), Model()))
+    key = ("a", "auto", "auto")
+    tokenizer, model = registry.get(*key)
+    scheduler = get_scheduler(key, tokenizer, model, {}, {})
+    assert scheduler.generate("a b c", timeout=5) == "1 tokens"
+    model_ref = weakref.ref(model)
+    del tokenizer, model, scheduler
+
+    registry.get("b", "auto", "auto")
+    assert list(batching._schedulers) == []
+    for _ in range(100):
+        gc.collect()
+        if model_ref() is None:
+            break
+        time.sleep(0.01)  # the worker thread exits after close()
+    assert model_ref() is None
@@ -0,0 +1,14 @@
+from agent.codegen import generate_code
+from agent.streaming import generate_code_stream
+
+MOCK = {"use_mock": True, "backend": "not-a-backend"}
+
+
+def test_mock_mode_does_not_resolve_the_backend():
+    files = generate_code("Write a script to calculate primes", MOCK)
+    assert files and files[0]["code"]
+
+
+def test_mock_mode_streams_without_resolving_the_backend():
+    files = list(generate_code_stream("Write a script to calculate primes", MOCK))
+    assert files and files[0]["code"]
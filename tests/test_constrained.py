@@ -0,0 +1,157 @@
+import pytest
+
+from agent.codegen import parse_code_response
+from agent.constrained import START, FileGrammarProcessor, advance, can_end, step
+
+# Responses the grammar must accept, and the files the parser reads from them
+ACCEPTED = [
+    ("FILE: app.py\n```python\nprint(1)\n```\n", [("app.py", "print(1)")]),
+    ("FILE: app.py\n```python\nprint(1)\n```", [("app.py", "print(1)")]),
+    ("\n\nFILE: a.py\n```\nx\n```\n", [("a.py", "x")]),
+    ("FILE: a.py\n```python\nx = 1\n```\nFILE: b.py\n```python\ny = 2\n```\n",
+     [("a.py", "x = 1"), ("b.py", "y = 2")]),
+    ("FILE: a.py\n```python\nx = 1\n```\n\nFILE: b.py\n```python\ny = 2\n```\n",
+     [("a.py", "x = 1"), ("b.py", "y = 2")]),
+    ("FILE: README.md\n````markdown\nUsage:\n```bash\npython app.py\n```\n````\n",
+     [("README.md", "Usage:\n```bash\npython app.py\n```")]),
+    ("FILE: README.md\n```markdown\nUsage:\n```bash\npython app.py\n```\nDone\n```\n",
+     [("README.md", "Usage:\n```bash\npython app.py\n```\nDone")]),
+]
+
+# Responses the grammar must reject: the parser would drop or cut short part of them
+REJECTED = [
+    "Here is the code:\nFILE: a.py\n```python\nx = 1\n```\n",
+    "FILE: a.py\n```python\n```\n",
+    "FILE: a.py\n```python\nx = 1\nFILE: b.py\n```\n",
+    "FILE: a.py\n```python\nx = 1\n```\n\n\nFILE: b.py\n```\ny = 2\n```\n",
+    "FILE: my app.py\n```\nx\n```\n",
+    "\n\n\nFILE: a.py\n```\nx\n```\n",
+]
+
+
+def files(response):
+    return [(f["path"], f["code"]) for f in parse_code_response(response)]
+
+
+@pytest.mark.parametrize("response, expected", ACCEPTED)
+def test_accepted_responses_parse_to_the_same_files(response, expected):
+    state = advance(START, response)
+    assert state is not None and can_end(state)
+    assert files(response) == expected
+
+
+@pytest.mark.parametrize("response, expected", ACCEPTED)
+def test_can_end_only_where_the_parser_has_complete_files(response, expected):
+    for i in range(len(response) + 1):
+        prefix = response[:i]
+        state = advance(START, prefix)
+        assert state is not None
+        if can_end(state):
+            # Stopping on a nested fence ends the file there, so only the
+            # files before the last one must already match
+            parsed = files(prefix)
+            assert parsed and parsed[:-1] == expected[:len(parsed) - 1]
+
+
+@pytest.mark.parametrize("response", REJECTED)
+def test_rejected_responses(response):
+    assert advance(START, response) is None
+
+
+@pytest.mark.parametrize("state, ch, expected", [
+    (START, "F", ("start", 0, 1)),
+    (START, " ", None),
+    (("start", 2, 0), "\n", None),
+    (("path", 0, 0), " ", ("path", 1, 0)),
+    (("path", 1, 0), "\n", None),
+    (("open", 2), "p", None),
+    (("open", 3), "\n", ("code", 3, 0, ("start",), False)),
+    # One blank line after a closing fence, then only FILE: or the end
+    (("after", 0, 0), "\n", ("after", 1, 0)),
+    (("after", 1, 0), "\n", None),
+    (("after", 1, 0), "x", None),
+    (("code", 3, 0, ("file", 4), True), ":", None),
+    (("code", 3, 0, ("ticks", 3), False), "\n", None),
+    (("code", 3, 0, ("ticks", 3), True), "\n", ("after", 0, 0)),
+    (("code", 3, 1, ("ticks", 3), True), "\n", ("code", 3, 0, ("start",), True)),
+])
+def test_step(state, ch, expected):
+    assert step(state, ch) == expected
+
+
+@pytest.mark.parametrize("state, expected", [
+    (START, False),
+    (("after", 0, 0), True),
+    (("after", 1, 0), True),
+    (("after", 0, 2), False),
+    (("code", 3, 0, ("ticks", 3), True), True),
+    (("code", 3, 0, ("ticks", 3), False), False),
+    (("code", 3, 1, ("ticks", 3), True), False),
+    (("code", 4, 0, ("ticks", 3), True), False),
+])
+def test_can_end(state, expected):
+    assert can_end(state) is expected
+
+
+class CharTokenizer:
+    """One token per character plus a few longer pieces, and an end-of-sequence token."""
+
+    def __init__(self):
+        self.pieces = ["FILE: ", "```", "\n\n"]
+        self.vocab = sorted(set("abcdefghijklmnopqrstuvwxyzFILE:.`= 12\n")) + self.pieces + ["<eos>"]
+        self.eos_token_id = len(self.vocab) - 1
+        self.all_special_ids = [self.eos_token_id]
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def convert_tokens_to_ids(self, token):
+        return self.vocab.index(token)
+
+    def decode(self, ids, clean_up_tokenization_spaces=False):
+        return "".join(self.vocab[i] for i in ids)
+
+    def encode(self, text):
+        ids = []
+        while text:
+            piece = next((p for p in self.pieces if text.startswith(p)), text[0])
+            ids.append(self.vocab.index(piece))
+            text = text[len(piece):]
+        return ids
+
+
+def run_processor(tokenizer, ids):
+    """Feed ``ids`` through a FileGrammarProcessor; return the allowed-token mask before each."""
+    torch = pytest.importorskip("torch")
+    processor = FileGrammarProcessor(tokenizer)
+    input_ids = torch.zeros((1, 1), dtype=torch.long)
+    allowed = []
+    for token_id in ids + [None]:
+        scores = processor(input_ids, torch.zeros((1, len(tokenizer))))
+        allowed.append(scores[0] != float("-inf"))
+        if token_id is not None:
+            input_ids = torch.cat([input_ids, torch.tensor([[token_id]])], dim=1)
+    return allowed
+
+
+@pytest.mark.parametrize("response", [
+    "FILE: a.py\n```\nx = 1\n```\n",
+    "FILE: a.py\n```\nx = 1\n```\n\nFILE: b.py\n```\ny = 2\n```",
+])
+def test_processor_allows_the_response_and_eos_only_after_a_fence(response):
+    tokenizer = CharTokenizer()
+    ids = tokenizer.encode(response)
+    allowed = run_processor(tokenizer, ids)
+    assert all(mask[token_id] for mask, token_id in zip(allowed, ids))
+    eos = [bool(mask[tokenizer.eos_token_id]) for mask in allowed]
+    ends = [can_end(advance(START, tokenizer.decode(ids[:i]))) for i in range(len(ids) + 1)]
+    assert eos == ends and eos[-1]
+
+
+def test_processor_masks_prose_and_file_lines_inside_a_block():
+    tokenizer = CharTokenizer()
+    ids = tokenizer.encode("FILE: a.py\n```\nx\n")
+    allowed = run_processor(tokenizer, ids)
+    assert not allowed[0][tokenizer.convert_tokens_to_ids("x")]
+    assert not allowed[-1][tokenizer.convert_tokens_to_ids("FILE: ")]
+    assert allowed[-1][tokenizer.convert_tokens_to_ids("```")]
@@ -0,0 +1,66 @@
+import json
+import multiprocessing
+import sqlite3
+import threading
+
+from agent.file_map_store import FileMap, FileMapStore, get_store
+from agent.file_ops import load_file_map, update_file_map
+
+
+def test_existing_json_file_map_is_migrated_once(tmp_path):
+    json_path = tmp_path / "file_map.json"
+    json_path.write_text(json.dumps({"app.py": {"status": "created"}, "b.py": {"status": "edited"}}))
+    assert load_file_map(str(json_path)) == {"app.py": {"status": "created"}, "b.py": {"status": "edited"}}
+    with sqlite3.connect(tmp_path / "file_map.db") as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    # Later changes to the JSON file are not imported again, even by a fresh store
+    json_path.write_text(json.dumps({"stale.py": {"status": "created"}}))
+    store = FileMapStore(str(tmp_path / "file_map.db"), legacy_json_path=str(json_path))
+    assert "stale.py" not in store.load()
+
+
+def test_delete_and_write_round_trip(tmp_path):
+    path = str(tmp_path / "file_map.json")
+    file_map = load_file_map(path)
+    file_map.update({"a.py": {"status": "created"}, "b.py": {"status": "created"}})
+    update_file_map(file_map, path)
+
+    file_map = load_file_map(path)
+    del file_map["a.py"]
+    file_map["b.py"] = {"status": "edited"}
+    file_map["c.py"] = {"status": "created"}
+    assert file_map.changes() == ({"b.py", "c.py"}, {"a.py"})
+    update_file_map(file_map, path)
+    assert file_map.changes() == (set(), set())
+    assert load_file_map(path) == {"b.py": {"status": "edited"}, "c.py": {"status": "created"}}
+    assert get_store(path).get("a.py") is None
+
+
+def test_plain_dict_replaces_the_whole_map(tmp_path):
+    path = str(tmp_path / "file_map.json")
+    update_file_map(FileMap({"a.py": {"status": "created"}}), path)
+    update_file_map({"b.py": {"status": "created"}}, path)
+    assert load_file_map(path) == {"b.py": {"status": "created"}}
+
+
+def _write_entries(db_path, prefix, count):
+    store = FileMapStore(db_path)
+    for i in range(count):
+        file_map = store.load()
+        file_map[f"{prefix}{i}.py"] = {"status": "created"}
+        changed, deleted = file_map.changes()
+        store.write({key: file_map[key] for key in changed}, deleted)
+
+
+def test_parallel_writers_keep_every_entry(tmp_path):
+    db_path = str(tmp_path / "file_map.db")
+    threads = [threading.Thread(target=_write_entries, args=(db_path, f"t{n}_", 25)) for n in range(2)]
+    processes = [multiprocessing.get_context("spawn").Process(target=_write_entries, args=(db_path, f"p{n}_", 25))
+                 for n in range(2)]
+    for worker in threads + processes:
+        worker.start()
+    for worker in threads + processes:
+        worker.join()
+    assert all(process.exitcode == 0 for process in processes)
+    assert len(FileMapStore(db_path).load()) == 100
@@ -0,0 +1,57 @@
+import os
+
+import agent.file_ops as file_ops
+
+
+def test_new_files_get_the_mode_open_would_give(tmp_path, monkeypatch):
+    monkeypatch.setattr(file_ops, "_new_file_mode", None)
+    with open(tmp_path / "plain.txt", "w") as f:
+        f.write("x")
+    assert file_ops._default_mode() == os.stat(tmp_path / "plain.txt").st_mode & 0o777
+
+
+def test_reading_the_mode_does_not_change_the_umask(monkeypatch):
+    monkeypatch.setattr(file_ops, "_new_file_mode", None)
+    calls = []
+    monkeypatch.setattr(os, "umask", lambda mask: calls.append(mask))
+    file_ops._default_mode()
+    assert calls == []
+
+
+def save(project, files):
+    file_ops.save_project_files([{"path": path, "code": code, "task": "create"} for path, code in files.items()],
+                                str(project), {}, fsync=False)
+
+
+def test_target_exists_at_every_step_of_the_swap(tmp_path, monkeypatch):
+    save(tmp_path, {"a.py": "a = 1", "b.py": "b = 1"})
+    missing = []
+    replace = os.replace
+
+    def checked_replace(src, dst):
+        if not os.path.exists(tmp_path / "a.py") or not os.path.exists(tmp_path / "b.py"):
+            missing.append(dst)
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", checked_replace)
+    save(tmp_path, {"a.py": "a = 2", "b.py": "b = 2"})
+    assert missing == []
+    assert (tmp_path / "a.py").read_text() == "a = 2" and (tmp_path / "b.py").read_text() == "b = 2"
+
+
+def test_failed_swap_restores_every_original(tmp_path, monkeypatch):
+    save(tmp_path, {"a.py": "a = 1", "b.py": "b = 1"})
+    replace = os.replace
+
+    def failing_replace(src, dst):
+        if str(dst).endswith("b.py") and str(src).endswith(".tmp"):
+            raise OSError("disk full")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    try:
+        save(tmp_path, {"a.py": "a = 2", "b.py": "b = 2", "c.py": "c = 2"})
+    except OSError:
+        pass
+    assert (tmp_path / "a.py").read_text() == "a = 1" and (tmp_path / "b.py").read_text() == "b = 1"
+    assert sorted(p.name for p in tmp_path.iterdir() if not p.name.startswith(".codenex")) == ["a.py", "b.py"]
@@ -0,0 +1,21 @@
+import contextlib
+import importlib.util
+import io
+import os
+
+BENCH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     "benchmarks", "load_test_projects.py")
+
+
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location("load_test_projects", BENCH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_parallel_projects_lose_no_file_map_entries():
+    bench = load_benchmark()
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, errors, lost = bench.run(tasks=8, projects=2, workers=2, delay_ms=0)
+    assert errors == [] and lost == []
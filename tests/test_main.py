@@ -0,0 +1,18 @@
+import sys
+
+import yaml
+
+from agent import main
+
+
+def test_cli_tree_uses_the_configured_ignore_patterns(tmp_path, monkeypatch, capsys):
+    project = tmp_path / "projects" / "generated_project"
+    (project / "build").mkdir(parents=True)
+    (project / "build" / "out.js").write_text("")
+    (project / "app.py").write_text("")
+    (tmp_path / "config.yaml").write_text(yaml.safe_dump({"file_tree": {"ignore": ["build"]}}))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(sys, "argv", ["agent.main", "--tree"])
+    main.main()
+    output = capsys.readouterr().out
+    assert "app.py" in output and "build" not in output
@@ -0,0 +1,122 @@
+import ast
+
+import pytest
+
+from agent.merge import merge_file, merge_python
+
+BASE = '''import os
+
+
+def f():
+    return 1
+
+
+if __name__ == "__main__":
+    print(f())
+'''
+
+
+def test_no_base_takes_changed_and_new_nodes():
+    theirs = "def f():\n    return 2\n\n\ndef h():\n    return 3\n"
+    result = merge_python(None, BASE, theirs)
+    assert "return 2" in result.content and "def h():" in result.content
+    assert "import os" in result.content
+    assert result.replaced == ["f"] and result.inserted == ["h"]
+    assert not result.conflicts
+
+
+def test_untouched_node_takes_the_edit_and_keeps_local_additions():
+    ours = BASE.replace("\n\nif __name__", "\n\ndef g():\n    return 2\n\n\nif __name__")
+    theirs = BASE.replace("print(f())", 'print(f(), "new")')
+    result = merge_python(BASE, ours, theirs)
+    assert result.content == ours.replace("print(f())", 'print(f(), "new")')
+    assert result.content.count('if __name__ == "__main__":') == 1
+    assert not result.conflicts
+
+
+def test_local_change_is_kept_when_the_edit_did_not_touch_it():
+    ours = BASE.replace("return 1", "return 10")
+    theirs = "def f():\n    return 1\n\n\ndef h():\n    pass\n"
+    result = merge_python(BASE, ours, theirs)
+    assert "return 10" in result.content and "def h():" in result.content
+    assert not result.conflicts
+
+
+def test_both_sides_changing_a_node_is_a_conflict_and_ours_wins():
+    ours = BASE.replace("return 1", "return 10")
+    theirs = BASE.replace("return 1", "return 20")
+    result = merge_python(BASE, ours, theirs)
+    assert [c.symbol for c in result.conflicts] == ["f"]
+    assert "return 10" in result.content and "return 20" not in result.content
+
+
+def test_changed_anonymous_statement_replaces_the_old_one():
+    base = "import os\n\nos.makedirs('a')\nprint('x')\n"
+    theirs = "import os\n\nos.makedirs('b')\nprint('x')\n"
+    result = merge_python(base, base, theirs)
+    assert result.content == theirs
+    assert result.replaced == ["stmt"] and result.deleted == []
+
+
+def test_anonymous_statement_removed_by_the_edit_is_deleted():
+    base = "import os\n\nos.makedirs('a')\n\nprint('x')\n"
+    theirs = "import os\n\nprint('x')\n"
+    result = merge_python(base, base, theirs)
+    assert result.content == theirs
+    assert result.deleted == ["stmt"]
+
+
+def test_anonymous_statement_changed_locally_is_not_deleted():
+    base = "print('a')\n"
+    ours = "print('local')\n"
+    theirs = "print('edit')\n"
+    result = merge_python(base, ours, theirs)
+    assert "print('local')" in result.content and "print('edit')" in result.content
+    assert result.deleted == []
+
+
+def test_named_nodes_left_out_of_the_edit_are_kept():
+    theirs = "def h():\n    return 3\n"
+    result = merge_python(BASE, BASE, theirs)
+    assert "def f():" in result.content and "def h():" in result.content
+    assert result.content.count('if __name__') == 1
+
+
+def test_inserted_statement_after_a_function_keeps_two_blank_lines():
+    base = "def f():\n    return 1\n"
+    theirs = "def f():\n    return 1\n\n\nprint(f())\n"
+    result = merge_python(base, base, theirs)
+    assert result.content == theirs
+
+
+def test_class_members_merge_one_by_one():
+    base = "class A:\n    def a(self):\n        return 1\n\n    def b(self):\n        return 2\n"
+    ours = base.replace("return 2", "return 22")
+    theirs = base.replace("return 1", "return 11") + "\n    def c(self):\n        return 3\n"
+    result = merge_python(base, ours, theirs)
+    assert "return 11" in result.content and "return 22" in result.content and "def c(self):" in result.content
+    assert result.replaced == ["A.a"] and result.inserted == ["A.c"]
+    ast.parse(result.content)
+
+
+def test_import_from_names_are_unioned():
+    ours = "from os import path\n"
+    theirs = "from os import sep\n"
+    result = merge_python(ours, ours, theirs)
+    assert result.content == "from os import path, sep\n"
+
+
+def test_comments_and_formatting_of_ours_are_kept():
+    ours = "# header comment\nX = 1  # keep me\n\n\ndef f():\n    return 1\n"
+    theirs = "def f():\n    return 2\n"
+    result = merge_python(ours, ours, theirs)
+    assert result.content == ours.replace("return 1", "return 2")
+
+
+@pytest.mark.parametrize("path, theirs", [
+    ("app.py", "def broken(:\n"),
+    ("README.md", "new text\n"),
+])
+def test_merge_file_takes_the_edit_when_it_cannot_merge(path, theirs):
+    result = merge_file(path, "old\n", "old\n", theirs)
+    assert result.content == theirs and result.replaced == ["<file>"]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+
+from agent.backends import TransformersBackend
+from agent import model_registry
+from agent.model_registry import ModelRegistry, get_registry, on_evict, set_registry
+
+
+def stub_loader(model_name, dtype, device_map):
+    return (f"tokenizer:{model_name}", f"model:{model_name}")
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry():
+    set_registry(None)
+    yield
+    set_registry(None)
+
+
+def test_hits_and_misses_are_counted():
+    registry = ModelRegistry(max_models=2, loader=stub_loader)
+    assert registry.get("a") == ("tokenizer:a", "model:a")
+    assert registry.get("a") is registry.get("a")
+    stats = registry.metrics()
+    assert (stats["misses"], stats["hits"], stats["evictions"]) == (1, 2, 0)
+    assert list(stats["load_time_s"]) == ["a|auto|auto"]
+
+
+def test_least_recently_used_model_is_evicted():
+    registry = ModelRegistry(max_models=2, loader=stub_loader)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")  # b is now the least recently used
+    registry.get("c")
+    assert [key[0] for key in registry.loaded()] == ["a", "c"]
+    assert registry.metrics()["evictions"] == 1
+
+
+def test_dtype_and_device_map_are_part_of_the_key():
+    registry = ModelRegistry(max_models=3, loader=stub_loader)
+    registry.get("a", "float16", "auto")
+    registry.get("a", "float32", "auto")
+    registry.get("a", "float32", "cpu")
+    assert registry.metrics()["misses"] == 3
+
+
+def test_concurrent_requests_for_one_key_load_it_once():
+    calls = []
+    started = threading.Event()
+
+    def slow_loader(*key):
+        calls.append(key)
+        started.set()
+        time.sleep(0.2)
+        return stub_loader(*key)
+
+    registry = ModelRegistry(max_models=1, loader=slow_loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get("a"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert len(results) == 8 and all(result is results[0] for result in results)
+    stats = registry.metrics()
+    assert (stats["misses"], stats["hits"]) == (1, 7)
+
+
+def test_resize_evicts_down_to_the_new_capacity():
+    registry = ModelRegistry(max_models=3, loader=stub_loader)
+    for name in "abc":
+        registry.get(name)
+    registry.resize(1)
+    assert [key[0] for key in registry.loaded()] == ["c"]
+    assert registry.metrics()["evictions"] == 2
+    registry.resize(0)  # capacity never drops below one model
+    assert registry.max_models == 1 and len(registry.loaded()) == 1
+
+
+def test_evict_and_clear_notify_listeners(monkeypatch):
+    monkeypatch.setattr(model_registry, "_eviction_listeners", [])
+    evicted = []
+    on_evict(evicted.append)
+    registry = ModelRegistry(max_models=3, loader=stub_loader)
+    for name in "abc":
+        registry.get(name)
+    assert registry.evict("a") and not registry.evict("a")
+    registry.clear()
+    assert [key[0] for key in evicted] == ["a", "b", "c"]
+    assert registry.loaded() == [] and registry.metrics()["evictions"] == 3
+
+
+def test_stub_registry_serves_the_transformers_backend():
+    set_registry(ModelRegistry(max_models=1, loader=stub_loader))
+    key, tokenizer, model = TransformersBackend({"model": "m"})._load()
+    assert key == ("m", "auto", "auto") and model == "model:m"
+
+
+def test_speculative_decoding_keeps_the_draft_model_next_to_the_main_one():
+    config = {"model": "main", "model_registry": {"max_models": 1},
+              "speculative": {"enabled": True, "draft_model": "draft"}}
+    registry = get_registry(config)
+    registry.loader = stub_loader
+    backend = TransformersBackend(config)
+    for _ in range(3):
+        backend._load()
+        backend._draft()
+    stats = registry.metrics()
+    assert stats["max_models"] == 2
+    assert (stats["misses"], stats["hits"], stats["evictions"]) == (2, 4, 0)
+
+
+def test_capacity_follows_the_config_without_speculative_decoding():
+    assert get_registry({"model_registry": {"max_models": 1}}).max_models == 1
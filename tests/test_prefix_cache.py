@@ -0,0 +1,38 @@
+import gc
+import weakref
+
+import pytest
+
+from agent.model_registry import ModelRegistry
+from agent.prefix_cache import get_prefix_cache
+from agent.prompt_engine import generate_prompt
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+
+class ByteTokenizer:
+    def __call__(self, text, return_tensors="pt", add_special_tokens=True):
+        return {"input_ids": torch.tensor([[ord(ch) % 64 for ch in text]])}
+
+
+def load(model_name, dtype, device_map):
+    config = transformers.GPT2Config(vocab_size=64, n_positions=1024, n_embd=16, n_layer=1, n_head=2)
+    return ByteTokenizer(), transformers.GPT2LMHeadModel(config).eval()
+
+
+def test_evicted_model_and_its_prefix_entries_are_freed():
+    cache = get_prefix_cache({})
+    cache.clear()
+    registry = ModelRegistry(max_models=1, loader=load)
+    key = ("a", "auto", "auto")
+    tokenizer, model = registry.get(*key)
+    cache.prepare(key, tokenizer, model, generate_prompt("Write a script", {}))
+    assert cache.metrics()["entries"] == 1
+    model_ref = weakref.ref(model)
+    del tokenizer, model
+
+    registry.get("b", "auto", "auto")
+    gc.collect()
+    assert cache.metrics()["entries"] == 0
+    assert model_ref() is None
@@ -0,0 +1,80 @@
+import http.client
+import json
+import socket
+import threading
+import time
+
+import pytest
+import yaml
+
+pytest.importorskip("fastapi")
+uvicorn = pytest.importorskip("uvicorn")
+
+from agent.server import create_app
+
+
+@pytest.fixture
+def server(tmp_path):
+    """The app served by uvicorn on a free port (TestClient buffers streamed responses)."""
+    config = tmp_path / "config.yaml"
+    config.write_text(yaml.safe_dump({"use_mock": True, "server": {"max_workers": 1}}))
+    app = create_app(str(config), project_dir=str(tmp_path / "projects"))
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    instance = uvicorn.Server(uvicorn.Config(app, port=port, log_level="warning"))
+    thread = threading.Thread(target=instance.run, daemon=True)
+    thread.start()
+    while not instance.started:
+        time.sleep(0.01)
+    yield app, port
+    instance.should_exit = True
+    thread.join(5)
+
+
+def test_cancelling_a_queued_job_ends_its_event_stream(server):
+    app, port = server
+    # Occupy the only worker so the streamed task stays queued
+    release = threading.Event()
+    app.state.queue.submit("block", lambda: release.wait(10) and {})
+
+    start = time.monotonic()
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    conn.request("POST", "/tasks/events", body=json.dumps({"task": "Write a script", "timeout_s": 8}),
+                 headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    events = []
+    for line in response:
+        line = line.decode("utf-8")
+        if line.startswith("event: "):
+            events.append(line[len("event: "):].strip())
+        elif line.startswith("data: ") and events[-1] == "job":
+            job_id = json.loads(line[len("data: "):])["job_id"]
+            delete = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            delete.request("DELETE", f"/tasks/{job_id}")
+            assert json.loads(delete.getresponse().read())["status"] == "queued"
+            release.set()
+    conn.close()
+
+    assert events == ["job", "cancelled"]
+    assert time.monotonic() - start < 5
+    assert app.state.queue.get(job_id).status == "cancelled"
+
+
+def test_job_gauges_drop_to_zero_when_jobs_finish(server):
+    app, port = server
+    release = threading.Event()
+    job = app.state.queue.submit("block", lambda: release.wait(10) and {})
+
+    def running_gauge():
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        conn.request("GET", "/metrics")
+        lines = conn.getresponse().read().decode("utf-8").splitlines()
+        return next(line for line in lines if line.startswith('codenex_jobs{status="running"}'))
+
+    while job.status != "running":
+        time.sleep(0.01)
+    assert running_gauge().split()[-1] in ("1", "1.0")
+    release.set()
+    job.future.result(5)
+    assert running_gauge().split()[-1] in ("0", "0.0")
@@ -0,0 +1,38 @@
+import pytest
+
+from agent.speculative import speculative_generate
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+
+def tiny_gpt2(seed, n_layer):
+    torch.manual_seed(seed)
+    config = transformers.GPT2Config(vocab_size=50, n_positions=128, n_embd=32, n_layer=n_layer, n_head=2)
+    return transformers.GPT2LMHeadModel(config).eval()
+
+
+@pytest.mark.parametrize("draft_seed", [0, 1])
+def test_output_matches_greedy_decoding(monkeypatch, draft_seed):
+    model = tiny_gpt2(0, 2)
+    # Seed 0 proposes what the main model picks; seed 1 gets most proposals rejected
+    draft = tiny_gpt2(draft_seed, 2 if draft_seed == 0 else 1)
+    input_ids = torch.tensor([[1, 2, 3, 4]])
+    with torch.no_grad():
+        greedy = model.generate(input_ids, max_new_tokens=30, do_sample=False,
+                                pad_token_id=0)[0, input_ids.shape[1]:].tolist()
+
+    # Cropping to a positive length is deprecated (a logged warning), so
+    # rejected tokens must be dropped by a negative count
+    crops = []
+    crop = transformers.DynamicCache.crop
+    monkeypatch.setattr(transformers.DynamicCache, "crop",
+                        lambda cache, length: crops.append(length) or crop(cache, length))
+
+    stats = {}
+    tokens = [t for step in speculative_generate(model, draft, input_ids, max_new_tokens=30,
+                                                  num_draft_tokens=4, stats=stats) for t in step]
+    assert tokens == greedy
+    assert all(length < 0 for length in crops)
+    assert crops or stats["accepted"] == stats["proposed"]
+    assert stats["steps"] < 30 if draft_seed == 0 else stats["accepted"] < stats["proposed"]
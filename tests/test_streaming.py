@@ -0,0 +1,49 @@
+import pytest
+
+from agent import backends
+from agent.codegen import generate_code
+from agent.main import run_task
+from agent.prompt_engine import generate_prompt
+from agent.streaming import generate_code_stream
+
+FILES = "FILE: app.py\n```python\nprint('hi')\n```\n\nFILE: notes.md\n```\nUpdate the docs later\n```\n"
+
+
+class ScriptedBackend(backends.StubBackend):
+    """Answers with the queued responses in order, the last one repeated."""
+
+    name = "scripted"
+    responses = [FILES]
+
+    def generate(self, prompt, params, cancel=None):
+        return self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+
+    def stream(self, prompt, params, cancel=None):
+        yield from backends.word_chunks(self.generate(prompt, params, cancel))
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setitem(backends.BACKENDS, ScriptedBackend.name, ScriptedBackend)
+    monkeypatch.setattr(ScriptedBackend, "responses", [FILES])
+    return {"use_mock": False, "backend": ScriptedBackend.name, "generation_cache": {"enabled": False},
+            "templates": {"enabled": False}, "validation": {"enabled": False}}
+
+
+@pytest.mark.parametrize("task, label", [
+    # "Update" only appears in the response's second file
+    ("Create a hello world app", "create"),
+    ("Add a greeting to app.py", "edit"),
+])
+def test_streamed_and_whole_responses_are_labelled_alike(config, task, label):
+    prompt = generate_prompt(task, {})
+    whole = generate_code(prompt, config)
+    streamed = list(generate_code_stream(prompt, config))
+    assert [f["task"] for f in whole] == [f["task"] for f in streamed] == [label, label]
+
+
+def test_streamed_answer_without_files_is_retried(config, tmp_path):
+    ScriptedBackend.responses = ["Sorry, I cannot help with that.", FILES]
+    result = run_task("Create a hello world app", str(tmp_path), config=config, stream=True)
+    assert result["status"] == "success"
+    assert (tmp_path / "generated_project" / "app.py").read_text().strip() == "print('hi')"
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from agent.template_engine import TemplateEngine
+
+TEMPLATES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return TemplateEngine(TEMPLATES)
+
+
+@pytest.mark.parametrize("task, template, params", [
+    ("Create a Flask app with 3 routes", "flask_app", {"routes": 3}),
+    ("Build a FastAPI service named shop", "fastapi_app", {"app_name": "shop"}),
+    ("Create a simple React app", "react_app", {}),
+    ("Create a quick demo Flask web app", "flask_app", {}),
+])
+def test_scaffold_tasks_match(engine, task, template, params):
+    match = engine.match(task)
+    assert match is not None and match.template.name == template
+    assert match.params == params
+
+
+def test_uncovered_requirement_falls_back_to_the_model(engine):
+    # 6 of the 9 content words are covered (0.67), but nothing in the Flask
+    # template implements authentication
+    assert engine.match("Create a Flask app with 3 routes and user authentication") is None
+
+
+@pytest.mark.parametrize("task", [
+    "Create a Flask app with 100 routes",
+    "Create a Flask app with 0 routes",
+    "Add a login page to app.py",
+    "Create a Flask API with a React frontend",
+    "Write a script to calculate primes",
+])
+def test_other_tasks_do_not_match(engine, task):
+    assert engine.match(task) is None
+
+
+def test_route_count_up_to_the_cap_is_rendered(engine):
+    files = engine.render("Create a Flask app with 50 routes")
+    app = next(f["code"] for f in files if f["path"] == "app.py")
+    assert app.count("@app.route(") == 50
+
+
+def test_render_fills_routes(engine):
+    files = engine.render("Create a Flask app with 2 routes")
+    app = next(f["code"] for f in files if f["path"] == "app.py")
+    assert "@app.route('/about')" in app and "/contact" not in app